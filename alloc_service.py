@@ -0,0 +1,275 @@
+"""
+Resident allocation service: one waitlist in memory, warm indexes, what-if donor offers.
+
+AllocationService keeps a StreamingAllocator per (scenario, policy, alpha,
+eta), built on first use; sorted lists are shared by every allocator with the
+same policy and alpha, so the cohort is featurised and indexed once. A
+scenario is an independent allocation state: offers advance it, snapshot()
+and restore() save and return to named points, and reset() brings it back
+to the untouched waitlist without rebuilding any index. An offer with
+commit=False answers "who would get this donor" and leaves the state as it
+was.
+
+serve() exposes the service over HTTP/1.1 (TCP or a Unix socket) with
+asyncio. Requests are queued and drained in batches: consecutive committed
+offers to the same allocator run as one offer_chunk, and every operation is
+applied in arrival order, so batching never changes an answer.
+
+    POST /offer     {"donors": [{"KDPI": 35, "DonorBloodType": "O"}], "policy": "hybrid",
+                     "alpha": 0.5, "fairness_eta": 0.0, "scenario": "default", "commit": true}
+    POST /snapshot  {"scenario": "default", "name": "before"}
+    POST /restore   {"scenario": "default", "name": "before"}
+    POST /reset     {"scenario": "default"}
+    GET  /metrics?scenario=default
+    GET  /health
+"""
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from policy_baselines import ABO_CODE, StreamingAllocator
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+def _json_default(v):
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    if isinstance(v, np.generic):
+        return v.item()
+    raise TypeError(f"not JSON serialisable: {type(v).__name__}")
+
+def donor_chunk(donors, start=0):
+    """donor_arrays()-style chunk from a list of donor mappings (KDPI, DonorBloodType[, donor_index])."""
+    kdpi = np.array([float(d['KDPI']) for d in donors])
+    if np.isnan(kdpi).any():
+        raise ValueError("KDPI must be numeric for every donor")
+    bt = [str(d['DonorBloodType']) for d in donors]
+    return {'KDPI': kdpi, 'abo': np.array([ABO_CODE.get(b, -1) for b in bt], dtype=np.int8),
+            'DonorBloodType': np.array(bt),
+            'index': np.array([d.get('donor_index', start + k) for k, d in enumerate(donors)])}
+
+
+class AllocationService:
+    """Warm allocators over one patient cohort (patient_arrays()), grouped into named scenarios."""
+    def __init__(self, pat, n_bins=10, index='binned', group_col=None):
+        self.pat, self.n_bins, self.index, self.group_col = pat, n_bins, index, group_col
+        self.allocators = {}     # (scenario, policy, alpha, eta) -> StreamingAllocator
+        self._fresh = {}         # same keys -> snapshot of the untouched waitlist
+        self._lists = {}         # (policy, alpha) -> sorted lists shared across etas and scenarios
+        self.snapshots = {}      # (scenario, name) -> {config: allocator snapshot}
+
+    def allocator(self, scenario, policy, alpha=0.5, fairness_eta=0.0):
+        key = (scenario, policy, float(alpha), float(fairness_eta))
+        if key not in self.allocators:
+            if policy not in ('urgency', 'utility', 'hybrid'):
+                raise ValueError(f"unknown policy {policy!r}")
+            lists = self._lists.get((policy, float(alpha)))
+            alloc = StreamingAllocator(self.pat, policy, float(alpha), float(fairness_eta), self.n_bins, self.index,
+                                       lists=lists, group_col=self.group_col)
+            if self.index == 'binned':
+                self._lists[(policy, float(alpha))] = alloc.lists
+            self.allocators[key] = alloc
+            self._fresh[key] = alloc.snapshot()
+        return self.allocators[key]
+
+    def _scenario(self, scenario):
+        return {key: a for key, a in self.allocators.items() if key[0] == scenario}
+
+    def offer(self, donors, policy, alpha=0.5, fairness_eta=0.0, scenario='default', commit=True):
+        """Match records for donors offered in order; with commit=False the state is left unchanged."""
+        alloc = self.allocator(scenario, policy, alpha, fairness_eta)
+        state = None if commit else alloc.snapshot()
+        chunk = donor_chunk(donors, alloc.n_offered)
+        records = list(alloc._records(chunk, alloc.offer_chunk(chunk)))
+        if state is not None:
+            alloc.restore(state)
+        return records
+
+    def snapshot(self, scenario, name):
+        self.snapshots[(scenario, name)] = {key: a.snapshot() for key, a in self._scenario(scenario).items()}
+        return len(self.snapshots[(scenario, name)])
+
+    def restore(self, scenario, name):
+        """Return every allocator of the scenario to the named snapshot (fresh if created after it)."""
+        if (scenario, name) not in self.snapshots:
+            raise KeyError(f"no snapshot {name!r} in scenario {scenario!r}")
+        saved = self.snapshots[(scenario, name)]
+        for key, alloc in self._scenario(scenario).items():
+            alloc.restore(saved.get(key, self._fresh[key]))
+        return len(saved)
+
+    def reset(self, scenario):
+        allocs = self._scenario(scenario)
+        for key, alloc in allocs.items():
+            alloc.restore(self._fresh[key])
+        return len(allocs)
+
+    def metrics(self, scenario):
+        return [{'policy': key[1], 'alpha': key[2], 'fairness_eta': key[3], 'n_offered': a.n_offered, **a.metrics()}
+                for key, a in self._scenario(scenario).items()]
+
+    def apply(self, ops):
+        """Run (op, payload) requests in order; consecutive committed offers to one allocator share a chunk."""
+        out, k = [], 0
+        while k < len(ops):
+            op, payload = ops[k]
+            end = k + 1
+            try:
+                if op == 'offer' and payload.get('commit', True):
+                    config, donors = _offer_config(payload), [_donors(payload)]
+                    while end < len(ops) and _joins(ops[end], config):
+                        donors.append(_donors(ops[end][1]))
+                        end += 1
+                    out += self._offer_batch(config, donors)
+                else:
+                    out.append(self._apply_one(op, payload))
+            except (KeyError, ValueError, TypeError) as e:
+                out += [(400, {'error': str(e)}) for _ in range(k, end)]
+            except Exception as e:
+                out += [(500, {'error': f"{type(e).__name__}: {e}"}) for _ in range(k, end)]
+            k = end
+        return out
+
+    def _offer_batch(self, config, requests):
+        """Committed offers of several requests as one chunk; one response per request."""
+        alloc = self.allocator(*config)
+        chunk = donor_chunk([d for donors in requests for d in donors], alloc.n_offered)
+        res = alloc.offer_chunk(chunk)
+        owner = np.searchsorted(np.cumsum([len(donors) for donors in requests]), res['donor_pos'], side='right')
+        out = [[] for _ in requests]
+        for j, record in zip(owner.tolist(), alloc._records(chunk, res)):
+            out[j].append(record)
+        return [(200, {'matches': matches}) for matches in out]
+
+    def _apply_one(self, op, payload):
+        scenario = payload.get('scenario', 'default')
+        if op == 'offer':
+            config = _offer_config(payload)
+            return 200, {'matches': self.offer(_donors(payload), *config[1:], scenario=scenario, commit=False)}
+        if op == 'snapshot':
+            return 200, {'scenario': scenario, 'name': payload['name'], 'allocators': self.snapshot(scenario, payload['name'])}
+        if op == 'restore':
+            return 200, {'scenario': scenario, 'name': payload['name'], 'allocators': self.restore(scenario, payload['name'])}
+        if op == 'reset':
+            return 200, {'scenario': scenario, 'allocators': self.reset(scenario)}
+        if op == 'metrics':
+            return 200, {'scenario': scenario, 'metrics': self.metrics(scenario)}
+        if op == 'health':
+            return 200, {'n_patients': len(self.pat['abo']), 'allocators': len(self.allocators),
+                         'scenarios': sorted({key[0] for key in self.allocators})}
+        return 404, {'error': f"unknown operation {op!r}"}
+
+def _donors(payload):
+    """The request's donors, checked so a bad one fails alone rather than its whole batch."""
+    donors = payload['donors'] if 'donors' in payload else [payload['donor']]
+    for d in donors:
+        if np.isnan(float(d['KDPI'])) or 'DonorBloodType' not in d:
+            raise ValueError("every donor needs a numeric KDPI and a DonorBloodType")
+        if str(d['DonorBloodType']) not in ABO_CODE:
+            raise ValueError(f"unknown DonorBloodType {d['DonorBloodType']!r}; expected one of {', '.join(ABO_CODE)}")
+    return donors
+
+def _offer_config(payload):
+    return (payload.get('scenario', 'default'), payload.get('policy', 'hybrid'), float(payload.get('alpha', 0.5)),
+            float(payload.get('fairness_eta', 0.0)))
+
+def _joins(op, config):
+    """Whether queued request op can join a committed-offer batch for config."""
+    name, payload = op
+    try:
+        return (name == 'offer' and payload.get('commit', True) and _offer_config(payload) == config
+                and bool(_donors(payload)))
+    except (KeyError, ValueError, TypeError):
+        return False
+
+
+async def _handle(service, queue, reader, writer):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                break
+            headers = {}
+            while True:
+                h = await reader.readline()
+                if h in (b'\r\n', b'\n', b''):
+                    break
+                k, _, v = h.decode('latin-1').partition(':')
+                headers[k.strip().lower()] = v.strip()
+            error = _request_error(line, headers)
+            if error:
+                # the stream can't be resynchronised after a bad request line or length, so answer and close
+                await _respond(writer, 400, {'error': error})
+                break
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+            body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+            url = urlsplit(target)
+            try:
+                payload = json.loads(body) if body else {}
+                if not isinstance(payload, dict):
+                    raise ValueError("request body must be a JSON object")
+                if method == 'GET':
+                    payload.update({k: v[-1] for k, v in parse_qs(url.query).items()})
+                status, response = await _submit(queue, url.path.strip('/'), payload)
+            except ValueError as e:
+                status, response = 400, {'error': str(e)}
+            await _respond(writer, status, response)
+            if headers.get('connection', '').lower() == 'close':
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+def _request_error(line, headers):
+    """Why a request line and headers can't be served, or None."""
+    if len(line.decode('latin-1').split(' ', 2)) != 3:
+        return f"malformed request line {line.strip().decode('latin-1')!r}"
+    length = headers.get('content-length', '0') or '0'
+    if not length.isdigit():
+        return f"invalid Content-Length {length!r}"
+    return None
+
+async def _respond(writer, status, response):
+    data = json.dumps(response, default=_json_default).encode()
+    writer.write(f'HTTP/1.1 {status} {REASONS.get(status, "Error")}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(data)}\r\n\r\n'.encode() + data)
+    await writer.drain()
+
+async def _submit(queue, op, payload):
+    future = asyncio.get_running_loop().create_future()
+    await queue.put((op, payload, future))
+    return await future
+
+async def _batcher(service, queue, max_batch):
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < max_batch and not queue.empty():
+            batch.append(queue.get_nowait())
+        t0 = time.perf_counter()
+        try:
+            results = service.apply([(op, payload) for op, payload, _ in batch])
+        except Exception as e:
+            # answer the whole batch rather than let the batcher die and every later request hang
+            results = [(500, {'error': f"{type(e).__name__}: {e}"}) for _ in batch]
+        us = (time.perf_counter() - t0) * 1e6
+        for (_, _, future), (status, response) in zip(batch, results):
+            response['batch_size'], response['batch_us'] = len(batch), us
+            if not future.done():      # its handler may have been cancelled while queued
+                future.set_result((status, response))
+
+async def serve(service, host='127.0.0.1', port=8765, unix_socket=None, max_batch=256):
+    """Serve service until cancelled, over TCP or, with unix_socket, a Unix domain socket."""
+    queue = asyncio.Queue()
+    batcher = asyncio.create_task(_batcher(service, queue, max_batch))
+    handler = lambda r, w: _handle(service, queue, r, w)
+    if unix_socket:
+        server = await asyncio.start_unix_server(handler, path=unix_socket)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
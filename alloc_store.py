@@ -0,0 +1,134 @@
+"""
+Append-only on-disk store for per-configuration allocations.
+
+Each partition holds one configuration's matches as a columnar directory
+(see cohort_io): int32 donor/recipient indices, float32 outcomes and int8
+category codes for blood types and recipient groups. The configuration
+(policy, alpha, eta, cohort sample, ...), its summary metrics and the
+cohort's group shares are stored once in the partition's meta.json rather
+than repeated on every row. Partitions are never modified after their
+meta.json is written; a partition without one is an interrupted write and
+is ignored. Readers list partitions from metadata alone and load matches
+one configuration at a time, memory-mapped.
+"""
+import json
+import os
+import time
+import uuid
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+from cohort_io import ColumnarWriter, is_columnar, load_columnar
+
+ABO_LABELS = ['O', 'A', 'B', 'AB']
+CONFIG_KEYS = ['label', 'alpha', 'fairness_eta']
+
+def _schema(group_labels):
+    return [('donor_index', np.int32), ('donor_bt', ABO_LABELS), ('donor_kdpi', np.float32),
+            ('recipient_index', np.int32), ('recipient_bt', ABO_LABELS), ('recipient_group', list(group_labels)),
+            ('urgency_norm', np.float32), ('utility_years', np.float32), ('post_years', np.float32),
+            ('no_tx_years', np.float32)]
+
+def _plain(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+
+class AllocationStore:
+    """Directory of allocation partitions, one per configuration run."""
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def new_run(self):
+        """A fresh run id; partitions appended with it can be viewed together."""
+        return time.strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8]
+
+    def _claim(self):
+        n = len(os.listdir(self.root))
+        while True:
+            name = f'part-{n:06d}'
+            try:
+                os.mkdir(os.path.join(self.root, name))
+                return name
+            except FileExistsError:
+                n += 1
+
+    def append(self, res, pat, don, config, metrics=None):
+        """Write kernel output res (donor_pos, recipient_index, outcome arrays) as a new partition.
+
+        config is a JSON-ready dict describing the configuration (policy, alpha, fairness_eta,
+        ...); pat/don are the kernel arrays res was computed from. Returns the partition name.
+        """
+        name = self._claim()
+        pos, ri = res['donor_pos'], res['recipient_index']
+        index = don['index'] if 'index' in don else np.arange(len(don['abo']))
+        extra = {'config': {k: _plain(v) for k, v in config.items()},
+                 'metrics': {k: _plain(v) for k, v in (metrics or {}).items()},
+                 'group_labels': [str(g) for g in pat['group_labels']],
+                 'p_share': [float(p) for p in pat['p_share']],
+                 'n_patients': int(len(pat['abo'])), 'n_donors': int(len(don['abo']))}
+        with ColumnarWriter(os.path.join(self.root, name), len(ri), _schema(extra['group_labels']),
+                            source='allocation', extra=extra) as w:
+            w.write({'donor_index': index[pos], 'donor_bt': don['abo'][pos], 'donor_kdpi': don['KDPI'][pos],
+                     'recipient_index': ri, 'recipient_bt': pat['abo'][ri], 'recipient_group': pat['group'][ri],
+                     'urgency_norm': pat['Urgency_norm'][ri], 'utility_years': res['utility_years'],
+                     'post_years': res['post_years'], 'no_tx_years': res['no_tx_years']})
+        return name
+
+    def meta(self, name):
+        with open(os.path.join(self.root, name, 'meta.json')) as f:
+            return json.load(f)
+
+    def names(self):
+        """Completed partitions, in append order."""
+        return sorted(n for n in os.listdir(self.root) if is_columnar(os.path.join(self.root, n)))
+
+    def partitions(self, **match):
+        """One row of config, metrics and n_rows per completed partition whose config matches."""
+        rows = []
+        for name in self.names():
+            meta = self.meta(name)
+            if all(meta['config'].get(k) == v for k, v in match.items()):
+                rows.append({'partition': name, **meta['config'], **meta['metrics'], 'n_rows': meta['n_rows']})
+        return pd.DataFrame(rows)
+
+    def load(self, name, columns=None):
+        """Memory-mapped matches of one partition; its metadata is in the frame's attrs."""
+        df = load_columnar(os.path.join(self.root, name), columns=columns)
+        df.attrs.update({k: v for k, v in self.meta(name).items() if k not in ('columns', 'format', 'version')})
+        return df
+
+    def view(self, **match):
+        """Lazy mapping (label, alpha, fairness_eta) -> matches over partitions whose config matches.
+
+        When the matched partitions hold more than one seed (a multi-seed sharded sweep, or
+        several sweeps) keys are (label, alpha, fairness_eta, seed) instead. Later partitions
+        win when a key repeats; pass run= to restrict to one sweep.
+        """
+        return AllocationView(self, match)
+
+
+class AllocationView(Mapping):
+    """Read-only mapping of configuration keys to partitions, loaded on access."""
+    def __init__(self, store, match):
+        self.store = store
+        parts = store.partitions(**match)
+        multi_seed = 'seed' in parts and parts['seed'].nunique(dropna=False) > 1
+        self.key_fields = CONFIG_KEYS + ['seed'] if multi_seed else CONFIG_KEYS
+        self._names = {} if parts.empty else {tuple(r[k] for k in self.key_fields): r['partition']
+                                             for r in parts.to_dict('records')}
+
+    def __getitem__(self, key):
+        return self.store.load(self._names[key])
+
+    def load(self, key, columns=None):
+        return self.store.load(self._names[key], columns)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def partition(self, key):
+        return self._names[key]
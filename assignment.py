@@ -0,0 +1,161 @@
+"""
+Sparse min-cost-flow assignment for batched allocation: a window of donors against a pruned candidate graph.
+
+Each donor (row) has its own short candidate list, a padded (rows, k) array of
+patient ids (-1 for padding) with the matching array of scores; no dense
+donors x patients matrix is formed. The flow network is
+
+    row -> candidate patient -> patient's group -> sink,    row -> sink (unplaced)
+
+with unit capacities on the row and patient arcs. A group's arc to the sink
+is free up to its cap and costs an overflow penalty beyond it, so caps bind
+unless the only alternative is leaving a kidney unplaced. Every placement
+carries a bonus larger than any score or overflow difference the window can
+make, so the optimum places as many donors as possible, then keeps overflow
+lowest, then maximises the total score.
+
+min_cost_assignment() solves it exactly by successive shortest paths: rows
+are added one at a time, each along the cheapest augmenting path found by
+Dijkstra with node potentials (reduced costs stay non-negative), which may
+move earlier rows to other candidates or swap patients within a full group.
+Most paths end at an unclaimed candidate of the new row, so a row typically
+costs one pass over its own candidate list.
+"""
+import heapq
+import numpy as np
+
+SINK, ROW, PATIENT, GROUP = -1, 0, 1, 2      # the sink sorts first among equal distances
+
+def min_cost_assignment(cand, score, group=None, caps=None):
+    """Column of cand assigned to each row (-1: unplaced), optimal as described in the module docstring.
+
+    cand is (rows, k) with -1 padding and score the same shape. group (same shape, the
+    candidate's group) and caps (per-group limits on rows placed) are optional.
+    """
+    n_rows, k = cand.shape
+    real = cand >= 0
+    col = np.full(n_rows, -1, dtype=np.int64)
+    if not real.any():
+        return col
+    ids, local = np.unique(cand[real], return_inverse=True)
+    n_pat = len(ids)
+    pid = np.full((n_rows, k), -1, dtype=np.int64)
+    pid[real] = local
+    if group is None:
+        pat_group, caps = np.zeros(n_pat, dtype=np.int64), np.array([n_rows])
+    else:
+        pat_group = np.zeros(n_pat, dtype=np.int64)
+        pat_group[local] = group[real]
+    n_groups = len(caps)
+    s = score[real]
+    spread = float(s.max() - s.min()) + 1.0
+    overflow = n_rows * spread
+    bonus = n_rows * (spread + overflow) + 1.0
+    cost = np.where(real, -(score - s.min() + bonus), np.inf)
+
+    # potentials: each row its best arc, everything else 0, so unclaimed patients stay at 0 and a
+    # search ends at the first one it reaches
+    pot_row = -np.where(real, cost, np.inf).min(axis=1)
+    pot_row[~real.any(axis=1)] = 0.0
+    pot_pat, pot_grp, pot_sink = np.zeros(n_pat), np.zeros(n_groups), 0.0
+    row_of = np.full(n_pat, -1, dtype=np.int64)        # row holding each patient
+    members = [set() for _ in range(n_groups)]         # patients placed into each group
+    count = np.zeros(n_groups, dtype=np.int64)
+
+    for start in range(n_rows):
+        js = np.nonzero(real[start])[0]
+        ps = pid[start, js]
+        rc = cost[start, js] + pot_row[start] - pot_pat[ps]
+        if len(js):
+            j = int(rc.argmin())
+            p = int(ps[j])
+            if rc[j] <= 0.0 and row_of[p] < 0 and count[pat_group[p]] < caps[pat_group[p]]:
+                # a zero-length path: the row's best arc ends at an unclaimed patient with room
+                col[start], row_of[p] = js[j], start
+                members[pat_group[p]].add(p)
+                count[pat_group[p]] += 1
+                continue
+        dist = (np.full(n_rows, np.inf), np.full(n_pat, np.inf), np.full(n_groups, np.inf))
+        prev = (np.full(n_rows, -1, dtype=np.int64), np.full(n_pat, -1, dtype=np.int64), np.full(n_groups, -1, dtype=np.int64))
+        dist[ROW][start] = 0.0
+        done = []
+        heap = [(0.0, ROW, start)]
+        d_sink, sink_prev = np.inf, None
+        while heap:
+            d, kind, v = heapq.heappop(heap)
+            if kind == SINK:
+                break
+            if d > dist[kind][v]:
+                continue
+            done.append((kind, v, d))
+            if kind == ROW:
+                # arcs to the sink and to candidates (except the one it holds, whose arc is saturated)
+                x = d + max(pot_row[v] - pot_sink, 0.0)
+                if x < d_sink:
+                    d_sink, sink_prev = x, (ROW, v)
+                    heapq.heappush(heap, (x, SINK, -1))
+                js = np.nonzero(real[v])[0]
+                ps = pid[v, js]
+                nd = d + np.maximum(cost[v, js] + pot_row[v] - pot_pat[ps], 0.0)
+                better = (nd < dist[PATIENT][ps]) & (nd < d_sink) & (row_of[ps] != v)
+                ps, nd = ps[better], nd[better]
+                dist[PATIENT][ps], prev[PATIENT][ps] = nd, v
+                for x, p in zip(nd.tolist(), ps.tolist()):
+                    heapq.heappush(heap, (x, PATIENT, p))
+            elif kind == PATIENT:
+                r = row_of[v]
+                if r >= 0:
+                    # reverse of the arc r -> v: r gives the patient up
+                    x = d + max(-cost[r, col[r]] + pot_pat[v] - pot_row[r], 0.0)
+                    if x < dist[ROW][r]:
+                        dist[ROW][r], prev[ROW][r] = x, v
+                        heapq.heappush(heap, (x, ROW, r))
+                else:
+                    g = pat_group[v]
+                    x = d + max(pot_pat[v] - pot_grp[g], 0.0)
+                    if x < dist[GROUP][g]:
+                        dist[GROUP][g], prev[GROUP][g] = x, v
+                        heapq.heappush(heap, (x, GROUP, g))
+            else:
+                x = d + max(pot_grp[v] - pot_sink + (0.0 if count[v] < caps[v] else overflow), 0.0)
+                if x < d_sink:
+                    d_sink, sink_prev = x, (GROUP, v)
+                    heapq.heappush(heap, (x, SINK, -1))
+                # reverse group arcs: a patient placed in the group makes room by leaving it
+                for p in members[v]:
+                    x = d + max(pot_grp[v] - pot_pat[p], 0.0)
+                    if x < dist[PATIENT][p]:
+                        dist[PATIENT][p], prev[PATIENT][p] = x, -2 - v
+                        heapq.heappush(heap, (x, PATIENT, p))
+
+        # potentials are only defined up to a constant: shift the nodes settled before the sink
+        pots = (pot_row, pot_pat, pot_grp)
+        for kind, v, d in done:
+            pots[kind][v] += d - d_sink
+
+        # walk the path back from the sink, applying each arc
+        kind, v = sink_prev
+        if kind == GROUP:
+            count[v] += 1
+            kind, v = PATIENT, int(prev[GROUP][v])
+            members[pat_group[v]].add(v)
+        else:
+            col[v] = -1
+        while not (kind == ROW and v == start):
+            if kind == ROW:
+                # v gave up the patient it came from; its new column is already set
+                kind, v = PATIENT, int(prev[ROW][v])
+                continue
+            u = int(prev[PATIENT][v])
+            if u >= 0:
+                row_of[v] = u
+                col[u] = int(np.nonzero(pid[u] == v)[0][0])
+                kind, v = ROW, u
+            else:
+                # v left full group g for the patient that entered it
+                g = -2 - u
+                members[g].discard(v)
+                row_of[v] = -1
+                v = int(prev[GROUP][g])
+                members[g].add(v)
+    return col
@@ -0,0 +1,93 @@
+"""
+Per-configuration checkpoints for sharded, resumable sweeps.
+
+A checkpoint directory holds grid.json, the sweep's full definition (cohort
+paths, sample sizes, alphas, etas, seeds, ...), and one small JSON result
+file per finished (policy, alpha, eta, seed) configuration under configs/.
+Every file is written to a temporary name and renamed into place, so a
+result file either exists complete or not at all; grid.json is created with
+a hard link, so concurrent workers agree on a single grid and one started
+with different settings is refused. Workers coordinate through the
+directory alone: each takes a contiguous slice of the grid (--shard i/N),
+skips configurations that already have a result file and writes its own as
+each one finishes.
+"""
+import json
+import os
+import socket
+import tempfile
+import time
+
+GRID_FILE = 'grid.json'
+
+def parse_shard(spec):
+    """'i/N' -> (i, N), 0 <= i < N."""
+    try:
+        i, n = (int(v) for v in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"shard must look like i/N, got {spec!r}") from None
+    if not 0 <= i < n:
+        raise ValueError(f"shard index must be in [0, {n}), got {i}")
+    return i, n
+
+def shard_slice(items, shard):
+    """Contiguous share of items for shard (i, N); neighbouring configs share a cohort sample."""
+    i, n = shard
+    return items[i * len(items) // n:(i + 1) * len(items) // n]
+
+def config_name(policy, alpha, eta, seed):
+    return f'{policy}-a{alpha:.6g}-e{eta:.6g}-s{seed}'
+
+def _write_atomic(path, payload):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(payload, f, indent=1, default=str)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class SweepCheckpoint:
+    """Checkpoint directory of one sweep grid."""
+    def __init__(self, root, grid=None):
+        """Open root; with grid (a JSON-ready dict) create grid.json, or check it matches the existing one."""
+        self.root = root
+        self.configs_dir = os.path.join(root, 'configs')
+        os.makedirs(self.configs_dir, exist_ok=True)
+        path = os.path.join(root, GRID_FILE)
+        if grid is not None:
+            grid = json.loads(json.dumps(grid, default=str))
+            fd, tmp = tempfile.mkstemp(dir=root, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(grid, f, indent=1)
+            try:
+                os.link(tmp, path)    # fails if another worker created the grid first
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(tmp)
+        with open(path) as f:
+            self.grid = json.load(f)
+        if grid is not None and grid != self.grid:
+            diff = sorted(k for k in set(grid) | set(self.grid) if grid.get(k) != self.grid.get(k))
+            raise ValueError(f"{root} holds a different sweep grid (differs in {', '.join(diff)}); "
+                             "use another checkpoint directory")
+
+    def _path(self, name):
+        return os.path.join(self.configs_dir, name + '.json')
+
+    def done(self):
+        """Names of the configurations with a result file."""
+        return {n[:-5] for n in os.listdir(self.configs_dir) if n.endswith('.json')}
+
+    def write(self, name, config, metrics, shard=None):
+        metrics = {k: v.item() if hasattr(v, 'item') else v for k, v in metrics.items()}
+        _write_atomic(self._path(name), {'config': config, 'metrics': metrics, 'shard': shard,
+                                         'host': socket.gethostname(), 'pid': os.getpid(),
+                                         'finished': time.strftime('%Y-%m-%dT%H:%M:%S')})
+
+    def read(self, name):
+        with open(self._path(name)) as f:
+            return json.load(f)
@@ -0,0 +1,137 @@
+"""
+Columnar binary cohort format.
+
+A cohort directory holds one .npy file per column plus meta.json. String
+columns are stored as int8 category codes with their dictionary in the
+metadata; float columns as float32, integer columns in the smallest signed
+integer type that fits. Loading memory-maps the .npy files instead of
+parsing text, so startup cost no longer scales with CSV parsing.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+FORMAT = 'cohort-columnar'
+VERSION = 1
+
+def is_columnar(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'meta.json'))
+
+def _int_dtype(values):
+    lo, hi = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return np.int64
+
+def _write_meta(out_dir, meta):
+    tmp = os.path.join(out_dir, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(out_dir, 'meta.json'))
+
+def convert_csv(csv_path, out_dir):
+    """Write csv_path as a columnar cohort directory; returns the metadata dict."""
+    df = pd.read_csv(csv_path)
+    os.makedirs(out_dir, exist_ok=True)
+    columns = []
+    for k, name in enumerate(df.columns):
+        col = df[name]
+        fname = f'{k:03d}.npy'
+        if pd.api.types.is_bool_dtype(col) or pd.api.types.is_integer_dtype(col):
+            values = col.values.astype(np.int64)
+            arr = values.astype(_int_dtype(values))
+            entry = {'kind': 'numeric'}
+        elif pd.api.types.is_float_dtype(col):
+            arr = col.values.astype(np.float32)
+            entry = {'kind': 'numeric'}
+        else:
+            cat = pd.Categorical(col.astype(str).where(col.notna(), None))
+            n_cat = len(cat.categories)
+            arr = cat.codes.astype(np.int8 if n_cat <= np.iinfo(np.int8).max else np.int16)
+            entry = {'kind': 'category', 'categories': cat.categories.tolist()}
+        np.save(os.path.join(out_dir, fname), arr)
+        columns.append({'name': name, 'file': fname, 'dtype': arr.dtype.str, **entry})
+    meta = {'format': FORMAT, 'version': VERSION, 'n_rows': len(df), 'source': os.path.basename(csv_path),
+            'columns': columns}
+    _write_meta(out_dir, meta)
+    return meta
+
+
+class ColumnarWriter:
+    """Fill a columnar cohort of known length chunk by chunk.
+
+    schema is a list of (name, dtype) or (name, [category labels]); category columns
+    are written from int codes into that label list. meta.json is only written once
+    every row is in place, so an interrupted write is never mistaken for a cohort.
+    Keys of extra are stored alongside the column list in meta.json.
+    """
+    def __init__(self, out_dir, n_rows, schema, source=None, extra=None):
+        os.makedirs(out_dir, exist_ok=True)
+        if os.path.exists(os.path.join(out_dir, 'meta.json')):
+            os.remove(os.path.join(out_dir, 'meta.json'))
+        self.out_dir, self.n_rows, self.source, self.extra = out_dir, n_rows, source, extra or {}
+        self.columns, self._arrays = [], {}
+        for k, (name, kind) in enumerate(schema):
+            fname = f'{k:03d}.npy'
+            if isinstance(kind, (list, tuple)):
+                dtype = np.int8 if len(kind) <= np.iinfo(np.int8).max else np.int16
+                entry = {'kind': 'category', 'categories': list(kind)}
+            else:
+                dtype, entry = np.dtype(kind), {'kind': 'numeric'}
+            self._arrays[name] = np.lib.format.open_memmap(os.path.join(out_dir, fname), mode='w+',
+                                                           dtype=dtype, shape=(n_rows,))
+            self.columns.append({'name': name, 'file': fname, 'dtype': np.dtype(dtype).str, **entry})
+        self.n_written = 0
+
+    def write(self, cols):
+        """Append a dict of equal-length column arrays (codes for category columns)."""
+        m = len(next(iter(cols.values())))
+        if self.n_written + m > self.n_rows:
+            raise ValueError(f"writing {m} rows would exceed the declared {self.n_rows}")
+        for name, arr in self._arrays.items():
+            arr[self.n_written:self.n_written + m] = cols[name]
+        self.n_written += m
+
+    def close(self):
+        for arr in self._arrays.values():
+            arr.flush()
+        self._arrays = {}
+        if self.n_written != self.n_rows:
+            raise ValueError(f"wrote {self.n_written} of {self.n_rows} declared rows")
+        _write_meta(self.out_dir, {'format': FORMAT, 'version': VERSION, 'n_rows': self.n_rows,
+                                   'source': self.source, 'columns': self.columns, **self.extra})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._arrays = {}
+
+def load_columnar(path, mmap=True, columns=None):
+    """DataFrame over the memory-mapped columns of a cohort directory (all, or just columns)."""
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('format') != FORMAT or meta.get('version') != VERSION:
+        raise ValueError(f"{path} is not a {FORMAT} v{VERSION} directory")
+    data = {}
+    for col in meta['columns']:
+        if columns is not None and col['name'] not in columns:
+            continue
+        arr = np.load(os.path.join(path, col['file']), mmap_mode='r' if mmap else None)
+        if col['kind'] == 'category':
+            data[col['name']] = pd.Categorical.from_codes(np.asarray(arr), categories=col['categories'])
+        else:
+            data[col['name']] = arr
+    return pd.DataFrame(data, copy=False)
+
+def read_cohort(path):
+    """Load a cohort from either a CSV file or a columnar directory."""
+    if is_columnar(path):
+        return load_columnar(path)
+    return pd.read_csv(path)
@@ -0,0 +1,206 @@
+"""
+Synthetic patient and donor cohorts (the model from notebooks/simulate_patients_donors.ipynb).
+
+Patients: age, dialysis years and latent diabetes / prior-transplant draws come
+from one correlated Gaussian fitted to the 2019 SRTR EPTS factor marginals;
+the binary factors are thresholded to their target prevalences, raw EPTS is
+mapped to the published percentile table, and the categorical attributes are
+drawn independently. Donors: KDPI and age uniform within SRTR bins, blood type
+categorical.
+
+Generation is vectorised and runs in fixed blocks of _RNG_BLOCK rows, each with
+its own RNG stream seeded by (seed, stream, block), so a cohort is reproducible
+per seed whatever chunk size the caller consumes it in.
+"""
+import os
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from cohort_io import ColumnarWriter
+
+_RNG_BLOCK = 1 << 16
+_PATIENT_STREAM, _DONOR_STREAM = 0, 1
+
+# SRTR 2019 EPTS factor distributions
+AGE_MIDPOINTS, AGE_PROBS = np.array([26, 42, 57, 72]), np.array([0.083, 0.240, 0.435, 0.242])
+DIALYSIS_MIDPOINTS, DIALYSIS_PROBS = np.array([0, 0.5, 2, 4, 6]), np.array([0.182, 0.116, 0.213, 0.167, 0.322])
+DIABETES_PREVALENCE, PRIOR_TX_PREVALENCE = 0.468, 0.118
+# Bernoulli SDs are shrunk so they do not swamp the covariance structure
+LATENT_SD_SCALE = 0.37
+RHO = {('age', 'dial'): 0.20, ('age', 'diab'): 0.25, ('age', 'prior'): 0.10,
+       ('dial', 'diab'): 0.30, ('dial', 'prior'): 0.15, ('diab', 'prior'): 0.10}
+
+PATIENT_CATEGORIES = {
+    'Sex': (['F', 'M'], [0.381, 0.619]),
+    'Ethnicity': (['White', 'Black', 'Hispanic', 'Asian', 'Other'], [0.355, 0.323, 0.207, 0.097, 0.018]),
+    'DistancetoCenterMiles': (['<50', '50-100', '100-150', '150-250', '>250'], [0.663, 0.157, 0.069, 0.061, 0.047]),
+    'BloodType': (['A', 'B', 'AB', 'O'], [0.273, 0.167, 0.025, 0.535]),
+    'WaitTimeYears': (['<1', '1-2', '2-3', '3-4', '4-5', '>5'], [0.329, 0.215, 0.143, 0.104, 0.072, 0.137]),
+}
+DONOR_BLOOD_TYPES = (['A', 'B', 'AB', 'O'], [0.413, 0.128, 0.054, 0.405])
+# 5% of donors have unknown KDPI; bin probabilities are renormalised over the rest
+KDPI_BINS, KDPI_PROBS = [(0, 20), (20, 35), (35, 85), (85, 100)], [0.206, 0.111, 0.447, 0.186]
+DONOR_AGE_BINS, DONOR_AGE_PROBS = [(18, 34), (35, 49), (50, 64), (65, 90)], [0.250, 0.263, 0.288, 0.086]
+
+# Official raw EPTS -> EPTS score (percentile) table: upper bound of each percentile
+EPTS_UPPER_BOUNDS = np.array([
+    0.01184827379332, 0.21310210737676, 0.40252326481930, 0.52800000000000,
+    0.61801976010923, 0.71057871011496, 0.78782781442424, 0.85771064385749,
+    0.92387462259398, 0.98764264652321, 1.04590485968515, 1.09933073333614,
+    1.15638329911020, 1.20971321013005, 1.25784543260537, 1.30468387455511,
+    1.35114305270363, 1.39696372347707, 1.44043463381246, 1.48161190965092,
+    1.52021149897331, 1.55920533880904, 1.59484531143053, 1.62808213552361,
+    1.65982819986311, 1.69011088295688, 1.72058765890643, 1.74844920196828,
+    1.77551471594798, 1.80172896022488, 1.82626695257618, 1.85104928131417,
+    1.87446885694730, 1.89736960985626, 1.92001468736874, 1.94089972738606,
+    1.96259067534531, 1.98299520876112, 2.00301505817933, 2.02300693973232,
+    2.04283275957921, 2.06033324099255, 2.07901711156742, 2.09753586134351,
+    2.11445516769336, 2.13195550992471, 2.14932717316906, 2.16505133470226,
+    2.18131759069131, 2.19695261029016, 2.21262422997947, 2.22883854789024,
+    2.24526417931112, 2.26074101528416, 2.27693086926763, 2.29203216974675,
+    2.30747364818617, 2.32239630390144, 2.33719849418207, 2.35233619399769,
+    2.36720658011572, 2.38223956194387, 2.39716290212183, 2.41171798708993,
+    2.42672344324962, 2.44241981474590, 2.45704382237689, 2.47204106776181,
+    2.48615153831781, 2.50130321697467, 2.51610951403148, 2.53117864476386,
+    2.54691372810912, 2.56188750397993, 2.57783580816370, 2.59371564589885,
+    2.60883983572895, 2.62490395223486, 2.64215263518138, 2.65902464065708,
+    2.67751421968340, 2.69582272416153, 2.71585259723488, 2.73434907597536,
+    2.75311920676514, 2.77272279260780, 2.79350504661888, 2.81476309520569,
+    2.83763973196257, 2.85957991275097, 2.88260648450195, 2.90694476081954,
+    2.93331208731685, 2.96201988546123, 2.99154579542839, 3.02388623085550,
+    3.06016380052332, 3.10215168515328, 3.15286397325764, 3.23640591422491,
+    3.76844960318675, 999999999.0
+])
+
+PATIENT_SCHEMA = [('Age', np.float32), ('DialysisYears', np.float32), ('Diabetes', np.int8), ('PriorTx', np.int8),
+                  ('RawEPTS', np.float32), ('EPTSScore', np.int8)] + \
+                 [(name, labels) for name, (labels, _) in PATIENT_CATEGORIES.items()]
+DONOR_SCHEMA = [('KDPI', np.float32), ('DonorBloodType', DONOR_BLOOD_TYPES[0]), ('DonorAge', np.float32)]
+
+def latent_gaussian():
+    """Mean vector and covariance of (Age, DialysisYears, DiabetesLatent, PriorTxLatent)."""
+    mean_age = (AGE_MIDPOINTS * AGE_PROBS).sum()
+    mean_dial = (DIALYSIS_MIDPOINTS * DIALYSIS_PROBS).sum()
+    sd = {'age': np.sqrt((AGE_PROBS * (AGE_MIDPOINTS - mean_age) ** 2).sum()),
+          'dial': np.sqrt((DIALYSIS_PROBS * (DIALYSIS_MIDPOINTS - mean_dial) ** 2).sum()),
+          'diab': LATENT_SD_SCALE * np.sqrt(DIABETES_PREVALENCE * (1 - DIABETES_PREVALENCE)),
+          'prior': LATENT_SD_SCALE * np.sqrt(PRIOR_TX_PREVALENCE * (1 - PRIOR_TX_PREVALENCE))}
+    names = ['age', 'dial', 'diab', 'prior']
+    mu = np.array([mean_age, mean_dial, DIABETES_PREVALENCE, PRIOR_TX_PREVALENCE])
+    cov = np.empty((4, 4))
+    for i, a in enumerate(names):
+        for j, b in enumerate(names):
+            rho = 1.0 if i == j else RHO.get((a, b), RHO.get((b, a)))
+            cov[i, j] = rho * sd[a] * sd[b]
+    return mu, cov
+
+_MU, _COV = latent_gaussian()
+_CHOL = np.linalg.cholesky(_COV)
+# Thresholds on the latent columns that give the target prevalences
+_T_DIABETES = NormalDist(_MU[2], np.sqrt(_COV[2, 2])).inv_cdf(1 - DIABETES_PREVALENCE)
+_T_PRIOR = NormalDist(_MU[3], np.sqrt(_COV[3, 3])).inv_cdf(1 - PRIOR_TX_PREVALENCE)
+
+def raw_epts(age, dialysis_years, diabetes, prior_tx):
+    age_component = np.maximum(age - 25, 0)
+    log_dialysis = np.log(dialysis_years + 1)
+    no_dialysis = (dialysis_years == 0).astype(float)
+    return (0.047 * age_component - 0.015 * diabetes * age_component
+            + 0.398 * prior_tx - 0.237 * diabetes * prior_tx
+            + 0.315 * log_dialysis - 0.099 * diabetes * log_dialysis
+            + 0.130 * no_dialysis - 0.348 * diabetes * no_dialysis
+            + 1.262 * diabetes)
+
+def epts_score(raw):
+    """EPTS percentile (0-100) for raw EPTS values via the official table."""
+    return np.clip(np.searchsorted(EPTS_UPPER_BOUNDS, raw, side='right') - 1, 0, 100)
+
+def _categorical_codes(probs, u):
+    cdf = np.cumsum(probs, dtype=float)
+    return np.minimum(np.searchsorted(cdf / cdf[-1], u, side='right'), len(probs) - 1)
+
+def _uniform_in_bins(bins, probs, u_bin, u_val):
+    lo, hi = np.array(bins, dtype=float).T
+    k = _categorical_codes(probs, u_bin)
+    return lo[k] + (hi - lo)[k] * u_val
+
+def _block_rng(seed, stream, block):
+    return np.random.default_rng([seed, stream, block])
+
+def _patient_block(seed, block, n):
+    """Columns (category columns as codes) for n patients of RNG block `block`."""
+    rng = _block_rng(seed, _PATIENT_STREAM, block)
+    z = rng.standard_normal((n, 4)) @ _CHOL.T + _MU
+    age = np.maximum(z[:, 0], 18)
+    dialysis = np.maximum(z[:, 1], 0)
+    diabetes = (z[:, 2] > _T_DIABETES).astype(np.int8)
+    prior_tx = (z[:, 3] > _T_PRIOR).astype(np.int8)
+    raw = raw_epts(age, dialysis, diabetes, prior_tx)
+    cols = {'Age': age, 'DialysisYears': dialysis, 'Diabetes': diabetes, 'PriorTx': prior_tx,
+            'RawEPTS': raw, 'EPTSScore': epts_score(raw).astype(np.int8)}
+    u = rng.random((len(PATIENT_CATEGORIES), n))
+    for k, (name, (_, probs)) in enumerate(PATIENT_CATEGORIES.items()):
+        cols[name] = _categorical_codes(probs, u[k]).astype(np.int8)
+    return cols
+
+def _donor_block(seed, block, n):
+    rng = _block_rng(seed, _DONOR_STREAM, block)
+    u = rng.random((5, n))
+    return {'KDPI': _uniform_in_bins(KDPI_BINS, KDPI_PROBS, u[0], u[1]),
+            'DonorBloodType': _categorical_codes(DONOR_BLOOD_TYPES[1], u[2]).astype(np.int8),
+            'DonorAge': _uniform_in_bins(DONOR_AGE_BINS, DONOR_AGE_PROBS, u[3], u[4])}
+
+def _iter_blocks(make_block, n, seed, chunk_size):
+    """Re-cut the fixed RNG blocks into chunks of chunk_size rows (last one shorter)."""
+    rest = None
+    for block, start in enumerate(range(0, n, _RNG_BLOCK)):
+        cols = make_block(seed, block, min(_RNG_BLOCK, n - start))
+        if rest is not None:
+            cols = {k: np.concatenate([rest[k], v]) for k, v in cols.items()}
+        m = len(next(iter(cols.values())))
+        pos = 0
+        while m - pos >= chunk_size:
+            yield {k: v[pos:pos + chunk_size] for k, v in cols.items()}
+            pos += chunk_size
+        rest = {k: v[pos:] for k, v in cols.items()} if pos < m else None
+    if rest is not None:
+        yield rest
+
+def _frame(cols, schema):
+    data = {}
+    for name, kind in schema:
+        if isinstance(kind, list):
+            data[name] = pd.Categorical.from_codes(cols[name], categories=kind)
+        else:
+            data[name] = cols[name]
+    return pd.DataFrame(data)
+
+def iter_patients(n, seed=0, chunk_size=1_000_000):
+    """DataFrames of up to chunk_size synthetic patients, n in total."""
+    for cols in _iter_blocks(_patient_block, n, seed, chunk_size):
+        yield _frame(cols, PATIENT_SCHEMA)
+
+def iter_donors(n, seed=0, chunk_size=1_000_000):
+    for cols in _iter_blocks(_donor_block, n, seed, chunk_size):
+        yield _frame(cols, DONOR_SCHEMA)
+
+def generate_patients(n, seed=0):
+    return pd.concat(iter_patients(n, seed), ignore_index=True)
+
+def generate_donors(n, seed=0):
+    return pd.concat(iter_donors(n, seed), ignore_index=True)
+
+def write_cohort(path, kind, n, seed=0, chunk_size=1_000_000, fmt='csv'):
+    """Stream n patients or donors to path (a CSV file, or a columnar directory with fmt='columnar')."""
+    make_block, schema = (_patient_block, PATIENT_SCHEMA) if kind == 'patients' else (_donor_block, DONOR_SCHEMA)
+    chunks = _iter_blocks(make_block, n, seed, chunk_size)
+    if fmt == 'columnar':
+        with ColumnarWriter(path, n, schema, source=f'cohort_sim:{kind}:seed={seed}') as writer:
+            for cols in chunks:
+                writer.write(cols)
+        return
+    tmp = path + '.tmp'
+    header = True
+    for cols in chunks:
+        _frame(cols, schema).to_csv(tmp, mode='w' if header else 'a', header=header, index=False)
+        header = False
+    os.replace(tmp, path)
@@ -0,0 +1,124 @@
+"""
+Deletable upper envelope of lines over a closed x-domain.
+
+UpperEnvelopeTree keeps lines y = c + m * x in a segment tree ordered by slope.
+Every node stores the upper hull of its alive lines restricted to [lo, hi];
+a parent's hull is the upper hull of its children's hulls (a line that is
+dominated inside a child is dominated in the parent too), so queries are a
+binary search on the root hull and a delete/revive only rebuilds the hulls on
+one leaf-to-root path. Hull sizes stay small for realistic line sets, so
+updates cost O(log n * hull size) and queries O(log hull size).
+"""
+import numpy as np
+
+
+class UpperEnvelopeTree:
+    def __init__(self, intercepts, slopes, ids=None, lo=0.0, hi=1.0):
+        c = np.asarray(intercepts, dtype=float)
+        m = np.asarray(slopes, dtype=float)
+        ids = np.arange(len(c)) if ids is None else np.asarray(ids)
+        order = np.lexsort((c, m))
+        self.lo, self.hi = float(lo), float(hi)
+        self._c = c[order].tolist()
+        self._m = m[order].tolist()
+        self._ids = ids[order].tolist()
+        self._leaf_of = {line_id: p for p, line_id in enumerate(self._ids)}
+        n = len(order)
+        size = 1
+        while size < max(n, 1):
+            size *= 2
+        self._size = size
+        self._alive = [True] * n
+        hulls = [[] for _ in range(2 * size)]
+        for p in range(n):
+            hulls[size + p] = [p]
+        for node in range(size - 1, 0, -1):
+            hulls[node] = self._merge(hulls[2 * node], hulls[2 * node + 1])
+        self._hulls = hulls
+
+    def __len__(self):
+        return sum(self._alive)
+
+    def _merge(self, left, right):
+        # Both inputs are hulls in slope order and every slope in left <= every slope in right.
+        if not left:
+            return right
+        if not right:
+            return left
+        c, m = self._c, self._m
+        st = []
+        for p in left + right:
+            mp, cp = m[p], c[p]
+            if st and m[st[-1]] == mp:
+                st.pop()            # same slope, sorted by intercept: the newer line dominates
+            while len(st) >= 2:
+                s, t = st[-2], st[-1]
+                # t is redundant if p overtakes s no later than t does
+                if (c[s] - cp) * (m[t] - m[s]) <= (c[s] - c[t]) * (mp - m[s]):
+                    st.pop()
+                else:
+                    break
+            st.append(p)
+        lo, hi = self.lo, self.hi
+        k = 0
+        while k + 1 < len(st) and c[st[k]] + m[st[k]] * lo <= c[st[k + 1]] + m[st[k + 1]] * lo:
+            k += 1
+        while len(st) - 1 > k and c[st[-1]] + m[st[-1]] * hi <= c[st[-2]] + m[st[-2]] * hi:
+            st.pop()
+        return st[k:]
+
+    def _update(self, line_id, alive):
+        p = self._leaf_of[line_id]
+        if self._alive[p] == alive:
+            return
+        self._alive[p] = alive
+        node = self._size + p
+        hulls = self._hulls
+        hulls[node] = [p] if alive else []
+        node //= 2
+        while node:
+            hulls[node] = self._merge(hulls[2 * node], hulls[2 * node + 1])
+            node //= 2
+
+    def delete(self, line_id):
+        self._update(line_id, False)
+
+    def revive(self, line_id):
+        self._update(line_id, True)
+
+    def _locate(self, x):
+        hull = self._hulls[1]
+        if not hull:
+            return None, -1
+        c, m = self._c, self._m
+        lo_i, hi_i = 0, len(hull) - 1
+        while lo_i < hi_i:
+            mid = (lo_i + hi_i) // 2
+            a, b = hull[mid], hull[mid + 1]
+            if c[a] + m[a] * x >= c[b] + m[b] * x:
+                hi_i = mid
+            else:
+                lo_i = mid + 1
+        return hull, lo_i
+
+    def query(self, x):
+        """(id, value) of the highest alive line at x, or (None, -inf) if empty."""
+        hull, k = self._locate(x)
+        if hull is None:
+            return None, -np.inf
+        p = hull[k]
+        return self._ids[p], self._c[p] + self._m[p] * x
+
+    def query_segment(self, x):
+        """Like query(), plus the x where the next envelope line takes over (hi if none)."""
+        hull, k = self._locate(x)
+        if hull is None:
+            return None, -np.inf, self.hi
+        c, m = self._c, self._m
+        p = hull[k]
+        if k + 1 < len(hull):
+            q = hull[k + 1]
+            x_next = min((c[p] - c[q]) / (m[q] - m[p]), self.hi)
+        else:
+            x_next = self.hi
+        return self._ids[p], c[p] + m[p] * x, x_next
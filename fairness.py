@@ -0,0 +1,130 @@
+"""
+Fairness groups and the deficit tracker behind the fairness_eta > 0 restriction.
+
+A fairness dimension is a patient column, or an intersection of columns
+written 'Ethnicity*Sex*DistancetoCenterMiles'. Every (dimension, value) pair
+is a cell with a global id, so a patient belongs to exactly one cell per
+dimension. With several weighted dimensions the allocator restricts a donor
+to the single cell with the largest weighted deficit
+    w_dim * (p_share[cell] * n_assigned - n_allocated[cell]),
+i.e. "Black OR >250 miles" rather than their intersection, as in the
+multidim-fairness branch (see BRANCHES.md).
+
+DeficitTracker only lets a cell win if the donor can actually serve it: it
+keeps per-(recipient ABO, cell) counts of available patients and, per donor
+ABO type, a mask of cells with at least one compatible patient left. A
+match touches one cell per dimension, so updates are O(D); the query is a
+single vectorised argmax over the cells.
+"""
+import numpy as np
+
+INTERSECT = '*'
+# donor ABO code -> recipient ABO codes (O, A, B, AB = 0..3); row 4 is the unknown donor type
+COMPATIBLE = np.array([[1, 1, 1, 1],
+                       [0, 1, 0, 1],
+                       [0, 0, 1, 1],
+                       [0, 0, 0, 1],
+                       [0, 0, 0, 0]], dtype=bool)
+
+def group_values(df, spec):
+    """String group labels for a column, or an intersection 'col1*col2*...' of columns."""
+    cols = spec.split(INTERSECT)
+    values = df[cols[0]].astype(str).values
+    for col in cols[1:]:
+        values = np.char.add(np.char.add(values.astype(str), INTERSECT), df[col].astype(str).values.astype(str))
+    return values
+
+def has_groups(df, spec):
+    return all(col in df.columns for col in spec.split(INTERSECT))
+
+def fairness_cells(df, dims, weights=None):
+    """Kernel arrays for the weighted fairness dimensions dims (column or intersection specs).
+
+    Weights are normalised to sum to one. Returns cells (n, D) global cell ids, cell_p (patient
+    share of each cell within its dimension), cell_w (the dimension weight of each cell),
+    cell_offsets (D + 1 bounds of each dimension's ids), cell_labels and fair_dims.
+    """
+    weights = np.ones(len(dims)) if weights is None else np.asarray(weights, dtype=float)
+    if len(weights) != len(dims) or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("need one non-negative weight per fairness dimension")
+    weights = weights / weights.sum()
+    cells, cell_p, cell_w, labels, offsets = [], [], [], [], [0]
+    for spec, w in zip(dims, weights):
+        uniq, codes, counts = np.unique(group_values(df, spec), return_inverse=True, return_counts=True)
+        cells.append(codes + offsets[-1])
+        cell_p.append(counts / len(codes))
+        cell_w.append(np.full(len(uniq), w))
+        labels += [f'{spec}={u}' for u in uniq]
+        offsets.append(offsets[-1] + len(uniq))
+    # global cell ids in int8 unless there are too many cells
+    cell_dtype = np.int8 if offsets[-1] <= np.iinfo(np.int8).max else np.int32
+    return {'cells': np.stack(cells, axis=1).astype(cell_dtype), 'cell_p': np.concatenate(cell_p), 'cell_w': np.concatenate(cell_w),
+            'cell_offsets': np.array(offsets, dtype=np.int64), 'cell_labels': np.array(labels),
+            'fair_dims': np.array(dims)}
+
+def cell_arrays(pat):
+    """(cells, cell_p, cell_w, cell_offsets) of pat; the single group_col dimension if none were set."""
+    if 'cells' in pat:
+        return pat['cells'], pat['cell_p'], pat['cell_w'], pat['cell_offsets']
+    G = len(pat['p_share'])
+    return pat['group'][:, None], pat['p_share'], np.ones(G), np.array([0, G], dtype=np.int64)
+
+def dimension_l1(recipients, pat):
+    """fairness_L1_<dim> of the matched recipients for each fairness dimension in pat."""
+    if 'fair_dims' not in pat or len(recipients) == 0:
+        return {}
+    cells, cell_p, _, offsets = cell_arrays(pat)
+    share = np.bincount(cells[recipients].ravel(), minlength=len(cell_p)) / len(recipients)
+    return {f'fairness_L1_{dim}': 0.5 * float(np.abs(share - cell_p)[offsets[k]:offsets[k + 1]].sum())
+            for k, dim in enumerate(pat['fair_dims'].tolist())}
+
+
+class DeficitTracker:
+    """Weighted per-cell deficits and per-donor-ABO servability for the fairness restriction."""
+    def __init__(self, pat):
+        cells, cell_p, cell_w, _ = cell_arrays(pat)
+        self.cells, self.abo = cells, pat['abo']
+        self.slope, self.weight = cell_p * cell_w, cell_w
+        self.counts = np.zeros(len(cell_p), dtype=np.int64)
+        self.weighted = np.zeros(len(cell_p))      # weight * counts, kept incrementally
+        self.n_assigned = 0
+        known = self.abo >= 0
+        alive = np.zeros((4, len(cell_p)), dtype=np.int64)
+        for k in range(cells.shape[1]):
+            np.add.at(alive, (self.abo[known], cells[known, k]), 1)
+        self.alive = alive.tolist()
+        # 0 where the donor type can serve the cell, -inf where it cannot
+        self.penalty = np.where(COMPATIBLE.astype(np.int64) @ (alive > 0) > 0, 0.0, -np.inf)
+
+    def deficits(self):
+        return self.slope * self.n_assigned - self.weighted
+
+    def restrict(self, donor_abo):
+        """Cell to restrict a donor of ABO code donor_abo to, or -1 for no restriction."""
+        if self.n_assigned == 0:
+            return -1
+        d = self.slope * self.n_assigned - self.weighted
+        d += self.penalty[donor_abo]
+        g = int(d.argmax())
+        return g if d[g] > 0 else -1
+
+    def assign(self, i):
+        """Record a match of patient i: O(1) per fairness dimension."""
+        alive = self.alive[self.abo[i]]
+        for c in self.cells[i].tolist():
+            self.counts[c] += 1
+            self.weighted[c] += self.weight[c]
+            alive[c] -= 1
+            if alive[c] == 0:
+                self.penalty[:, c] = [0.0 if any(self.alive[a][c] for a in np.nonzero(row)[0]) else -np.inf
+                                      for row in COMPATIBLE]
+        self.n_assigned += 1
+
+    def snapshot(self):
+        return (self.counts.copy(), self.weighted.copy(), [row[:] for row in self.alive], self.penalty.copy(),
+                self.n_assigned)
+
+    def restore(self, state):
+        counts, weighted, alive, penalty, self.n_assigned = state
+        self.counts, self.weighted, self.penalty = counts.copy(), weighted.copy(), penalty.copy()
+        self.alive = [row[:] for row in alive]
@@ -0,0 +1,122 @@
+"""
+Content-addressed cache for allocation setup (cohort feature arrays, sorted index lists).
+
+Entries are .npz files named by a hash of their inputs: the SHA-256 of the
+cohort CSVs plus sample sizes, seed and policy parameters. The directory is
+bounded by total size and evicts least recently used entries; an in-process
+memo in front of it keeps recent entries in memory.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+_digests = {}
+
+def file_digest(path):
+    """SHA-256 of a file's contents, memoised per (path, size, mtime).
+
+    A directory (e.g. a columnar cohort) hashes the names and digests of its files.
+    """
+    if os.path.isdir(path):
+        h = hashlib.sha256()
+        for name in sorted(os.listdir(path)):
+            if os.path.isfile(os.path.join(path, name)):
+                h.update(name.encode() + b'\0' + file_digest(os.path.join(path, name)).encode())
+        return h.hexdigest()
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo_key not in _digests:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _digests[memo_key] = h.hexdigest()
+    return _digests[memo_key]
+
+def make_key(kind, **parts):
+    payload = json.dumps({'kind': kind, **parts}, sort_keys=True, default=str)
+    return kind + '-' + hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class FeatureCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3, memo_items=16):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memo_items = memo_items
+        self._memo = OrderedDict()
+        self.hits = self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def _remember(self, key, arrays):
+        self._memo[key] = arrays
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.memo_items:
+            self._memo.popitem(last=False)
+
+    def get(self, key):
+        """Dict of arrays stored under key, or None."""
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            self.hits += 1
+            return self._memo[key]
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                arrays = {k: z[k] for k in z.files}
+            os.utime(path)     # mtime marks recency for eviction
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, arrays)
+        return arrays
+
+    def put(self, key, arrays):
+        # get() loads without pickle, so an object array would be written but never read back
+        pickled = [k for k, v in arrays.items() if np.asarray(v).dtype.hasobject]
+        if pickled:
+            raise TypeError(f"cannot cache object arrays: {', '.join(pickled)}")
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._remember(key, arrays)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            self._memo.pop(name[:-len('.npz')], None)
+            total -= size
+
+    def get_or_build(self, key, build):
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = build()
+            self.put(key, arrays)
+        return arrays
@@ -0,0 +1,62 @@
+"""
+Ranked match runs: candidate order across several sorted lists, and offer acceptance.
+
+The greedy kernel matches a donor to the best of the current heads of its
+compatible (ABO, bin) lists, scored exactly at the donor's KDPI. Offering the
+kidney down a match run repeats that comparison: take the best head, move
+that list on, compare again. Because lists are sorted by a bin-level key
+rather than the exact score, this is a merge of sequences that are not
+themselves sorted; it takes an entry from list i before one from list j
+exactly when the running minimum of list i's scores up to that entry is
+larger (ties: lower list, then earlier position). merge_prefix sorts on
+that key, so a run is built a block of candidates at a time instead of one
+head comparison per offer.
+
+AcceptanceModel gives each offer an acceptance probability from the donor's
+KDPI and the candidate's EPTS, a logistic model evaluated on whole blocks.
+"""
+import numpy as np
+
+# uniforms are drawn per donor in chunks of this size, so results do not depend on merge block sizes
+DRAW_CHUNK = 64
+
+def merge_prefix(keys, sources, positions, bounds):
+    """Final part of a match run over the fetched entries of several lists.
+
+    keys are the running minima of each entry's list (see module docstring), sources
+    the list ids and positions the entries' ranks within their lists. bounds[i] is the
+    last fetched key of list i if more of it remains unfetched, else None. Returns the
+    indices of the entries, in run order, that no unfetched entry can precede.
+    """
+    order = np.lexsort((positions, sources, -keys))
+    k, s = keys[order], sources[order]
+    safe = np.ones(len(order), dtype=bool)
+    for i, m in enumerate(bounds):
+        if m is not None:
+            safe &= (k > m) | ((k == m) & (s <= i))
+    # safety is monotone along the order, so it is a prefix
+    return order[:len(order) if safe.all() else int(safe.argmin())]
+
+
+class AcceptanceModel:
+    """Logistic offer acceptance: p = 1 / (1 + exp(-(intercept + kdpi*K + epts*E + interaction*K*E))).
+
+    K is the donor KDPI scaled to [0, 1] and E the candidate's EPTS_norm, so by default
+    high-KDPI kidneys are declined most and older, higher-EPTS candidates accept them more
+    readily; at KDPI 90 the expected offer depth is in the hundreds.
+    """
+    def __init__(self, intercept=1.5, kdpi=-8.0, epts=1.5, interaction=1.0):
+        self.intercept, self.kdpi, self.epts, self.interaction = intercept, kdpi, epts, interaction
+
+    def probability(self, kdpi_norm, epts_norm):
+        z = self.intercept + self.kdpi * kdpi_norm + self.epts * epts_norm + self.interaction * kdpi_norm * epts_norm
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def as_dict(self):
+        return {'intercept': self.intercept, 'kdpi': self.kdpi, 'epts': self.epts, 'interaction': self.interaction}
+
+
+class AlwaysAccept(AcceptanceModel):
+    """Every first offer is accepted: the match run reduces to the greedy kernel."""
+    def probability(self, kdpi_norm, epts_norm):
+        return np.ones(np.broadcast(kdpi_norm, epts_norm).shape)
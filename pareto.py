@@ -0,0 +1,118 @@
+"""
+Pareto fronts of policy summaries: skyline, hypervolume and utopia distance.
+
+Objectives are maximised after flipping the sign of minimised ones (see
+OBJECTIVES). pareto_mask is sort-based: after a lexicographic sort that makes
+duplicates adjacent, every dominator of a point precedes it, so 2D fronts take
+one running maximum and 3D fronts one sweep in blocks (a suffix maximum over
+the second objective's ranks against earlier blocks, pairwise checks among a
+block's survivors). Hypervolume and utopia distances are computed on
+objectives normalised to [0, 1] between the worst and best value observed in
+the whole summary.
+"""
+import numpy as np
+import pandas as pd
+
+# column -> +1 maximise, -1 minimise
+OBJECTIVES = {'total_benefit_years': 1, 'mean_urgency_norm': 1, 'fairness_L1': -1}
+_BLOCK = 1024
+
+def _oriented(df, objectives):
+    return np.column_stack([df[c].to_numpy(dtype=float) * s for c, s in objectives.items()])
+
+def _dominated_sorted(Q):
+    """Dominated mask of distinct rows Q sorted descending lexicographically (maximisation, 1-3 columns)."""
+    n, k = Q.shape
+    dominated = np.zeros(n, dtype=bool)
+    if k == 1:
+        dominated[1:] = True
+    elif k == 2:
+        best = np.maximum.accumulate(Q[:, 1])
+        dominated[1:] = best[:-1] >= Q[1:, 1]
+    elif k == 3:
+        ranks = np.unique(Q[:, 1], return_inverse=True)[1].ravel()
+        top = np.full(ranks.max() + 1, -np.inf)     # max third objective so far per second-objective rank
+        suffix = top.copy()
+        for lo in range(0, n, _BLOCK):
+            r, z = ranks[lo:lo + _BLOCK], Q[lo:lo + _BLOCK, 2]
+            hit = suffix[r] >= z
+            # a point dominated by an earlier block cannot be the only dominator of anything
+            live = np.nonzero(~hit)[0]
+            y, zl = Q[lo + live, 1], z[live]
+            pair = (y[None, :] >= y[:, None]) & (zl[None, :] >= zl[:, None])
+            hit[live] = np.tril(pair, -1).any(axis=1)
+            dominated[lo:lo + _BLOCK] = hit
+            keep = ~hit
+            np.maximum.at(top, r[keep], z[keep])
+            suffix = np.maximum.accumulate(top[::-1])[::-1]
+    else:
+        raise ValueError("pareto_mask handles 1 to 3 objectives")
+    return dominated
+
+def pareto_mask(df, objectives=OBJECTIVES):
+    """Boolean Series: rows of df not dominated on the given objectives (ties are all kept)."""
+    P = _oriented(df, objectives)
+    valid = np.nonzero(~np.isnan(P).any(axis=1))[0]
+    mask = np.zeros(len(df), dtype=bool)
+    if len(valid):
+        Q = P[valid]
+        order = np.lexsort(tuple(-Q[:, j] for j in range(Q.shape[1] - 1, -1, -1)))
+        Q = Q[order]
+        # after the sort duplicates are adjacent; they share the first copy's status
+        new = np.ones(len(Q), dtype=bool)
+        new[1:] = (Q[1:] != Q[:-1]).any(axis=1)
+        group = np.cumsum(new) - 1
+        mask[valid[order]] = ~_dominated_sorted(Q[new])[group]
+    return pd.Series(mask, index=df.index)
+
+def normalise(df, objectives=OBJECTIVES, bounds=None):
+    """Objectives scaled to [0, 1] from worst to best; bounds defaults to df's own (worst, best) per column."""
+    P = _oriented(df, objectives)
+    lo, hi = (np.nanmin(P, axis=0), np.nanmax(P, axis=0)) if bounds is None else bounds
+    span = np.where(hi > lo, hi - lo, 1.0)
+    return (P - lo) / span, (lo, hi)
+
+def hypervolume(points):
+    """Volume dominated by points (maximisation, normalised to [0, 1]) above the origin, 2 or 3 columns.
+
+    2D is one sort; 3D slices along the third objective, so it is quadratic in the front size.
+    """
+    P = np.clip(np.asarray(points, dtype=float), 0.0, None)
+    if len(P) == 0:
+        return 0.0
+    if P.shape[1] == 2:
+        P = P[np.lexsort((-P[:, 1], -P[:, 0]))]
+        y = np.maximum.accumulate(P[:, 1])
+        x_next = np.append(P[1:, 0], 0.0)
+        return float(((P[:, 0] - x_next) * y).sum())
+    if P.shape[1] == 3:
+        # slice along the third objective: between consecutive levels the 2D area of points above is constant
+        P = P[np.argsort(-P[:, 2], kind='stable')]
+        levels = np.append(P[1:, 2], 0.0)
+        total = 0.0
+        for k in np.nonzero(P[:, 2] > levels)[0]:
+            total += hypervolume(P[:k + 1, :2]) * (P[k, 2] - levels[k])
+        return float(total)
+    raise ValueError("hypervolume handles 2 or 3 objectives")
+
+def utopia_distance(points):
+    """Euclidean distance of normalised points to the utopia point (1, ..., 1)."""
+    return np.sqrt(((1.0 - np.asarray(points, dtype=float)) ** 2).sum(axis=1))
+
+def front_table(df, objectives=OBJECTIVES):
+    """Rows of df on the full front or its first-two-objective front, with flags and utopia distances.
+
+    Returns (front rows sorted by utopia distance, {'front_2d': hypervolume, 'front_3d': hypervolume}).
+    """
+    cols = list(objectives)
+    two = {c: objectives[c] for c in cols[:2]}
+    norm, _ = normalise(df, objectives)
+    out = df.copy()
+    out['front_2d'] = pareto_mask(df, two)
+    out['front_3d'] = pareto_mask(df, objectives)
+    out['utopia_dist_2d'] = np.where(out['front_2d'], utopia_distance(norm[:, :2]), np.nan)
+    out['utopia_dist_3d'] = np.where(out['front_3d'], utopia_distance(norm), np.nan)
+    hv = {'front_2d': hypervolume(norm[out['front_2d'].to_numpy()][:, :2]),
+          'front_3d': hypervolume(norm[out['front_3d'].to_numpy()])}
+    front = out[out['front_2d'] | out['front_3d']]
+    return front.sort_values(['utopia_dist_3d', 'utopia_dist_2d'], na_position='last'), hv
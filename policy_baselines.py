@@ -1,7 +1,18 @@
 
+import time
 import numpy as np
 import pandas as pd
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from alloc_store import AllocationStore
+from checkpoints import SweepCheckpoint, config_name, shard_slice
+from cohort_io import read_cohort
+from envelope_index import UpperEnvelopeTree
+from fairness import DeficitTracker, cell_arrays, dimension_l1, fairness_cells, group_values, has_groups
+from feature_cache import FeatureCache, file_digest, make_key
+from assignment import min_cost_assignment
+from match_run import DRAW_CHUNK, AcceptanceModel, merge_prefix
 
 ABO_RECIPIENTS = {
     'O': ['O', 'A', 'B', 'AB'],
@@ -10,52 +21,136 @@ ABO_RECIPIENTS = {
     'AB': ['AB']
 }
 
-def compute_patient_features(df: pd.DataFrame):
-    out = df.copy()
-    out['EPTS_norm'] = out['EPTSScore'].clip(0,100) / 100.0
-    out['Age80'] = np.minimum(out['Age'], 80.0) / 80.0
-    urg_raw = np.log1p(out['DialysisYears'].clip(lower=0.0)) + 0.3 * out['Diabetes'].astype(float)
+ABO_TYPES = ['O', 'A', 'B', 'AB']
+ABO_CODE = {abo: c for c, abo in enumerate(ABO_TYPES)}
+_ABO_LABELS = np.array(ABO_TYPES)
+# Recipient ABO codes per donor ABO code; index -1 (unknown donor type) has none
+_RECIPIENT_CODES = [tuple(ABO_CODE[r] for r in ABO_RECIPIENTS[abo]) for abo in ABO_TYPES] + [()]
+_SCAN_CHUNK = 64
+# Storage types of the kernel arrays (patient_arrays/cohort_arrays): features are kept in
+# float32 and widened to float64 wherever scores are computed, sorted lists as int32 positions.
+FEATURE_DTYPE = np.float32
+INDEX_DTYPE = np.int32
+FEATURE_COLUMNS = ['EPTS_norm', 'Age80', 'Urgency_norm', 'NoTx', 'A_part', 'B_part']
+
+def urgency_raw(df: pd.DataFrame):
+    return np.log1p(df['DialysisYears'].clip(lower=0.0)) + 0.3 * df['Diabetes'].astype(float)
+
+def feature_arrays(epts_score, age, dialysis_years, diabetes):
+    """compute_patient_features' per-patient columns (Urgency_raw before normalisation) from arrays."""
+    E = np.clip(epts_score, 0, 100) / 100.0
+    Age80 = np.minimum(age, 80.0) / 80.0
+    diabetes = np.asarray(diabetes, dtype=float)
+    no_tx = np.maximum(0.0, 5.0 - 0.6 * dialysis_years - 1.0 * diabetes - 0.5 * Age80)
+    return {'EPTS_norm': E, 'Age80': Age80, 'Urgency_raw': np.log1p(np.maximum(dialysis_years, 0.0)) + 0.3 * diabetes,
+            'NoTx': no_tx, 'A_part': 6.0 * (1.0 - E) + 1.0 * (1.0 - Age80) - no_tx, 'B_part': 2.0 * (1.0 - E)}
+
+def _feature_columns(df: pd.DataFrame):
+    """FEATURE_COLUMNS of df's patients as FEATURE_DTYPE arrays (Urgency_norm over df's own range)."""
+    f = feature_arrays(df['EPTSScore'].to_numpy(dtype=float), df['Age'].to_numpy(dtype=float),
+                       df['DialysisYears'].to_numpy(dtype=float), df['Diabetes'].to_numpy(dtype=float))
+    urg_raw = f.pop('Urgency_raw')
     umin, umax = urg_raw.min(), urg_raw.max()
-    out['Urgency_norm'] = (urg_raw - umin) / (umax - umin + 1e-9)
-    no_tx = 5.0 - 0.6 * out['DialysisYears'] - 1.0 * out['Diabetes'].astype(float) - 0.5 * out['Age80']
-    out['NoTx'] = np.maximum(0.0, no_tx)
-    E = out['EPTS_norm'].values
-    Age80 = out['Age80'].values
-    out['A_part'] = 6.0 * (1.0 - E) + 1.0 * (1.0 - Age80) - out['NoTx'].values
-    out['B_part'] = 2.0 * (1.0 - E)
+    f['Urgency_norm'] = (urg_raw - umin) / (umax - umin + 1e-9)
+    return {k: f[k].astype(FEATURE_DTYPE) for k in FEATURE_COLUMNS}
+
+def compute_patient_features(df: pd.DataFrame):
+    # shallow copy: the cohort's own columns are shared, only the feature columns are new
+    out = df.copy(deep=False)
+    for k, v in _feature_columns(df).items():
+        out[k] = v
     return out
 
+def _abo_codes(values):
+    """Map blood type labels to ABO_TYPES codes, -1 for anything unrecognised."""
+    codes = np.full(len(values), -1, dtype=np.int8)
+    labels = np.asarray(values).astype(str)
+    for abo, c in ABO_CODE.items():
+        codes[labels == abo] = c
+    return codes
+
 def bin_index(x, n_bins=10):
     i = int(np.floor(x * n_bins))
     if i >= n_bins: i = n_bins - 1
     if i < 0: i = 0
     return i
 
-def build_sorted_lists(pat_df: pd.DataFrame, policy: str, alpha: float = 0.5, n_bins: int = 10):
-    lists = {abo: {b: [] for b in range(n_bins)} for abo in ['O','A','B','AB']}
-    U = pat_df['Urgency_norm'].values.astype(float)
-    A = pat_df['A_part'].values.astype(float)
-    B = pat_df['B_part'].values.astype(float)
-    idx_by_abo = {abo: np.where(pat_df['BloodType'].values == abo)[0] for abo in ['O','A','B','AB']}
+def list_keys(U, A, B, policy, alpha, b, n_bins, bounds=None):
+    """Sort key of bin b's lists (at the bin's mid quality) and the (min, max) the utility term was scaled by."""
+    U, A, B = (np.asarray(v, dtype=float) for v in (U, A, B))
+    x = (b + 0.5) / n_bins
+    util_key = A + B * x
+    kmin, kmax = (util_key.min(), util_key.max()) if bounds is None else bounds
+    util_norm = (util_key - kmin) / (kmax - kmin + 1e-9)
+    if policy == 'urgency':
+        key = U
+    elif policy == 'utility':
+        key = util_norm
+    elif policy == 'hybrid':
+        key = alpha * U + (1.0 - alpha) * util_norm
+    else:
+        raise ValueError("Unknown policy")
+    return key, (kmin, kmax)
+
+def _sorted_index_arrays(U, A, B, abo_codes, policy, alpha=0.5, n_bins=10):
+    """Per-(ABO code, bin) INDEX_DTYPE patient index arrays sorted by descending policy key."""
+    idx_by_abo = [np.where(abo_codes == c)[0].astype(INDEX_DTYPE) for c in range(len(ABO_TYPES))]
+    lists = [[None] * n_bins for _ in ABO_TYPES]
+    U, A, B = (np.asarray(v, dtype=float) for v in (U, A, B))
     for b in range(n_bins):
-        x = (b + 0.5) / n_bins
-        util_key = A + B * x
-        kmin, kmax = util_key.min(), util_key.max()
-        util_norm = (util_key - kmin) / (kmax - kmin + 1e-9)
-        if policy == 'urgency':
-            key = U
-        elif policy == 'utility':
-            key = util_norm
-        elif policy == 'hybrid':
-            key = alpha * U + (1.0 - alpha) * util_norm
-        else:
-            raise ValueError("Unknown policy")
-        for abo in ['O','A','B','AB']:
-            idxs = idx_by_abo[abo]
+        key, _ = list_keys(U, A, B, policy, alpha, b, n_bins)
+        for c, idxs in enumerate(idx_by_abo):
             order = np.argsort(-key[idxs], kind='mergesort')
-            lists[abo][b] = idxs[order].tolist()
+            lists[c][b] = idxs[order]
     return lists
 
+def _group_index_arrays(lists, group, n_groups):
+    """Split every (ABO, bin) list into per-group sub-lists that keep the list order."""
+    out = []
+    for per_bin in lists:
+        out_bins = []
+        for lst in per_bin:
+            g = group[lst]
+            order = np.argsort(g, kind='stable')
+            bounds = np.cumsum(np.bincount(g, minlength=n_groups))[:-1]
+            out_bins.append(np.split(lst[order], bounds))
+        out.append(out_bins)
+    return out
+
+def _cell_index_arrays(lists, pat):
+    """_group_index_arrays for every fairness cell of pat (see fairness.cell_arrays), by global cell id."""
+    cells, _, _, offsets = cell_arrays(pat)
+    out = None
+    for k in range(cells.shape[1]):
+        sub = _group_index_arrays(lists, cells[:, k] - offsets[k], offsets[k + 1] - offsets[k])
+        out = sub if out is None else [[o + s for o, s in zip(ob, sb)] for ob, sb in zip(out, sub)]
+    return out
+
+def _pack_lists(lists):
+    lengths = np.array([[len(lst) for lst in per_bin] for per_bin in lists], dtype=np.int64)
+    return {'order': np.concatenate([lst for per_bin in lists for lst in per_bin]), 'lengths': lengths}
+
+def _unpack_lists(packed):
+    lengths = packed['lengths']
+    flat = np.split(packed['order'], np.cumsum(lengths.ravel())[:-1])
+    n_bins = lengths.shape[1]
+    return [flat[c * n_bins:(c + 1) * n_bins] for c in range(lengths.shape[0])]
+
+def build_sorted_lists(pat_df: pd.DataFrame, policy: str, alpha: float = 0.5, n_bins: int = 10, group_col: str = None):
+    """lists[abo][bin] (and group_lists[abo][bin][group] with group_col) as INDEX_DTYPE arrays."""
+    abo_codes = _abo_codes(pat_df['BloodType'].values)
+    arrays = _sorted_index_arrays(pat_df['Urgency_norm'].values, pat_df['A_part'].values, pat_df['B_part'].values,
+                                  abo_codes, policy, alpha, n_bins)
+    lists = {abo: {b: arrays[c][b] for b in range(n_bins)} for c, abo in enumerate(ABO_TYPES)}
+    if group_col is None:
+        return lists
+    # (abo, bin, group) sub-lists, same order as lists[abo][bin]
+    labels, group = np.unique(pat_df[group_col].astype(str).values, return_inverse=True)
+    sub = _group_index_arrays(arrays, group, len(labels))
+    group_lists = {abo: {b: {g: sub[c][b][k] for k, g in enumerate(labels)} for b in range(n_bins)}
+                   for c, abo in enumerate(ABO_TYPES)}
+    return lists, group_lists
+
 def exact_utility_for_pair(pat_df_row, kdpi_norm):
     E = float(pat_df_row['EPTS_norm']); K = float(kdpi_norm); Age80 = float(pat_df_row['Age80'])
     theta0,theta1,theta2,theta3,theta4 = 5.0, 6.0, 3.0, 1.0, 2.0
@@ -64,13 +159,785 @@ def exact_utility_for_pair(pat_df_row, kdpi_norm):
     util = max(post - no_tx, 0.0)
     return util, post, no_tx
 
-def allocate(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: float = 0.5, fairness_eta: float = 0.0, n_bins: int = 10, group_col: str = 'Ethnicity'):
+def exact_utility(E, Age80, NoTx, K):
+    """Vectorised exact_utility_for_pair over patient arrays for one donor quality K."""
+    E, Age80, NoTx = np.asarray(E, dtype=float), np.asarray(Age80, dtype=float), np.asarray(NoTx, dtype=float)
+    theta0,theta1,theta2,theta3,theta4 = 5.0, 6.0, 3.0, 1.0, 2.0
+    post = theta0 + theta1*(1.0-E) + theta2*(1.0-K) + theta3*(1.0-Age80) + theta4*(1.0-E)*(1.0-K)
+    util = np.maximum(post - NoTx, 0.0)
+    return util, post, NoTx
+
+def _code_dtype(n_codes):
+    """Smallest signed integer type holding codes 0..n_codes-1."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_codes <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _group_arrays(df, group_col):
+    if has_groups(df, group_col):
+        group_labels, group, gc = np.unique(group_values(df, group_col), return_inverse=True, return_counts=True)
+    else:
+        group_labels, group, gc = np.array(['All']), np.zeros(len(df), dtype=np.int64), np.array([len(df)])
+    # fixed-width unicode labels so cached entries load without pickle
+    return {'group': group.astype(_code_dtype(len(group_labels))), 'group_labels': group_labels.astype(str), 'p_share': gc / len(df)}
+
+def patient_arrays(pat_df: pd.DataFrame, group_col: str = 'Ethnicity', fairness_dims=None, fairness_weights=None):
+    """Extract the columns the allocation kernel needs from a featurised patient frame.
+
+    group_col (a column or an intersection 'col1*col2') defines the groups fairness_L1 is
+    reported over and, by default, the fairness restriction. fairness_dims/fairness_weights
+    restrict over several weighted dimensions instead (see fairness.fairness_cells).
+    Features are FEATURE_DTYPE, ABO and group codes int8 (wider only if there are more groups).
+    """
+    cells = fairness_cells(pat_df, fairness_dims, fairness_weights) if fairness_dims else {}
+    return {**cells, **{k: np.asarray(pat_df[k].values, dtype=FEATURE_DTYPE) for k in FEATURE_COLUMNS},
+            'abo': _abo_codes(pat_df['BloodType'].values), **_group_arrays(pat_df, group_col)}
+
+def cohort_arrays(patients: pd.DataFrame, group_col: str = 'Ethnicity', fairness_dims=None, fairness_weights=None):
+    """patient_arrays(compute_patient_features(patients), ...) without building the featurised frame."""
+    cells = fairness_cells(patients, fairness_dims, fairness_weights) if fairness_dims else {}
+    return {**cells, **_feature_columns(patients), 'abo': _abo_codes(patients['BloodType'].values),
+            **_group_arrays(patients, group_col)}
+
+def donor_arrays(don_df: pd.DataFrame):
+    kdpi = pd.to_numeric(don_df['KDPI'], errors='coerce').values.astype(float)
+    if np.isnan(kdpi).any():
+        raise ValueError("KDPI must be numeric for every donor")
+    return {'KDPI': kdpi, 'abo': _abo_codes(don_df['DonorBloodType'].values),
+            'index': don_df.index.values, 'DonorBloodType': don_df['DonorBloodType'].to_numpy(dtype=str)}
+
+def donor_bins(kdpi, n_bins=10):
+    x = 1.0 - np.clip(kdpi, 0.0, 100.0) / 100.0
+    return np.clip(np.floor(x * n_bins), 0, n_bins - 1).astype(np.int64)
+
+def _advance(lst, h, available):
+    """First position >= h in lst holding an available patient."""
+    n = len(lst)
+    if h < n:
+        if available[lst[h]]:
+            return h
+        h += 1
+    while h < n:
+        idx = lst[h:h + _SCAN_CHUNK].astype(np.intp)     # numpy gathers far faster with intp indices
+        ok = available[idx]
+        k = int(ok.argmax())
+        if ok[k]:
+            return h + k
+        h += len(idx)
+    return n
+
+def _score_lines(U, A, B, policy, alpha=0.5):
+    """Per-patient allocation score as a line c + m*x in donor quality x = 1 - KDPI/100.
+
+    Matches the exact rescoring in the kernel: utility is post - no_tx = (5 + A) + (3 + B) x,
+    whose max(., 0) clip never binds for features from compute_patient_features.
+    """
+    U, A, B = (np.asarray(v, dtype=float) for v in (U, A, B))
+    if policy == 'urgency':
+        return U, np.zeros_like(U)
+    if policy == 'utility':
+        return 5.0 + A, 3.0 + B
+    if policy == 'hybrid':
+        return alpha * U + (1.0 - alpha) * (5.0 + A) / 12.0, (1.0 - alpha) * (3.0 + B) / 12.0
+    raise ValueError("Unknown policy")
+
+def _envelope_indexes(pat, policy, alpha=0.5, by_group=False):
+    """One UpperEnvelopeTree per ABO type, plus one per (ABO, fairness cell) when by_group."""
+    c, m = _score_lines(pat['Urgency_norm'], pat['A_part'], pat['B_part'], policy, alpha)
+    cells, _, _, offsets = cell_arrays(pat)
+    envs, group_envs = [], []
+    for code in range(len(ABO_TYPES)):
+        idxs = np.where(pat['abo'] == code)[0]
+        envs.append(UpperEnvelopeTree(c[idxs], m[idxs], idxs))
+        if by_group:
+            per_cell = []
+            for k in range(cells.shape[1]):
+                g = cells[idxs, k]
+                per_cell += [UpperEnvelopeTree(c[idxs[g == j]], m[idxs[g == j]], idxs[g == j])
+                             for j in range(offsets[k], offsets[k + 1])]
+            group_envs.append(per_cell)
+    return envs, group_envs
+
+class StreamingAllocator:
+    """Stateful greedy allocator that takes donors one at a time or in chunks.
+
+    Holds the candidate index (binned sorted lists and their heads, or the upper
+    envelopes with index='envelope'), the `available` mask and per-group
+    allocation counts, plus running totals for the summary metrics, so memory
+    does not grow with the number of donors offered. With fairness_eta > 0 a
+    DeficitTracker picks the fairness cell each donor is restricted to; the
+    per-group lists, heads and envelopes are then kept per cell.
+    """
+    def __init__(self, pat, policy, alpha=0.5, fairness_eta=0.0, n_bins=10, index='binned', lists=None, group_col=None):
+        self.pat, self.policy, self.alpha, self.fairness_eta = pat, policy, alpha, fairness_eta
+        self.n_bins, self.index, self.group_col = n_bins, index, group_col
+        U, p_share = pat['Urgency_norm'], pat['p_share']
+        self.available = np.ones(len(U), dtype=bool)
+        # float64 working copies of the rescoring columns, so per-donor gathers need no widening
+        self._U, self._E, self._Age80, self._NoTx = (np.asarray(pat[k], dtype=float)
+                                                     for k in ('Urgency_norm', 'EPTS_norm', 'Age80', 'NoTx'))
+        if index == 'binned':
+            if lists is None:
+                lists = _sorted_index_arrays(U, pat['A_part'], pat['B_part'], pat['abo'], policy, alpha, n_bins)
+            self.lists = lists
+            self.heads = [[0] * n_bins for _ in ABO_TYPES]
+            if fairness_eta > 0:
+                self.group_lists = _cell_index_arrays(lists, pat)
+                self.group_heads = [[[0] * len(self.group_lists[0][0]) for _ in range(n_bins)] for _ in ABO_TYPES]
+        elif index == 'envelope':
+            self.envs, self.group_envs = _envelope_indexes(pat, policy, alpha, by_group=fairness_eta > 0)
+        else:
+            raise ValueError("Unknown index")
+        self.fair = DeficitTracker(pat) if fairness_eta > 0 else None
+        self.alloc_counts = np.zeros(len(p_share), dtype=np.int64)
+        self.n_offered = 0
+        self.n_assigned = 0
+        self.total_benefit_years = 0.0
+        self._urgency_sum = 0.0
+
+    def _score(self, cand, K):
+        """Policy score of patients cand for donor quality K (K may be per patient)."""
+        U = self._U[cand]
+        if self.policy == 'urgency':
+            return U
+        util = exact_utility(self._E[cand], self._Age80[cand], self._NoTx[cand], K)[0]
+        return self.alpha * U + (1.0 - self.alpha) * (util / 12.0) if self.policy == 'hybrid' else util
+
+    def _restrict_group(self, abo_code):
+        return -1 if self.fair is None else self.fair.restrict(abo_code)
+
+    def _candidates(self, recipient_abos, b, x, restrict_group):
+        cand, cand_abo = [], []
+        for a in recipient_abos:
+            if self.index == 'envelope':
+                env = self.envs[a] if restrict_group < 0 else self.group_envs[a][restrict_group]
+                i, _ = env.query(x)
+                if i is not None:
+                    cand.append(i); cand_abo.append(a)
+                continue
+            if restrict_group < 0:
+                lst, hs, j = self.lists[a], self.heads[a], b
+            else:
+                lst, hs, j = self.group_lists[a][b], self.group_heads[a][b], restrict_group
+            lst = lst[j]
+            h = _advance(lst, hs[j], self.available)
+            hs[j] = h
+            if h < len(lst):
+                cand.append(lst[h]); cand_abo.append(a)
+        return cand, cand_abo
+
+    def _offer(self, abo_code, b, x, K):
+        """Match one donor; returns (recipient, utility, post, no_tx) or None if nobody is compatible."""
+        self.n_offered += 1
+        restrict_group = self._restrict_group(abo_code)
+        cand, cand_abo = self._candidates(_RECIPIENT_CODES[abo_code], b, x, restrict_group)
+        if not cand:
+            return None
+        pat, alpha = self.pat, self.alpha
+        cand = np.array(cand, dtype=np.intp)
+        U = self._U[cand]
+        util, post, no_tx = exact_utility(self._E[cand], self._Age80[cand], self._NoTx[cand], K)
+        if self.policy == 'urgency':
+            score = U
+        elif self.policy == 'hybrid':
+            score = alpha * U + (1.0 - alpha) * (util / 12.0)
+        else:
+            score = util
+        k = int(score.argmax())
+        best_i = int(cand[k])
+        self.available[best_i] = False
+        if self.index == 'envelope':
+            self.envs[cand_abo[k]].delete(best_i)
+            if self.group_envs:
+                for cell in self.fair.cells[best_i].tolist():
+                    self.group_envs[cand_abo[k]][cell].delete(best_i)
+        elif restrict_group < 0:
+            self.heads[cand_abo[k]][b] += 1
+        if self.fair is not None:
+            self.fair.assign(best_i)
+        self.alloc_counts[pat['group'][best_i]] += 1
+        self.n_assigned += 1
+        self.total_benefit_years += util[k]
+        self._urgency_sum += U[k]
+        return best_i, util[k], post[k], no_tx[k]
+
+    def offer_chunk(self, don):
+        """Allocate a chunk of donor_arrays(); typed arrays for its matches, donor_pos relative to the chunk."""
+        K_norm = np.clip(don['KDPI'], 0.0, 100.0) / 100.0
+        bins = donor_bins(don['KDPI'], self.n_bins).tolist()
+        x_don = (1.0 - K_norm).tolist()
+        don_abo = don['abo'].tolist()
+        n_don = len(bins)
+        donor_pos = np.empty(n_don, dtype=np.int64)
+        recipient = np.empty(n_don, dtype=np.int64)
+        utility = np.empty(n_don, dtype=np.float64)
+        post_years = np.empty(n_don, dtype=np.float64)
+        no_tx_years = np.empty(n_don, dtype=np.float64)
+        n = 0
+        for d in range(n_don):
+            match = self._offer(don_abo[d], bins[d], x_don[d], K_norm[d])
+            if match is None:
+                continue
+            donor_pos[n] = d
+            recipient[n], utility[n], post_years[n], no_tx_years[n] = match
+            n += 1
+        return {'donor_pos': donor_pos[:n], 'recipient_index': recipient[:n], 'utility_years': utility[:n],
+                'post_years': post_years[:n], 'no_tx_years': no_tx_years[:n]}
+
+    def offer(self, donor):
+        """Allocate a single donor given as a mapping with KDPI and DonorBloodType; returns a record or None."""
+        kdpi = float(pd.to_numeric(donor['KDPI'], errors='coerce'))
+        if np.isnan(kdpi):
+            raise ValueError("KDPI must be numeric for every donor")
+        bt = str(donor['DonorBloodType'])
+        chunk = {'KDPI': np.array([kdpi]), 'abo': _abo_codes([bt]), 'DonorBloodType': np.array([bt]),
+                 'index': np.array([donor.get('donor_index', self.n_offered)])}
+        return next(iter(self._records(chunk, self.offer_chunk(chunk))), None)
+
+    def _records(self, don, res):
+        pat = self.pat
+        for pos, ri, util, post, no_tx in zip(res['donor_pos'].tolist(), res['recipient_index'].tolist(),
+                                              res['utility_years'].tolist(), res['post_years'].tolist(),
+                                              res['no_tx_years'].tolist()):
+            yield {'donor_index': don['index'][pos], 'donor_bt': don['DonorBloodType'][pos],
+                   'donor_kdpi': float(don['KDPI'][pos]), 'recipient_index': ri,
+                   'recipient_bt': _ABO_LABELS[pat['abo'][ri]], 'recipient_group': pat['group_labels'][pat['group'][ri]],
+                   'urgency_norm': float(pat['Urgency_norm'][ri]), 'utility_years': util, 'post_years': post,
+                   'no_tx_years': no_tx, 'policy': self.policy, 'alpha': self.alpha,
+                   'fairness_eta': self.fairness_eta, 'group_col': self.group_col}
+
+    def stream(self, donors, sink=None, chunk_size=4096):
+        """Generator of match records for donors from any iterator.
+
+        Items may be DataFrame chunks or single donor mappings. If given, sink is called
+        with a DataFrame of up to chunk_size records at a time (and once more at the end).
+        """
+        buffer = []
+        for item in donors:
+            if isinstance(item, pd.DataFrame):
+                chunk = donor_arrays(item)
+                records = self._records(chunk, self.offer_chunk(chunk))
+            else:
+                record = self.offer(item)
+                records = [] if record is None else [record]
+            for record in records:
+                if sink is not None:
+                    buffer.append(record)
+                    if len(buffer) >= chunk_size:
+                        sink(pd.DataFrame(buffer)); buffer = []
+                yield record
+        if sink is not None and buffer:
+            sink(pd.DataFrame(buffer))
+
+    def snapshot(self):
+        """Copy of the allocation state (availability, heads, counts, running totals) for restore()."""
+        state = {'available': self.available.copy(), 'alloc_counts': self.alloc_counts.copy(),
+                 'totals': (self.n_offered, self.n_assigned, self.total_benefit_years, self._urgency_sum),
+                 'fair': None if self.fair is None else self.fair.snapshot()}
+        if self.index == 'binned':
+            state['heads'] = [h[:] for h in self.heads]
+            if self.fairness_eta > 0:
+                state['group_heads'] = [[h[:] for h in hb] for hb in self.group_heads]
+        return state
+
+    def restore(self, state):
+        """Return to a snapshot() of this allocator; the candidate index itself is reused."""
+        if self.index == 'envelope':
+            # revive patients matched since the snapshot, delete those matched in it but free now
+            for i in np.nonzero(self.available != state['available'])[0].tolist():
+                update = 'revive' if state['available'][i] else 'delete'
+                abo = self.pat['abo'][i]
+                getattr(self.envs[abo], update)(i)
+                if self.group_envs:
+                    for cell in self.fair.cells[i].tolist():
+                        getattr(self.group_envs[abo][cell], update)(i)
+        else:
+            self.heads = [h[:] for h in state['heads']]
+            if self.fairness_eta > 0:
+                self.group_heads = [[h[:] for h in hb] for hb in state['group_heads']]
+        self.available = state['available'].copy()
+        self.alloc_counts = state['alloc_counts'].copy()
+        self.n_offered, self.n_assigned, self.total_benefit_years, self._urgency_sum = state['totals']
+        if self.fair is not None:
+            self.fair.restore(state['fair'])
+
+    def metrics(self):
+        """Running summary metrics, same keys as allocate()'s metrics dict."""
+        if self.n_assigned == 0:
+            return {}
+        share = self.alloc_counts / self.n_assigned
+        metrics = {'total_benefit_years': self.total_benefit_years, 'mean_urgency_norm': self._urgency_sum / self.n_assigned,
+                   'fairness_L1': 0.5 * float(np.abs(share - self.pat['p_share']).sum()), 'n_assigned': self.n_assigned}
+        if self.fair is not None and 'fair_dims' in self.pat:
+            cells, cell_p, _, offsets = cell_arrays(self.pat)
+            cell_share = np.abs(self.fair.counts / self.n_assigned - cell_p)
+            metrics.update({f'fairness_L1_{dim}': 0.5 * float(cell_share[offsets[k]:offsets[k + 1]].sum())
+                            for k, dim in enumerate(self.pat['fair_dims'].tolist())})
+        return metrics
+
+
+class CsvSink:
+    """Appends record chunks from StreamingAllocator.stream() to a CSV file."""
+    def __init__(self, path):
+        self.path = path
+        self._header = True
+
+    def __call__(self, chunk: pd.DataFrame):
+        chunk.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+        self._header = False
+
+class ProfiledAllocator(StreamingAllocator):
+    """StreamingAllocator that also counts what the hot path does; see stats().
+
+    Kept as a subclass so the uninstrumented allocator pays nothing for it.
+    """
+    def __init__(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        self.timers = {'index_build': time.perf_counter() - t0, 'donor_loop': 0.0}
+        self.head_steps = np.zeros((len(ABO_TYPES), self.n_bins), dtype=np.int64)
+        self.misses = np.zeros(len(ABO_TYPES) + 1, dtype=np.int64)   # last slot: unknown donor ABO
+        self.restricted_offers = 0
+        self.restricted_steps = 0
+        self.envelope_queries = 0
+        self.utility_calls = 0
+        self.utility_evals = 0
+
+    def _heads(self, recipient_abos, b, restrict_group):
+        if restrict_group < 0:
+            return [self.heads[a][b] for a in recipient_abos]
+        return [self.group_heads[a][b][restrict_group] for a in recipient_abos]
+
+    def _candidates(self, recipient_abos, b, x, restrict_group):
+        if self.index == 'envelope':
+            self.envelope_queries += len(recipient_abos)
+            cand, cand_abo = super()._candidates(recipient_abos, b, x, restrict_group)
+        else:
+            before = self._heads(recipient_abos, b, restrict_group)
+            cand, cand_abo = super()._candidates(recipient_abos, b, x, restrict_group)
+            steps = [h1 - h0 for h0, h1 in zip(before, self._heads(recipient_abos, b, restrict_group))]
+            if restrict_group < 0:
+                for a, s in zip(recipient_abos, steps):
+                    self.head_steps[a, b] += s
+            else:
+                self.restricted_steps += sum(steps)
+        if restrict_group >= 0:
+            self.restricted_offers += 1
+        if cand:
+            self.utility_calls += 1
+            self.utility_evals += len(cand)
+        return cand, cand_abo
+
+    def _offer(self, abo_code, b, x, K):
+        match = super()._offer(abo_code, b, x, K)
+        if match is None:
+            self.misses[abo_code] += 1
+        return match
+
+    def offer_chunk(self, don):
+        t0 = time.perf_counter()
+        res = super().offer_chunk(don)
+        self.timers['donor_loop'] += time.perf_counter() - t0
+        return res
+
+    def stats(self):
+        """JSON-ready counters and timers accumulated so far."""
+        return {
+            'timers': dict(self.timers),
+            'n_offered': self.n_offered, 'n_assigned': self.n_assigned,
+            'head_steps': {abo: self.head_steps[c].tolist() for c, abo in enumerate(ABO_TYPES)},
+            'head_steps_total': int(self.head_steps.sum()),
+            'restricted_offers': self.restricted_offers, 'restricted_steps': self.restricted_steps,
+            'envelope_queries': self.envelope_queries,
+            'utility_calls': self.utility_calls, 'utility_evals': self.utility_evals,
+            'misses': {**{abo: int(self.misses[c]) for c, abo in enumerate(ABO_TYPES)}, 'unknown': int(self.misses[-1])},
+        }
+
+class MatchRunAllocator(StreamingAllocator):
+    """StreamingAllocator that offers each donor down a ranked match run with simulated declines.
+
+    Candidates come in the order the greedy kernel's head comparison would take them from
+    the compatible (ABO, bin) lists, built a block at a time with match_run.merge_prefix.
+    Under fairness_eta > 0 the restriction decides who is offered first, not who may be
+    offered: the run starts with the donor's deficit group (or fairness cell) lists and, once
+    those are exhausted, continues down the unrestricted lists, skipping patients already
+    offered. Each offer is accepted with acceptance.probability()
+    of the donor KDPI and candidate EPTS; the first acceptor gets the kidney. A kidney
+    nobody accepts within max_depth offers (default: the whole run) is discarded. Offer
+    depth, the number of offers made, is recorded for every donor. Binned index only.
+    """
+    def __init__(self, pat, policy, alpha=0.5, fairness_eta=0.0, n_bins=10, lists=None, group_col=None,
+                 acceptance=None, max_depth=None, seed=0, block=64):
+        super().__init__(pat, policy, alpha, fairness_eta, n_bins, 'binned', lists, group_col)
+        self.acceptance = AcceptanceModel() if acceptance is None else acceptance
+        self.max_depth, self.block = max_depth, block
+        self.rng = np.random.default_rng(seed)
+        self._depths = []
+        self.n_discarded = 0
+        self._depth_sum = 0
+
+    def _sources(self, abo_code, b, restrict_group):
+        """(list, heads, slot) per compatible recipient ABO type, in the kernel's comparison order."""
+        out = []
+        for a in _RECIPIENT_CODES[abo_code]:
+            if restrict_group < 0:
+                out.append((self.lists[a][b], self.heads[a], b))
+            else:
+                out.append((self.group_lists[a][b][restrict_group], self.group_heads[a][b], restrict_group))
+        return out
+
+    def _ranked(self, abo_code, b, K):
+        """Yield the donor's whole run: the restricted lists first, then the rest of the (ABO, bin) lists."""
+        restrict_group = self._restrict_group(abo_code)
+        sources = self._sources(abo_code, b, restrict_group)
+        for lst, hs, j in sources:
+            hs[j] = _advance(lst, hs[j], self.available)
+        if restrict_group < 0:
+            yield from self._run(sources, K)
+            return
+        offered = []
+        for ranked in self._run(sources, K):
+            offered.append(ranked)
+            yield ranked
+        fallback = self._sources(abo_code, b, -1)
+        for lst, hs, j in fallback:
+            hs[j] = _advance(lst, hs[j], self.available)
+        skip = np.zeros(len(self.available), dtype=bool)
+        if offered:
+            skip[np.concatenate(offered)] = True
+        yield from self._run(fallback, K, skip)
+
+    def _run(self, sources, K, skip=None):
+        """Yield successive blocks of the ranked run (patient indices, in offer order), leaving out skip."""
+        ptr = [hs[j] for _, hs, j in sources]
+        last = [np.inf] * len(sources)          # running minimum of each list's scores so far
+        pending = np.empty(0, dtype=np.int64)
+        p_key = np.empty(0); p_src = np.empty(0, dtype=np.int64); p_pos = np.empty(0, dtype=np.int64)
+        block = self.block
+        while True:
+            fetched = [pending]; keys = [p_key]; srcs = [p_src]; poss = [p_pos]
+            for i, (lst, _, _) in enumerate(sources):
+                if ptr[i] >= len(lst):
+                    continue
+                window = lst[ptr[i]:ptr[i] + block].astype(np.intp)
+                keep = self.available[window]
+                if skip is not None:
+                    keep &= ~skip[window]
+                ok = np.nonzero(keep)[0]
+                cand = window[ok]
+                if len(cand):
+                    run_min = np.minimum.accumulate(np.minimum(self._score(cand, K), last[i]))
+                    last[i] = run_min[-1]
+                    fetched.append(cand); keys.append(run_min)
+                    srcs.append(np.full(len(cand), i)); poss.append(ptr[i] + ok)
+                ptr[i] += len(window)
+            cand, key, src, pos = (np.concatenate(v) for v in (fetched, keys, srcs, poss))
+            bounds = [last[i] if ptr[i] < len(lst) else None for i, (lst, _, _) in enumerate(sources)]
+            take = merge_prefix(key, src, pos, bounds)
+            if len(take):
+                yield cand[take]
+            rest = np.ones(len(cand), dtype=bool)
+            rest[take] = False
+            pending, p_key, p_src, p_pos = cand[rest], key[rest], src[rest], pos[rest]
+            if all(b is None for b in bounds) and not len(pending):
+                return
+            block *= 2
+
+    def match_run(self, donor_kdpi, donor_bt, k=10):
+        """Top-k ranked candidates for a donor under the current state, without offering it."""
+        abo_code = int(_abo_codes([donor_bt])[0])
+        K = float(np.clip(donor_kdpi, 0.0, 100.0)) / 100.0
+        out = []
+        for ranked in self._ranked(abo_code, int(donor_bins(np.array([donor_kdpi]), self.n_bins)[0]), K):
+            out.append(ranked)
+            if sum(len(r) for r in out) >= k:
+                break
+        return np.concatenate(out)[:k] if out else np.empty(0, dtype=np.int64)
+
+    def _offer(self, abo_code, b, x, K):
+        self.n_offered += 1
+        depth, best_i, u, used = 0, None, np.empty(0), 0
+        limit = np.inf if self.max_depth is None else self.max_depth
+        for ranked in self._ranked(abo_code, b, K):
+            ranked = ranked[:int(min(len(ranked), limit - depth))]
+            p = self.acceptance.probability(K, self.pat['EPTS_norm'][ranked].astype(float))
+            start = 0
+            while start < len(ranked) and best_i is None:
+                if used == len(u):
+                    u, used = self.rng.random(DRAW_CHUNK), 0
+                n = min(len(ranked) - start, len(u) - used)
+                accept = u[used:used + n] < p[start:start + n]
+                if accept.any():
+                    n = int(accept.argmax()) + 1
+                    best_i = int(ranked[start + n - 1])
+                start += n; used += n; depth += n
+            if best_i is not None or depth >= limit:
+                break
+        self._depths.append(depth)
+        if best_i is None:
+            self.n_discarded += 1
+            return None
+        pat = self.pat
+        self.available[best_i] = False
+        if self.fair is not None:
+            self.fair.assign(best_i)
+        util, post, no_tx = exact_utility(pat['EPTS_norm'][best_i], pat['Age80'][best_i], pat['NoTx'][best_i], K)
+        self.alloc_counts[pat['group'][best_i]] += 1
+        self.n_assigned += 1
+        self.total_benefit_years += util
+        self._urgency_sum += float(pat['Urgency_norm'][best_i])
+        self._depth_sum += depth
+        return best_i, util, post, no_tx
+
+    def offer_chunk(self, don):
+        """StreamingAllocator.offer_chunk plus offer_depth per match and run_depth per donor of the chunk."""
+        self._depths = []
+        res = super().offer_chunk(don)
+        depths = np.array(self._depths, dtype=np.int64)
+        res['offer_depth'], res['run_depth'] = depths[res['donor_pos']], depths
+        return res
+
+    def metrics(self):
+        metrics = super().metrics()
+        if metrics:
+            metrics['mean_offer_depth'] = self._depth_sum / self.n_assigned
+        metrics['n_discarded'] = self.n_discarded
+        return metrics
+
+class BatchAllocator(StreamingAllocator):
+    """StreamingAllocator that assigns donors a window at a time, maximising the window's total policy score.
+
+    Each donor's candidates are the top_k available patients of each compatible (ABO, bin)
+    sorted list plus the patient the greedy kernel would give it (so the greedy assignment of
+    the window is always feasible), scored exactly; assignment.min_cost_assignment solves the
+    window. With group_slack set, group g may receive at most ceil(p_share[g] * n * (1 +
+    group_slack)) of the first n placed kidneys, checked per window, and candidates also
+    include the top_k of every group's sub-list so under-served groups are reachable. Greedy and batch
+    scores of every window, from the same state, are kept for the optimality gap. Binned
+    index only.
+    """
+    def __init__(self, pat, policy, alpha=0.5, n_bins=10, lists=None, group_col=None, window=256, top_k=16,
+                 group_slack=None):
+        super().__init__(pat, policy, alpha, 0.0, n_bins, 'binned', lists, group_col)
+        self.window, self.top_k, self.group_slack = window, top_k, group_slack
+        if group_slack is not None:
+            n_groups = len(pat['p_share'])
+            self.group_lists = _group_index_arrays(self.lists, pat['group'], n_groups)
+            self.group_heads = [[[0] * n_groups for _ in range(n_bins)] for _ in ABO_TYPES]
+        self.n_windows = 0
+        self.greedy_window_score = 0.0
+        self.batch_window_score = 0.0
+        self.n_candidates = 0
+
+    def _top(self, lst, heads, j):
+        """First top_k available patients of lst from heads[j] on."""
+        h = heads[j] = _advance(lst, heads[j], self.available)
+        out, n = [], 0
+        while n < self.top_k and h < len(lst):
+            seg = lst[h:h + 2 * self.top_k].astype(np.intp)
+            seg = seg[self.available[seg]][:self.top_k - n]
+            out.append(seg)
+            n += len(seg)
+            h += 2 * self.top_k
+        return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
+
+    def _offer_window(self, don_abo, bins, K):
+        """Assign one window of donors; returns the assigned patient per donor (-1: none)."""
+        n_don = len(bins)
+        state = self.snapshot()
+        greedy = [self._offer(don_abo[d], bins[d], 1.0 - K[d], K[d]) for d in range(n_don)]
+        self.restore(state)
+        tops = {}
+        rows = []
+        for d in range(n_don):
+            parts = []
+            for a in _RECIPIENT_CODES[don_abo[d]]:
+                if (a, bins[d]) not in tops:
+                    b = bins[d]
+                    tops[(a, b)] = [self._top(self.lists[a][b], self.heads[a], b)]
+                    if self.group_slack is not None:
+                        tops[(a, b)] += [self._top(lst, self.group_heads[a][b], g)
+                                         for g, lst in enumerate(self.group_lists[a][b])]
+                parts += tops[(a, bins[d])]
+            if greedy[d] is not None:
+                parts.append(np.array([greedy[d][0]]))
+            rows.append(np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64))
+        cand = np.full((n_don, max(max(len(r) for r in rows), 1)), -1, dtype=np.int64)
+        for d, r in enumerate(rows):
+            cand[d, :len(r)] = r
+        real = cand >= 0
+        score = np.zeros(cand.shape)
+        score[real] = self._score(cand[real], np.broadcast_to(K[:, None], cand.shape)[real])
+        group = caps = None
+        if self.group_slack is not None:
+            group = np.where(real, self.pat['group'][np.maximum(cand, 0)], 0)
+            caps = np.ceil(self.pat['p_share'] * (self.n_assigned + n_don) * (1.0 + self.group_slack))
+            caps = np.maximum(caps.astype(np.int64) - self.alloc_counts, 0)
+        col = min_cost_assignment(cand, score, group, caps)
+        hit = np.nonzero(col >= 0)[0]
+        self.n_windows += 1
+        self.n_candidates += int(real.sum())
+        self.greedy_window_score += sum(float(self._score(np.array([g[0]]), K[d])[0])
+                                        for d, g in enumerate(greedy) if g is not None)
+        self.batch_window_score += float(score[hit, col[hit]].sum())
+        out = np.full(n_don, -1, dtype=np.int64)
+        out[hit] = cand[hit, col[hit]]
+        ri = out[hit]
+        self.available[ri] = False
+        np.add.at(self.alloc_counts, self.pat['group'][ri], 1)
+        self.n_assigned += len(ri)
+        self._urgency_sum += float(self.pat['Urgency_norm'][ri].astype(float).sum())
+        return out
+
+    def offer_chunk(self, don):
+        """StreamingAllocator.offer_chunk with each window of the chunk assigned jointly."""
+        K_norm = np.clip(don['KDPI'], 0.0, 100.0) / 100.0
+        bins = donor_bins(don['KDPI'], self.n_bins).tolist()
+        don_abo = don['abo'].tolist()
+        recipient = np.full(len(bins), -1, dtype=np.int64)
+        for start in range(0, len(bins), self.window):
+            end = min(start + self.window, len(bins))
+            recipient[start:end] = self._offer_window(don_abo[start:end], bins[start:end], K_norm[start:end])
+        self.n_offered += len(bins)
+        donor_pos = np.nonzero(recipient >= 0)[0]
+        ri = recipient[donor_pos]
+        pat = self.pat
+        util, post, no_tx = exact_utility(pat['EPTS_norm'][ri], pat['Age80'][ri], pat['NoTx'][ri], K_norm[donor_pos])
+        self.total_benefit_years += float(util.sum())
+        return {'donor_pos': donor_pos, 'recipient_index': ri, 'utility_years': util, 'post_years': post,
+                'no_tx_years': no_tx}
+
+    def metrics(self):
+        metrics = super().metrics()
+        metrics.update({'n_windows': self.n_windows, 'greedy_window_score': self.greedy_window_score,
+                        'batch_window_score': self.batch_window_score,
+                        'window_gain': self.batch_window_score / max(self.greedy_window_score, 1e-12) - 1.0,
+                        'mean_candidates': self.n_candidates / max(self.n_offered, 1)})
+        return metrics
+
+def _allocate_kernel(pat, don, policy, alpha=0.5, fairness_eta=0.0, n_bins=10, index='binned', lists=None, profile=False):
+    """Greedy donor-by-donor allocation over preextracted arrays.
+
+    index='binned' scans the per-(ABO, KDPI bin) sorted lists; index='envelope' asks the
+    per-ABO upper envelopes for the exact best available patient at the donor's KDPI.
+    Returns typed arrays for the n_assigned matches, in donor order (plus 'stats' when profiling).
+    """
+    if not profile:
+        return StreamingAllocator(pat, policy, alpha, fairness_eta, n_bins, index, lists).offer_chunk(don)
+    allocator = ProfiledAllocator(pat, policy, alpha, fairness_eta, n_bins, index, lists)
+    res = allocator.offer_chunk(don)
+    res['stats'] = allocator.stats()
+    return res
+
+def allocation_metrics(alloc_df: pd.DataFrame, p_share: dict):
+    if len(alloc_df)==0:
+        return {}
+    total_benefit = alloc_df['utility_years'].sum()
+    mean_urg = alloc_df['urgency_norm'].mean()
+    alloc_share = alloc_df['recipient_group'].value_counts(normalize=True).to_dict()
+    for g in p_share.keys():
+        alloc_share.setdefault(g, 0.0)
+    disparity = 0.5 * sum(abs(alloc_share[g] - p_share[g]) for g in p_share.keys())
+    return {'total_benefit_years': total_benefit, 'mean_urgency_norm': mean_urg, 'fairness_L1': disparity, 'n_assigned': len(alloc_df)}
+
+def _assemble_allocation(res, pat, don, policy, alpha, fairness_eta, group_col):
+    """Turn kernel output arrays into the (alloc_df, metrics) pair allocate() returns."""
+    p_share = dict(zip(pat['group_labels'].tolist(), pat['p_share']))
+    if len(res['recipient_index']) == 0:
+        return pd.DataFrame([]), {}
+    pos, ri = res['donor_pos'], res['recipient_index']
+    n = len(ri)
+    alloc_df = pd.DataFrame({
+        'donor_index': don['index'][pos],
+        'donor_bt': don['DonorBloodType'][pos],
+        'donor_kdpi': don['KDPI'][pos],
+        'recipient_index': ri,
+        'recipient_bt': _ABO_LABELS[pat['abo'][ri]],
+        'recipient_group': pat['group_labels'][pat['group'][ri]],
+        'urgency_norm': pat['Urgency_norm'][ri].astype(float),
+        'utility_years': res['utility_years'], 'post_years': res['post_years'], 'no_tx_years': res['no_tx_years'],
+        'policy': [policy] * n, 'alpha': np.full(n, alpha), 'fairness_eta': np.full(n, fairness_eta),
+        'group_col': [group_col] * n,
+    })
+    return alloc_df, {**allocation_metrics(alloc_df, p_share), **dimension_l1(ri, pat)}
+
+def allocate(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: float = 0.5, fairness_eta: float = 0.0, n_bins: int = 10, group_col: str = 'Ethnicity', index: str = 'binned', stats: dict = None, fairness_dims=None, fairness_weights=None):
+    """Greedy allocation of don_df to the featurised pat_df; returns (alloc_df, metrics).
+
+    With fairness_eta > 0 each donor is restricted to the most under-served group of
+    group_col it can serve, or to the cell with the largest weighted deficit over
+    fairness_dims (see fairness.py); metrics then add fairness_L1_<dim> per dimension.
+    Pass a dict as stats to have it filled with ProfiledAllocator counters and phase timers.
+    """
+    if stats is None:
+        pat = patient_arrays(pat_df, group_col, fairness_dims, fairness_weights)
+        don = donor_arrays(don_df)
+        allocator = StreamingAllocator(pat, policy, alpha, fairness_eta, n_bins, index, group_col=group_col)
+        res = allocator.offer_chunk(don)
+        return _assemble_allocation(res, pat, don, policy, alpha, fairness_eta, group_col)
+    t0 = time.perf_counter()
+    pat = patient_arrays(pat_df, group_col, fairness_dims, fairness_weights)
+    don = donor_arrays(don_df)
+    t1 = time.perf_counter()
+    allocator = ProfiledAllocator(pat, policy, alpha, fairness_eta, n_bins, index, group_col=group_col)
+    res = allocator.offer_chunk(don)
+    t2 = time.perf_counter()
+    out = _assemble_allocation(res, pat, don, policy, alpha, fairness_eta, group_col)
+    stats.update(allocator.stats())
+    stats['timers'].update(features=t1 - t0, metrics=time.perf_counter() - t2)
+    return out
+
+def allocate_match_run(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: float = 0.5, fairness_eta: float = 0.0, n_bins: int = 10, group_col: str = 'Ethnicity', acceptance: AcceptanceModel = None, max_depth: int = None, seed: int = 0, fairness_dims=None, fairness_weights=None):
+    """allocate() with ranked match runs and simulated declines (see MatchRunAllocator).
+
+    Returns (alloc_df, metrics, runs): alloc_df gains an offer_depth column, metrics add
+    mean_offer_depth and n_discarded, and runs has one row per donor with its KDPI, offer
+    depth and whether the kidney was placed.
+    """
+    pat = patient_arrays(pat_df, group_col, fairness_dims, fairness_weights)
+    don = donor_arrays(don_df)
+    allocator = MatchRunAllocator(pat, policy, alpha, fairness_eta, n_bins, group_col=group_col,
+                                  acceptance=acceptance, max_depth=max_depth, seed=seed)
+    res = allocator.offer_chunk(don)
+    alloc_df, metrics = _assemble_allocation(res, pat, don, policy, alpha, fairness_eta, group_col)
+    if len(alloc_df):
+        alloc_df['offer_depth'] = res['offer_depth']
+        metrics['mean_offer_depth'] = float(res['offer_depth'].mean())
+    metrics['n_discarded'] = allocator.n_discarded
+    placed = np.zeros(len(don['KDPI']), dtype=bool)
+    placed[res['donor_pos']] = True
+    runs = pd.DataFrame({'donor_index': don['index'], 'donor_bt': don['DonorBloodType'], 'donor_kdpi': don['KDPI'],
+                         'offer_depth': res['run_depth'], 'placed': placed})
+    return alloc_df, metrics, runs
+
+def allocate_batch(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: float = 0.5, n_bins: int = 10, group_col: str = 'Ethnicity', window: int = 256, top_k: int = 16, group_slack: float = None):
+    """allocate() with donors assigned jointly per window of `window` donors (see BatchAllocator).
+
+    metrics add n_windows, the greedy and batch policy scores of the windows (each window
+    solved both ways from the same state), window_gain (batch / greedy - 1) and
+    mean_candidates per donor.
+    """
+    pat = patient_arrays(pat_df, group_col)
+    don = donor_arrays(don_df)
+    allocator = BatchAllocator(pat, policy, alpha, n_bins, group_col=group_col, window=window, top_k=top_k,
+                               group_slack=group_slack)
+    res = allocator.offer_chunk(don)
+    alloc_df, metrics = _assemble_allocation(res, pat, don, policy, alpha, 0.0, group_col)
+    metrics.update({k: v for k, v in allocator.metrics().items() if k not in metrics})
+    return alloc_df, metrics
+
+# Row-by-row parity reference for allocate() with group_col fairness. It is not the original
+# baseline: it follows the current semantics, where a fairness-restricted scan leaves the shared
+# (ABO, bin) heads in place and only groups with an available compatible patient can be
+# restricted to. fairness_dims is not supported.
+def allocate_reference(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: float = 0.5, fairness_eta: float = 0.0, n_bins: int = 10, group_col: str = 'Ethnicity'):
     sorted_lists = build_sorted_lists(pat_df, policy, alpha, n_bins)
     available = np.ones(len(pat_df), dtype=bool)
     heads = {abo: {b: 0 for b in range(n_bins)} for abo in ['O','A','B','AB']}
     # Groups
-    if group_col in pat_df.columns:
-        groups = pat_df[group_col].astype(str).values
+    if has_groups(pat_df, group_col):
+        groups = group_values(pat_df, group_col)
         gv, gc = np.unique(groups, return_counts=True)
         p_share = {g: gc[i] / len(groups) for i,g in enumerate(gv)}
     else:
@@ -78,6 +945,7 @@ def allocate(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: flo
         p_share = {'All': 1.0}
     alloc_counts = Counter({g: 0 for g in p_share.keys()})
     U = pat_df['Urgency_norm'].values.astype(float)
+    blood_types = pat_df['BloodType'].astype(str).values
     records = []
     for d_idx,row in don_df.iterrows():
         donor_bt = str(row['DonorBloodType'])
@@ -92,17 +960,21 @@ def allocate(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: flo
         restrict_group = None
         if fairness_eta > 0 and len(records) > 0:
             total_alloc = len(records)
-            deficits = {g: p_share[g]*total_alloc - alloc_counts[g] for g in p_share.keys()}
-            g_star, max_def = max(deficits.items(), key=lambda kv: kv[1])
+            # only groups with an available patient this donor is compatible with
+            servable = set(groups[available & np.isin(blood_types, recipient_abos)])
+            deficits = {g: p_share[g]*total_alloc - alloc_counts[g] for g in p_share.keys() if g in servable}
+            g_star, max_def = max(deficits.items(), key=lambda kv: kv[1]) if deficits else (None, 0.0)
             if max_def > 0:
                 restrict_group = g_star
         best_score, best_i, best_abo = -np.inf, None, None
         for abo in recipient_abos:
             lst = sorted_lists[abo][b]
             h = heads[abo][b]
-            while h < len(lst) and (not available[lst[h]] or (restrict_group is not None and groups[lst[h]] != restrict_group)):
+            while h < len(lst) and not available[lst[h]]:
                 h += 1
             heads[abo][b] = h
+            while h < len(lst) and restrict_group is not None and (not available[lst[h]] or groups[lst[h]] != restrict_group):
+                h += 1
             if h >= len(lst): continue
             i = lst[h]
             if policy == 'urgency':
@@ -121,7 +993,8 @@ def allocate(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: flo
         if best_i is None: 
             continue
         available[best_i] = False
-        heads[best_abo][b] += 1
+        if restrict_group is None:
+            heads[best_abo][b] += 1
         util, post, no_tx = exact_utility_for_pair(pat_df.iloc[best_i], K_norm)
         records.append({
             'donor_index': d_idx, 'donor_bt': donor_bt, 'donor_kdpi': kdpi,
@@ -132,57 +1005,666 @@ def allocate(don_df: pd.DataFrame, pat_df: pd.DataFrame, policy: str, alpha: flo
         })
         alloc_counts[groups[best_i]] += 1
     alloc_df = pd.DataFrame(records)
-    if len(alloc_df)==0:
-        return alloc_df, {}
-    total_benefit = alloc_df['utility_years'].sum()
-    mean_urg = alloc_df['urgency_norm'].mean()
-    alloc_share = alloc_df['recipient_group'].value_counts(normalize=True).to_dict()
-    for g in p_share.keys():
-        alloc_share.setdefault(g, 0.0)
-    disparity = 0.5 * sum(abs(alloc_share[g] - p_share[g]) for g in p_share.keys())
-    metrics = {'total_benefit_years': total_benefit, 'mean_urgency_norm': mean_urg, 'fairness_L1': disparity, 'n_assigned': len(alloc_df)}
-    return alloc_df, metrics
+    return alloc_df, allocation_metrics(alloc_df, p_share)
 
-def run_experiment(patients_csv: str, donors_csv: str, sample_patients: int = 20000, sample_donors: int = 3000, seed: int = 42, group_col: str = 'Ethnicity'):
-    patients = pd.read_csv(patients_csv).sample(n=sample_patients, random_state=seed).reset_index(drop=True)
-    donors = pd.read_csv(donors_csv).sample(n=sample_donors, random_state=seed).reset_index(drop=True)
-    patients_feat = compute_patient_features(patients)
-    results = []; allocations = {}
-    # Urgency
-    alloc, metr = allocate(donors, patients_feat, 'urgency', alpha=1.0, fairness_eta=0.0, group_col=group_col)
-    metr['policy']='Urgency'; metr['alpha']=1.0; metr['fairness_eta']=0.0
-    results.append(metr); allocations[('Urgency',1.0,0.0)] = alloc
-    # Utility
-    alloc, metr = allocate(donors, patients_feat, 'utility', alpha=0.0, fairness_eta=0.0, group_col=group_col)
-    metr['policy']='Utility'; metr['alpha']=0.0; metr['fairness_eta']=0.0
-    results.append(metr); allocations[('Utility',0.0,0.0)] = alloc
-    # Hybrid
-    for a in [0.25,0.5,0.75]:
-        alloc, metr = allocate(donors, patients_feat, 'hybrid', alpha=a, fairness_eta=0.0, group_col=group_col)
-        metr['policy']='Hybrid'; metr['alpha']=a; metr['fairness_eta']=0.0
-        results.append(metr); allocations[('Hybrid',a,0.0)] = alloc
+def load_cohort(patients_csv: str, donors_csv: str, sample_patients: int = 20000, sample_donors: int = 3000, seed: int = 42, group_col: str = 'Ethnicity', cache: FeatureCache = None, fairness_dims=None, fairness_weights=None):
+    """Sampled, featurised (pat, don) kernel arrays, served from cache when possible.
+
+    Either argument may be a CSV file or a columnar cohort directory (see cohort_io).
+    """
+    fair = {'fairness_dims': list(fairness_dims), 'fairness_weights': fairness_weights} if fairness_dims else {}
+    def build():
+        patients = read_cohort(patients_csv).sample(n=sample_patients, random_state=seed).reset_index(drop=True)
+        donors = read_cohort(donors_csv).sample(n=sample_donors, random_state=seed).reset_index(drop=True)
+        pat = cohort_arrays(patients, group_col, fairness_dims, fairness_weights)
+        don = donor_arrays(donors)
+        return {**{'pat.' + k: v for k, v in pat.items()}, **{'don.' + k: v for k, v in don.items()}}
+    if cache is None:
+        arrays, key = build(), None
+    else:
+        key = make_key('cohort', patients=file_digest(patients_csv), donors=file_digest(donors_csv),
+                       sample_patients=sample_patients, sample_donors=sample_donors, seed=seed, group_col=group_col,
+                       features=np.dtype(FEATURE_DTYPE).name, **fair)
+        arrays = cache.get_or_build(key, build)
+    pat = {k[4:]: v for k, v in arrays.items() if k.startswith('pat.')}
+    don = {k[4:]: v for k, v in arrays.items() if k.startswith('don.')}
+    return pat, don, key
+
+def _experiment_configs():
+    configs = [('urgency', 1.0, 0.0, 'Urgency'), ('utility', 0.0, 0.0, 'Utility')]
+    configs += [('hybrid', a, 0.0, 'Hybrid') for a in [0.25,0.5,0.75]]
     # Fairness-constrained example
-    alloc, metr = allocate(donors, patients_feat, 'hybrid', alpha=0.5, fairness_eta=1.0, group_col=group_col)
-    metr['policy']='Hybrid+Fair'; metr['alpha']=0.5; metr['fairness_eta']=1.0
-    results.append(metr); allocations[('Hybrid+Fair',0.5,1.0)] = alloc
-    return pd.DataFrame(results), allocations
-
-def sweep(patients_csv: str, donors_csv: str, alphas, etas, sample_patients: int = 20000, sample_donors: int = 3000, seed: int = 42, group_col: str = 'Ethnicity'):
-    patients = pd.read_csv(patients_csv).sample(n=sample_patients, random_state=seed).reset_index(drop=True)
-    donors = pd.read_csv(donors_csv).sample(n=sample_donors, random_state=seed).reset_index(drop=True)
-    patients_feat = compute_patient_features(patients)
+    configs.append(('hybrid', 0.5, 1.0, 'Hybrid+Fair'))
+    return configs
+
+def _collect(pat, don, configs, results, group_col):
     out = []; allocs = {}
-    # Always include urgency-only and utility-only
-    for policy, a, e in [('urgency',1.0,0.0), ('utility',0.0,0.0)]:
-        alloc, metr = allocate(donors, patients_feat, policy, alpha=a, fairness_eta=e, group_col=group_col)
-        metr['policy']=policy.title() if policy!='utility' else 'Utility'
+    for (policy, a, e, label), res in zip(configs, results):
+        alloc, metr = _assemble_allocation(res, pat, don, policy, a, e, group_col)
+        metr['policy']=label
         metr['alpha']=a; metr['fairness_eta']=e
-        out.append(metr); allocs[(metr['policy'],a,e)] = alloc
-    # Hybrid grid
+        out.append(metr); allocs[(label,a,e)] = alloc
+    return pd.DataFrame(out), allocs
+
+def run_experiment(patients_csv: str, donors_csv: str, sample_patients: int = 20000, sample_donors: int = 3000, seed: int = 42, group_col: str = 'Ethnicity', cache_dir: str = None):
+    cache = FeatureCache(cache_dir) if cache_dir else None
+    pat, don, cohort_key = load_cohort(patients_csv, donors_csv, sample_patients, sample_donors, seed, group_col, cache)
+    configs = _experiment_configs()
+    tasks = [(policy, a, e, 10, 'binned') for policy, a, e, _ in configs]
+    results = _run_kernels(pat, don, tasks, cache_dir=cache_dir, cohort_key=cohort_key)
+    return _collect(pat, don, configs, results, group_col)
+
+def _sweep_configs(alphas, etas):
+    # Always include urgency-only and utility-only, then the hybrid grid
+    configs = [('urgency', 1.0, 0.0, 'Urgency'), ('utility', 0.0, 0.0, 'Utility')]
     for a in alphas:
         for e in etas:
-            alloc, metr = allocate(donors, patients_feat, 'hybrid', alpha=a, fairness_eta=e, group_col=group_col)
-            metr['policy']='Hybrid' if e==0 else 'Hybrid+Fair'
-            metr['alpha']=a; metr['fairness_eta']=e
-            out.append(metr); allocs[(metr['policy'],a,e)] = alloc
-    return pd.DataFrame(out), allocs
+            configs.append(('hybrid', a, e, 'Hybrid' if e==0 else 'Hybrid+Fair'))
+    return configs
+
+# Kernel inputs are published to pool workers through one shared-memory block;
+# _share_arrays/_attach_arrays pack and unpack the numeric columns by offset.
+_SHARED_KEYS = {'pat': ['EPTS_norm', 'Age80', 'NoTx', 'Urgency_norm', 'A_part', 'B_part', 'abo', 'group', 'p_share',
+                        'cells', 'cell_p', 'cell_w', 'cell_offsets'],
+                'don': ['KDPI', 'abo']}
+_worker_state = {}
+
+def _share_arrays(pat, don, shared_keys=_SHARED_KEYS):
+    layout, offset = [], 0
+    for part, keys in shared_keys.items():
+        src = pat if part == 'pat' else don
+        for k in keys:
+            if k not in src:
+                continue    # optional, e.g. the fairness cells
+            arr = np.ascontiguousarray(src[k])
+            layout.append((part, k, offset, arr.dtype.str, arr.shape))
+            offset += -(-arr.nbytes // 64) * 64
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for part, k, off, dtype, shape in layout:
+        src = pat if part == 'pat' else don
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)[...] = src[k]
+    return shm, layout
+
+def _attach_arrays(shm_name, layout, cache_dir=None, cohort_key=None, profile=False):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    pat, don = {}, {}
+    for part, k, off, dtype, shape in layout:
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+        arr.flags.writeable = False
+        (pat if part == 'pat' else don)[k] = arr
+    _worker_state.update(shm=shm, pat=pat, don=don, cohort_key=cohort_key, profile=profile,
+                         cache=FeatureCache(cache_dir) if cache_dir else None)
+
+def _run_task(pat, don, task, cache=None, cohort_key=None, profile=False):
+    policy, a, e, n_bins, index = task
+    lists = None
+    t0 = time.perf_counter()
+    if cache is not None and index == 'binned':
+        key = make_key('lists', cohort=cohort_key, policy=policy, alpha=a if policy == 'hybrid' else None, n_bins=n_bins)
+        lists = _unpack_lists(cache.get_or_build(key, lambda: _pack_lists(_sorted_index_arrays(
+            pat['Urgency_norm'], pat['A_part'], pat['B_part'], pat['abo'], policy, a, n_bins))))
+    t_lists = time.perf_counter() - t0
+    res = _allocate_kernel(pat, don, policy, a, e, n_bins, index, lists=lists, profile=profile)
+    if profile:
+        res['stats']['timers']['list_cache'] = t_lists
+    return res
+
+def _sweep_worker(task):
+    return _run_task(_worker_state['pat'], _worker_state['don'], task, _worker_state['cache'],
+                     _worker_state['cohort_key'], _worker_state.get('profile', False))
+
+def _iter_kernels(pat, don, tasks, n_workers=1, cache_dir=None, cohort_key=None, profile=False):
+    """Yield kernel results for each (policy, alpha, eta, n_bins, index) task, in task order."""
+    if n_workers <= 1 or len(tasks) <= 1:
+        cache = FeatureCache(cache_dir) if cache_dir else None
+        for task in tasks:
+            yield _run_task(pat, don, task, cache, cohort_key, profile)
+        return
+    shm, layout = _share_arrays(pat, don)
+    try:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks)), initializer=_attach_arrays,
+                                 initargs=(shm.name, layout, cache_dir, cohort_key, profile)) as pool:
+            yield from pool.map(_sweep_worker, tasks)
+    finally:
+        shm.close()
+        shm.unlink()
+
+def _run_kernels(pat, don, tasks, n_workers=1, cache_dir=None, cohort_key=None, profile=False):
+    """Kernel results for each (policy, alpha, eta, n_bins, index) task, in task order."""
+    return list(_iter_kernels(pat, don, tasks, n_workers, cache_dir, cohort_key, profile))
+
+def _sample_arrays(full_pat, full_don, seed, sample_patients, sample_donors):
+    """Kernel arrays for the cohort sample that DataFrame.sample(n, random_state=seed) would draw.
+
+    Row-wise features are gathered from the full-cohort arrays; Urgency_norm and group
+    shares are renormalised over the sample exactly as compute_patient_features/patient_arrays do.
+    """
+    pidx = np.random.RandomState(seed).choice(len(full_pat['abo']), sample_patients, replace=False)
+    didx = np.random.RandomState(seed).choice(len(full_don['abo']), sample_donors, replace=False)
+    pat = {k: full_pat[k][pidx] for k in ('EPTS_norm', 'Age80', 'NoTx', 'A_part', 'B_part', 'abo')}
+    raw = full_pat['Urgency_raw'][pidx]
+    umin, umax = raw.min(), raw.max()
+    pat['Urgency_norm'] = ((raw - umin) / (umax - umin + 1e-9)).astype(FEATURE_DTYPE)
+    _, group, gc = np.unique(full_pat['group'][pidx], return_inverse=True, return_counts=True)
+    pat['group'], pat['p_share'] = group.astype(full_pat['group'].dtype), gc / sample_patients
+    if 'cells' in full_pat:
+        pat['cells'], pat['cell_w'], pat['cell_offsets'] = full_pat['cells'][pidx], full_pat['cell_w'], full_pat['cell_offsets']
+        pat['cell_p'] = np.bincount(pat['cells'].ravel(), minlength=len(pat['cell_w'])) / sample_patients
+        pat['fair_dims'] = full_pat['fair_dims']
+    don = {k: full_don[k][didx] for k in ('KDPI', 'abo')}
+    return pat, don
+
+def _kernel_metrics(res, pat):
+    """allocation_metrics() computed straight from kernel output arrays."""
+    ri = res['recipient_index']
+    if len(ri) == 0:
+        return {}
+    share = (np.bincount(pat['group'][ri], minlength=len(pat['p_share'])) / len(ri)).tolist()
+    disparity = 0.5 * sum(abs(s - p) for s, p in zip(share, pat['p_share'].tolist()))
+    return {'total_benefit_years': res['utility_years'].sum(), 'mean_urgency_norm': pat['Urgency_norm'][ri].astype(float).mean(),
+            'fairness_L1': disparity, 'n_assigned': len(ri), **dimension_l1(ri, pat)}
+
+def _replicate_task(full_pat, full_don, seed, sample_patients, sample_donors, tasks):
+    pat, don = _sample_arrays(full_pat, full_don, seed, sample_patients, sample_donors)
+    return [_kernel_metrics(_allocate_kernel(pat, don, *task), pat) for task in tasks]
+
+def _replicate_worker(job):
+    return _replicate_task(_worker_state['pat'], _worker_state['don'], *job)
+
+_REPLICATE_KEYS = {'pat': ['EPTS_norm', 'Age80', 'NoTx', 'Urgency_raw', 'A_part', 'B_part', 'abo', 'group',
+                           'cells', 'cell_w', 'cell_offsets', 'fair_dims'],
+                   'don': ['KDPI', 'abo']}
+
+REPLICATE_METRICS = ['total_benefit_years', 'mean_urgency_norm', 'fairness_L1', 'n_assigned']
+
+def summarize_replicates(reps: pd.DataFrame, n_boot: int = 2000, ci: float = 0.95, seed: int = 0):
+    """Mean, std and percentile-bootstrap CI of the mean for every metric, per configuration."""
+    metrics = REPLICATE_METRICS + [c for c in reps.columns if c.startswith('fairness_L1_')]
+    rng = np.random.default_rng(seed)
+    q = [(1.0 - ci) / 2.0, 1.0 - (1.0 - ci) / 2.0]
+    out = []
+    for (label, a, e), g in reps.groupby(['policy', 'alpha', 'fairness_eta'], sort=False):
+        R = len(g)
+        draws = rng.integers(0, R, size=(n_boot, R))
+        row = {}
+        for m in metrics:
+            v = g[m].to_numpy(dtype=float)
+            lo, hi = np.quantile(v[draws].mean(axis=1), q)
+            row[m] = v.mean(); row[m + '_std'] = v.std(ddof=1) if R > 1 else 0.0
+            row[m + '_ci_low'] = lo; row[m + '_ci_high'] = hi
+        row['policy']=label; row['alpha']=a; row['fairness_eta']=e; row['n_replicates']=R
+        out.append(row)
+    return pd.DataFrame(out)
+
+def replicate(patients_csv: str, donors_csv: str, alphas, etas, n_replicates: int = 30, sample_patients: int = 20000, sample_donors: int = 3000, seed: int = 42, group_col: str = 'Ethnicity', n_workers: int = 1, n_bins: int = 10, index: str = 'binned', n_boot: int = 2000, ci: float = 0.95, fairness_dims=None, fairness_weights=None):
+    """Run the sweep grid on n_replicates cohort samples (seeds seed..seed+R-1).
+
+    The cohorts are read and featurised once; each replicate draws its sample by index,
+    identical to sweep(seed=seed+r). Returns (summary with mean/std/CI columns, per-replicate rows).
+    """
+    patients = read_cohort(patients_csv); donors = read_cohort(donors_csv)
+    full_pat = cohort_arrays(patients, group_col, fairness_dims, fairness_weights)
+    full_pat['Urgency_raw'] = urgency_raw(patients).to_numpy(dtype=float)
+    full_don = donor_arrays(donors)
+    configs = _sweep_configs(alphas, etas)
+    tasks = [(policy, a, e, n_bins, index) for policy, a, e, _ in configs]
+    jobs = [(seed + r, sample_patients, sample_donors, tasks) for r in range(n_replicates)]
+    if n_workers <= 1 or n_replicates <= 1:
+        results = [_replicate_task(full_pat, full_don, *job) for job in jobs]
+    else:
+        shm, layout = _share_arrays(full_pat, full_don, _REPLICATE_KEYS)
+        try:
+            with ProcessPoolExecutor(max_workers=min(n_workers, n_replicates), initializer=_attach_arrays,
+                                     initargs=(shm.name, layout)) as pool:
+                results = list(pool.map(_replicate_worker, jobs))
+        finally:
+            shm.close()
+            shm.unlink()
+    rows = []
+    for r, metrics in enumerate(results):
+        for (_, a, e, label), metr in zip(configs, metrics):
+            rows.append({**metr, 'policy': label, 'alpha': a, 'fairness_eta': e, 'replicate': r, 'seed': seed + r})
+    reps = pd.DataFrame(rows)
+    return summarize_replicates(reps, n_boot, ci, seed), reps
+
+def _nested_samples(patients, donors, sizes, seed, group_col, fairness_dims=None, fairness_weights=None):
+    """Yield kernel (pat, don) arrays for nested samples of growing (n_patients, n_donors) sizes.
+
+    Sample n is the first n rows of RandomState(seed).permutation, the sample
+    DataFrame.sample(n, random_state=seed) draws, so every size matches sweep(seed=seed).
+    Row features are computed only for the rows each size adds; Urgency_norm's bounds and
+    the group shares are running values over the sample, as _sample_arrays renormalises them.
+    """
+    pperm = np.random.RandomState(seed).permutation(len(patients))
+    dperm = np.random.RandomState(seed).permutation(len(donors))
+    raw_cols = [patients[c].to_numpy(dtype=float) for c in ('EPTSScore', 'Age', 'DialysisYears', 'Diabetes')]
+    labels = group_values(patients, group_col) if has_groups(patients, group_col) else np.full(len(patients), 'All')
+    _, group_all = np.unique(labels, return_inverse=True)
+    counts = np.zeros(group_all.max() + 1, dtype=np.int64)
+    cells = fairness_cells(patients, fairness_dims, fairness_weights) if fairness_dims else None
+    abo_all = _abo_codes(patients['BloodType'].values)
+    full_don = donor_arrays(donors)
+    cols = {}
+    umin, umax = np.inf, -np.inf
+    for n_p, n_d in sizes:
+        new = pperm[len(cols.get('abo', ())):n_p]
+        f = feature_arrays(*(c[new] for c in raw_cols))
+        f = {k: v if k == 'Urgency_raw' else v.astype(FEATURE_DTYPE) for k, v in f.items()}
+        f['abo'] = abo_all[new]
+        cols = {k: np.concatenate([cols[k], v]) if k in cols else v for k, v in f.items()}
+        umin, umax = min(umin, f['Urgency_raw'].min()), max(umax, f['Urgency_raw'].max())
+        counts += np.bincount(group_all[new], minlength=len(counts))
+        idx = pperm[:n_p]
+        pat = {k: cols[k] for k in ('EPTS_norm', 'Age80', 'NoTx', 'A_part', 'B_part', 'abo')}
+        pat['Urgency_raw'] = cols['Urgency_raw']
+        pat['Urgency_norm'] = ((cols['Urgency_raw'] - umin) / (umax - umin + 1e-9)).astype(FEATURE_DTYPE)
+        present = counts > 0
+        pat['group'] = (np.cumsum(present) - 1)[group_all[idx]].astype(_code_dtype(present.sum()))
+        pat['p_share'] = counts[present] / n_p
+        if cells is not None:
+            pat['cells'], pat['cell_w'], pat['cell_offsets'] = cells['cells'][idx], cells['cell_w'], cells['cell_offsets']
+            pat['cell_p'] = np.bincount(pat['cells'].ravel(), minlength=len(pat['cell_w'])) / n_p
+            pat['fair_dims'] = cells['fair_dims']
+        didx = dperm[:n_d]
+        yield pat, {'KDPI': full_don['KDPI'][didx], 'abo': full_don['abo'][didx]}
+
+def adaptive_sweep(patients_csv: str, donors_csv: str, alphas, etas, start_patients: int = 2500, max_patients: int = None, donors_per_patient: float = 0.15, growth: float = 2.0, tol: float = 0.01, l1_tol: float = 0.002, patience: int = 1, seed: int = 42, group_col: str = 'Ethnicity', n_workers: int = 1, n_bins: int = 10, index: str = 'binned', fairness_dims=None, fairness_weights=None):
+    """Run each configuration on growing nested samples until its metrics stop moving.
+
+    Sizes start at start_patients and grow by `growth` up to max_patients (default: the
+    whole cohort), with donors_per_patient donors per patient. A configuration converges
+    once, for `patience` consecutive sizes, total_benefit_years per donor and the mean
+    recipient urgency change by less than tol (relative) and fairness_L1 by less than
+    l1_tol (absolute); it is not run at larger sizes. Urgency is compared on the raw
+    scale because Urgency_norm's bounds widen with the sample. Returns (summary, trace): one row per
+    configuration at the size it converged (or the largest size, converged=False), and one
+    row per configuration and size with the changes.
+    """
+    patients = read_cohort(patients_csv); donors = read_cohort(donors_csv)
+    max_patients = min(max_patients or len(patients), len(patients))
+    sizes, n = [], start_patients
+    while True:
+        n_p = min(int(round(n)), max_patients)
+        sizes.append((n_p, min(int(round(n_p * donors_per_patient)), len(donors))))
+        if n_p >= max_patients:
+            break
+        n *= growth
+    configs = _sweep_configs(alphas, etas)
+    active = list(range(len(configs)))
+    prev, streak, final = {}, [0] * len(configs), {}
+    trace = []
+    for (n_p, n_d), (pat, don) in zip(sizes, _nested_samples(patients, donors, sizes, seed, group_col, fairness_dims,
+                                                              fairness_weights)):
+        tasks = [(configs[c][0], configs[c][1], configs[c][2], n_bins, index) for c in active]
+        t0 = time.perf_counter()
+        for c, res in zip(active, _iter_kernels(pat, don, tasks, n_workers)):
+            t1 = time.perf_counter()
+            metr = _kernel_metrics(res, pat)
+            metr['benefit_per_donor'] = metr.get('total_benefit_years', 0.0) / max(n_d, 1)
+            metr['mean_urgency_raw'] = pat['Urgency_raw'][res['recipient_index']].mean()
+            policy, a, e, label = configs[c]
+            row = {'policy': label, 'alpha': a, 'fairness_eta': e, 'sample_patients': n_p, 'sample_donors': n_d,
+                   **metr, 'kernel_seconds': t1 - t0}
+            if c in prev:
+                last = prev[c]
+                row['change_benefit_per_donor'] = abs(metr['benefit_per_donor'] / last['benefit_per_donor'] - 1.0)
+                row['change_mean_urgency_raw'] = abs(metr['mean_urgency_raw'] / last['mean_urgency_raw'] - 1.0)
+                row['change_fairness_L1'] = abs(metr['fairness_L1'] - last['fairness_L1'])
+                still = (row['change_benefit_per_donor'] < tol and row['change_mean_urgency_raw'] < tol
+                         and row['change_fairness_L1'] < l1_tol)
+                streak[c] = streak[c] + 1 if still else 0
+            prev[c] = metr
+            trace.append(row)
+            final[c] = row
+            t0 = time.perf_counter()
+        active = [c for c in active if streak[c] < patience]
+        if not active:
+            break
+    trace = pd.DataFrame(trace)
+    totals = trace.groupby(['policy', 'alpha', 'fairness_eta'], sort=False)['kernel_seconds'].agg(['sum', 'size'])
+    summary = []
+    for c in range(len(configs)):
+        row = {k: v for k, v in final[c].items() if not k.startswith('change_') and k != 'kernel_seconds'}
+        spent = totals.loc[(row['policy'], row['alpha'], row['fairness_eta'])]
+        summary.append({**row, 'converged': streak[c] >= patience, 'n_sizes': int(spent['size']),
+                        'kernel_seconds': float(spent['sum'])})
+    return pd.DataFrame(summary), trace
+
+def sweep(patients_csv: str, donors_csv: str, alphas, etas, sample_patients: int = 20000, sample_donors: int = 3000, seed: int = 42, group_col: str = 'Ethnicity', n_workers: int = 1, n_bins: int = 10, index: str = 'binned', cache_dir: str = None, stats: dict = None, store=None, fairness_dims=None, fairness_weights=None):
+    """Run the policy grid on one cohort sample; returns (summary DataFrame, allocations by config).
+
+    Pass a dict as stats to collect phase timers plus per-configuration kernel counters
+    (see ProfiledAllocator.stats) in stats['phases'] and stats['configs'].
+    With store (an AllocationStore or its directory) each configuration's matches are
+    written to a new partition as soon as its kernel finishes, and the allocations come
+    back as a lazy AllocationView of this run instead of in-memory DataFrames.
+    fairness_dims/fairness_weights set the Hybrid+Fair restriction as in allocate().
+    """
+    t0 = time.perf_counter()
+    cache = FeatureCache(cache_dir) if cache_dir else None
+    pat, don, cohort_key = load_cohort(patients_csv, donors_csv, sample_patients, sample_donors, seed, group_col, cache,
+                                       fairness_dims, fairness_weights)
+    configs = _sweep_configs(alphas, etas)
+    tasks = [(policy, a, e, n_bins, index) for policy, a, e, _ in configs]
+    t1 = time.perf_counter()
+    if store is None:
+        results = _run_kernels(pat, don, tasks, n_workers, cache_dir, cohort_key, profile=stats is not None)
+        t2 = time.perf_counter()
+        out = _collect(pat, don, configs, results, group_col)
+        config_stats = [res.pop('stats', None) for res in results]
+    else:
+        if not isinstance(store, AllocationStore):
+            store = AllocationStore(store)
+        run = store.new_run()
+        rows, config_stats = [], []
+        for (policy, a, e, label), res in zip(configs, _iter_kernels(pat, don, tasks, n_workers, cache_dir,
+                                                                     cohort_key, profile=stats is not None)):
+            config_stats.append(res.pop('stats', None))
+            metr = _kernel_metrics(res, pat)
+            store.append(res, pat, don, {'run': run, 'label': label, 'policy': policy, 'alpha': a, 'fairness_eta': e,
+                                         'n_bins': n_bins, 'index': index, 'group_col': group_col, 'seed': seed,
+                                         'sample_patients': sample_patients, 'sample_donors': sample_donors,
+                                         'patients': patients_csv, 'donors': donors_csv, 'cohort_key': cohort_key,
+                                         'fairness_dims': list(fairness_dims or []),
+                                         'fairness_weights': list(fairness_weights or [])},
+                         metr)
+            rows.append({**metr, 'policy': label, 'alpha': a, 'fairness_eta': e})
+        t2 = time.perf_counter()
+        out = pd.DataFrame(rows), store.view(run=run)
+    if stats is not None:
+        stats['phases'] = {'features': t1 - t0, 'kernels': t2 - t1, 'metrics': time.perf_counter() - t2}
+        stats['configs'] = [{'policy': label, 'alpha': a, 'fairness_eta': e, 'n_bins': n_bins, 'index': index,
+                             **cs} for (_, a, e, label), cs in zip(configs, config_stats)]
+    return out
+
+def sharded_sweep(patients_csv: str, donors_csv: str, alphas, etas, checkpoint_dir: str, seeds=(42,), shard=(0, 1), sample_patients: int = 20000, sample_donors: int = 3000, group_col: str = 'Ethnicity', n_workers: int = 1, n_bins: int = 10, index: str = 'binned', cache_dir: str = None, store=None, fairness_dims=None, fairness_weights=None):
+    """Run this shard's part of the (policy, alpha, eta, seed) grid, checkpointing every configuration.
+
+    Each finished configuration is written atomically to checkpoint_dir (see checkpoints);
+    configurations that already have a result there are skipped, so an interrupted shard
+    resumes where it stopped. Each seed's sample is loaded as in sweep(seed=...), so results
+    equal the unsharded sweep. Returns (configurations run, configurations skipped).
+    """
+    grid = {'patients': patients_csv, 'donors': donors_csv, 'alphas': list(alphas), 'etas': list(etas),
+            'seeds': list(seeds), 'sample_patients': sample_patients, 'sample_donors': sample_donors,
+            'group_col': group_col, 'n_bins': n_bins, 'index': index,
+            'fairness_dims': list(fairness_dims or []), 'fairness_weights': list(fairness_weights or [])}
+    ckpt = SweepCheckpoint(checkpoint_dir, grid)
+    configs = _sweep_configs(alphas, etas)
+    mine = shard_slice([(s, c) for s in seeds for c in configs], shard)
+    done = ckpt.done()
+    pending = [(s, c) for s, c in mine if config_name(c[0], c[1], c[2], s) not in done]
+    if store is not None and not isinstance(store, AllocationStore):
+        store = AllocationStore(store)
+    run = store.new_run() if store is not None else None
+    cache = FeatureCache(cache_dir) if cache_dir else None
+    for seed in dict.fromkeys(s for s, _ in pending):
+        seed_configs = [c for s, c in pending if s == seed]
+        pat, don, cohort_key = load_cohort(patients_csv, donors_csv, sample_patients, sample_donors, seed, group_col,
+                                           cache, fairness_dims, fairness_weights)
+        tasks = [(policy, a, e, n_bins, index) for policy, a, e, _ in seed_configs]
+        for (policy, a, e, label), res in zip(seed_configs, _iter_kernels(pat, don, tasks, n_workers, cache_dir,
+                                                                          cohort_key)):
+            metr = _kernel_metrics(res, pat)
+            config = {'label': label, 'policy': policy, 'alpha': a, 'fairness_eta': e, 'seed': seed}
+            if store is not None:
+                store.append(res, pat, don, {'run': run, **config, 'n_bins': n_bins, 'index': index,
+                                             'group_col': group_col, 'sample_patients': sample_patients,
+                                             'sample_donors': sample_donors, 'patients': patients_csv,
+                                             'donors': donors_csv, 'cohort_key': cohort_key,
+                                             'fairness_dims': grid['fairness_dims'],
+                                             'fairness_weights': grid['fairness_weights']}, metr)
+            ckpt.write(config_name(policy, a, e, seed), config, metr, shard=list(shard))
+    if store is not None and len(store.view(run=run)) != len(pending):
+        # every partition of the run must stay reachable, one key per (configuration, seed)
+        raise RuntimeError(f"allocation store run {run} has {len(store.view(run=run))} keys for {len(pending)} partitions")
+    return len(pending), len(mine) - len(pending)
+
+def merge_checkpoints(checkpoint_dir: str, n_boot: int = 2000, ci: float = 0.95):
+    """Rebuild the sweep summary from a checkpoint directory.
+
+    Returns (summary, per-seed rows, missing configuration names). With one seed the summary
+    has sweep()'s rows in grid order; with several it is summarize_replicates() of the rows,
+    as replicate() returns. Missing configurations are left out of both frames.
+    """
+    ckpt = SweepCheckpoint(checkpoint_dir)
+    grid = ckpt.grid
+    done = ckpt.done()
+    rows, missing = [], []
+    for r, seed in enumerate(grid['seeds']):
+        for policy, a, e, label in _sweep_configs(grid['alphas'], grid['etas']):
+            name = config_name(policy, a, e, seed)
+            if name not in done:
+                missing.append(name)
+                continue
+            rows.append({**ckpt.read(name)['metrics'], 'policy': label, 'alpha': a, 'fairness_eta': e,
+                         'replicate': r, 'seed': seed})
+    reps = pd.DataFrame(rows)
+    if len(grid['seeds']) > 1:
+        summary = summarize_replicates(reps, n_boot, ci, grid['seeds'][0]) if len(reps) else reps
+    else:
+        summary = reps.drop(columns=['replicate', 'seed'], errors='ignore')
+    return summary, reps, missing
+
+# Dense alpha paths: the hybrid policy for K alphas run in lockstep, one donor loop for all of them.
+def _advance_rows(lst, pos, rows, end, available):
+    """_advance for several rows of a (K, n) list matrix at once; end is a per-row bound."""
+    pos = pos.copy()
+    n = lst.shape[1]
+    window = np.arange(1, _SCAN_CHUNK + 1)
+    act = np.arange(len(rows))
+    while act.size:
+        act = act[pos[act] < end[act]]
+        if not act.size:
+            break
+        rr = rows[act]
+        act = act[~available[rr, lst[rr, pos[act]]]]
+        if not act.size:
+            break
+        rr = rows[act]
+        win = pos[act][:, None] + window
+        ok = available[rr[:, None], lst[rr[:, None], np.minimum(win, n - 1)]] & (win < end[act][:, None])
+        hit = ok.any(axis=1)
+        pos[act] = np.where(hit, win[np.arange(len(act)), ok.argmax(axis=1)], np.minimum(win[:, -1] + 1, end[act]))
+        act = act[~hit]
+    return pos
+
+class _AlphaPathLists:
+    """Hybrid sorted lists for K alphas at once, built per (ABO, bin) on first use.
+
+    lists(c, b) is a (K, n_abo) matrix whose row k is the _sorted_index_arrays list for
+    alphas[k]; group_lists(c, b) holds the same rows regrouped into contiguous per-group
+    runs (as _group_index_arrays), starting at offsets[c]. Both are sorted lazily: a
+    quarter of each list first, the rest only once some alpha's head gets there.
+    """
+    def __init__(self, pat, alphas, n_bins=10):
+        U, A, B = (np.asarray(pat[k], dtype=float) for k in ('Urgency_norm', 'A_part', 'B_part'))
+        abo, group = pat['abo'], pat['group']
+        n_groups = len(pat['p_share'])
+        self.U, self.alpha = U, np.asarray(alphas, dtype=float)[:, None]
+        self.n_bins = n_bins
+        self.idx_by_abo = [np.where(abo == c)[0] for c in range(len(ABO_TYPES))]
+        self.idx_by_group = [[idxs[group[idxs] == g] for g in range(n_groups)] for idxs in self.idx_by_abo]
+        self.offsets = [np.concatenate([[0], np.cumsum([len(ix) for ix in per_group])]) for per_group in self.idx_by_group]
+        self.util_norm = []
+        for b in range(n_bins):
+            util_key = A + B * ((b + 0.5) / n_bins)
+            kmin, kmax = util_key.min(), util_key.max()
+            self.util_norm.append((util_key - kmin) / (kmax - kmin + 1e-9))
+        self._lists, self._group_lists = {}, {}
+
+    def _sorted(self, idxs, b, m=None):
+        """First m columns (all if None) of the stable descending-key order of idxs, per alpha."""
+        key = -(self.alpha * self.U[idxs] + (1.0 - self.alpha) * self.util_norm[b][idxs])
+        if m is None or m >= len(idxs):
+            return idxs[np.argsort(key, axis=1, kind='stable')]
+        # Partition off the m best, then sort them in index order so ties stay stable; rows
+        # where a tie straddles the cut could have picked the wrong tied members and are redone.
+        top = np.sort(np.argpartition(key, m - 1, axis=1)[:, :m], axis=1)
+        sub = np.take_along_axis(key, top, axis=1)
+        order = np.argsort(sub, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        kth = np.take_along_axis(sub, order[:, -1:], axis=1)
+        for k in np.nonzero((key <= kth).sum(axis=1) > m)[0]:
+            top[k] = np.argsort(key[k], kind='stable')[:m]
+        return idxs[top]
+
+    def lists(self, c, b, depth=0):
+        """(K, m) prefix of the (c, b) lists covering at least position depth."""
+        lst = self._lists.get((c, b))
+        n = len(self.idx_by_abo[c])
+        if lst is None or (lst.shape[1] <= depth < n):
+            m = max(n // 4, _SCAN_CHUNK) if lst is None and depth < n // 4 else None
+            lst = self._lists[c, b] = self._sorted(self.idx_by_abo[c], b, m)
+        return lst
+
+    def group_lists(self, c, b):
+        """((K, n_abo) per-group runs, ends): run g is sorted up to column ends[g] so far."""
+        if (c, b) not in self._group_lists:
+            lst = np.zeros((len(self.alpha), len(self.idx_by_abo[c])), dtype=np.int64)
+            ends = self.offsets[c][:-1].copy()
+            self._group_lists[c, b] = lst, ends
+            for g in range(len(ends)):
+                self._fill_group(c, b, g, full=False)
+        return self._group_lists[c, b]
+
+    def _fill_group(self, c, b, g, full=True):
+        lst, ends = self._group_lists[c, b]
+        idxs, lo = self.idx_by_group[c][g], self.offsets[c][g]
+        run = self._sorted(idxs, b, None if full else max(len(idxs) // 4, _SCAN_CHUNK))
+        lst[:, lo:lo + run.shape[1]] = run
+        ends[g] = lo + run.shape[1]
+
+    def extend_group(self, c, b, g):
+        self._fill_group(c, b, g, full=True)
+
+def _alpha_path_kernel(pat, don, alphas, fairness_eta=0.0, n_bins=10):
+    """_allocate_kernel('hybrid', alpha) for every alpha in one pass over the donors.
+
+    Row k of every state array (available mask, heads, group counts) is the allocator for
+    alphas[k]; each donor is matched for all rows with vectorised head advances and rescoring.
+    Returns (K, n_donors) recipient (-1 if unmatched) and utility matrices.
+    """
+    alphas = np.asarray(alphas, dtype=float)
+    K, N = len(alphas), len(pat['Urgency_norm'])
+    U, E, Age80, NoTx, group, p_share = (pat[k] for k in ('Urgency_norm', 'EPTS_norm', 'Age80', 'NoTx', 'group', 'p_share'))
+    U = U.astype(float)
+    fair = fairness_eta > 0
+    index = _AlphaPathLists(pat, alphas, n_bins)
+    offsets = index.offsets
+    heads = [[np.zeros(K, dtype=np.int64) for _ in range(n_bins)] for _ in ABO_TYPES]
+    group_heads = [[np.tile(offsets[c][:-1], (K, 1)) for _ in range(n_bins)] for c in range(len(ABO_TYPES))]
+    available = np.ones((K, N), dtype=bool)
+    alloc_counts = np.zeros((K, len(p_share)), dtype=np.int64)
+    n_assigned = np.zeros(K, dtype=np.int64)
+    if fair:
+        # available patients per (alpha, recipient ABO, group): a group is only restricted to if servable
+        abo = pat['abo']
+        alive = np.zeros((len(ABO_TYPES), len(p_share)), dtype=np.int64)
+        np.add.at(alive, (abo[abo >= 0], group[abo >= 0]), 1)
+        alive = np.tile(alive, (K, 1, 1))
+    K_norm = np.clip(don['KDPI'], 0.0, 100.0) / 100.0
+    bins = donor_bins(don['KDPI'], n_bins).tolist()
+    don_abo = don['abo'].tolist()
+    n_don = len(bins)
+    recipient = np.full((K, n_don), -1, dtype=np.int64)
+    utility = np.zeros((K, n_don))
+    rows = np.arange(K)
+    restricted = np.zeros(K, dtype=bool)
+    g_star = np.zeros(K, dtype=np.int64)
+    for d in range(n_don):
+        codes, b = _RECIPIENT_CODES[don_abo[d]], bins[d]
+        if not codes:
+            continue
+        if fair:
+            deficits = np.where(alive[:, codes, :].sum(axis=1) > 0, p_share * n_assigned[:, None] - alloc_counts, -np.inf)
+            g_star = deficits.argmax(axis=1)
+            restricted = (n_assigned > 0) & (deficits[rows, g_star] > 0)
+        free, held = rows[~restricted], rows[restricted]
+        cand = np.full((K, len(codes)), -1, dtype=np.int64)
+        for j, a in enumerate(codes):
+            hs, n = heads[a][b], len(index.idx_by_abo[a])
+            if n == 0:
+                continue
+            if free.size:
+                lst = index.lists(a, b)
+                pos = _advance_rows(lst, hs[free], free, np.full(free.size, lst.shape[1]), available)
+                if lst.shape[1] < n and (pos >= lst.shape[1]).any():
+                    lst = index.lists(a, b, depth=lst.shape[1])
+                    pos = _advance_rows(lst, pos, free, np.full(free.size, n), available)
+                hs[free] = pos
+                ok = pos < n
+                cand[free[ok], j] = lst[free[ok], pos[ok]]
+            if held.size:
+                (glst, sorted_end), ghs, g = index.group_lists(a, b), group_heads[a][b], g_star[held]
+                end = offsets[a][g + 1]
+                pos = _advance_rows(glst, ghs[held, g], held, sorted_end[g], available)
+                short = (pos >= sorted_end[g]) & (sorted_end[g] < end)
+                if short.any():
+                    for gg in np.unique(g[short]):
+                        index.extend_group(a, b, gg)
+                    pos[short] = _advance_rows(glst, pos[short], held[short], end[short], available)
+                ghs[held, g] = pos
+                ok = pos < end
+                cand[held[ok], j] = glst[held[ok], pos[ok]]
+        valid = cand >= 0
+        live = valid.any(axis=1)
+        if not live.any():
+            continue
+        r, c, v = rows[live], cand[live], valid[live]
+        c0 = np.where(v, c, 0)
+        util, _, _ = exact_utility(E[c0], Age80[c0], NoTx[c0], K_norm[d])
+        ar = alphas[r][:, None]
+        score = np.where(v, ar * U[c0] + (1.0 - ar) * (util / 12.0), -np.inf)
+        k = score.argmax(axis=1)
+        sel = np.arange(len(r))
+        best = c[sel, k]
+        available[r, best] = False
+        for j, a in enumerate(codes):
+            step = r[(k == j) & ~restricted[r]]
+            heads[a][b][step] += 1
+        alloc_counts[r, group[best]] += 1
+        if fair:
+            alive[r, pat['abo'][best], group[best]] -= 1
+        n_assigned[r] += 1
+        recipient[r, d] = best
+        utility[r, d] = util[sel, k]
+    return recipient, utility
+
+def _path_batch_size(n_patients, n_bins, fairness_eta, budget=2**28):
+    """Alphas per lockstep batch so the (K, n) list matrices stay within ~budget bytes."""
+    per_alpha = n_patients * n_bins * 8 * (2 if fairness_eta > 0 else 1)
+    return max(1, budget // max(per_alpha, 1))
+
+def alpha_path(patients_csv: str, donors_csv: str, alphas=None, n_alphas: int = 101, etas=(0.0,), sample_patients: int = 20000, sample_donors: int = 3000, seed: int = 42, group_col: str = 'Ethnicity', n_bins: int = 10, cache_dir: str = None, batch: int = None, fairness_dims=None, fairness_weights=None):
+    """Hybrid metrics on a dense alpha grid (default n_alphas points on [0, 1]) for each eta.
+
+    Same allocations as sweep() at each alpha, computed in lockstep batches. Metrics are
+    known only at the grid alphas, as no breakpoints between them are located; each row also
+    says whether the allocation differs from the previous grid alpha, at which donor it first
+    diverges, and how many donors changed.
+    The lockstep kernel restricts by group_col only: fairness_dims add their fairness_L1_<dim>
+    metrics at eta=0 and are refused with eta>0.
+    """
+    if fairness_dims and any(e > 0 for e in etas):
+        raise ValueError("alpha_path balances group_col only; use sweep() for fairness_dims with eta > 0")
+    cache = FeatureCache(cache_dir) if cache_dir else None
+    pat, don, _ = load_cohort(patients_csv, donors_csv, sample_patients, sample_donors, seed, group_col, cache,
+                              fairness_dims, fairness_weights)
+    alphas = np.linspace(0.0, 1.0, n_alphas) if alphas is None else np.asarray(alphas, dtype=float)
+    rows = []
+    for e in etas:
+        size = batch or _path_batch_size(len(pat['abo']), n_bins, e)
+        prev = None
+        for start in range(0, len(alphas), size):
+            recipient, utility = _alpha_path_kernel(pat, don, alphas[start:start + size], e, n_bins)
+            for k, a in enumerate(alphas[start:start + size]):
+                mask = recipient[k] >= 0
+                metr = _kernel_metrics({'recipient_index': recipient[k][mask], 'utility_years': utility[k][mask]}, pat)
+                diff = np.zeros(len(mask), dtype=bool) if prev is None else recipient[k] != prev
+                rows.append({**metr, 'policy': 'Hybrid' if e == 0 else 'Hybrid+Fair', 'alpha': a, 'fairness_eta': e,
+                             'alloc_changed': bool(diff.any()),
+                             'first_changed_donor': int(diff.argmax()) if diff.any() else -1,
+                             'n_changed_donors': int(diff.sum())})
+                prev = recipient[k]
+    return pd.DataFrame(rows)
@@ -50,7 +50,8 @@ python scripts/run_sweep.py \
   --sample_donors 3000 \
   --alphas 0.25 0.5 0.75 \
   --etas 0 1.0 \
-  --group_col Ethnicity
+  --group_col Ethnicity \
+  --cache_dir data/cache
 
 echo ""
 echo "Step 2: Generating plots..."
@@ -3,8 +3,14 @@
 Analyze sweep results and generate tables for LaTeX paper.
 """
 import argparse
+import os
 import pandas as pd
 import numpy as np
+from alloc_store import AllocationStore
+from pareto import front_table
+
+# summaries longer than this are truncated when printed and reduced to their Pareto front in LaTeX
+MAX_ROWS = 200
 
 def format_latex_table(df, caption, label):
     """Generate LaTeX table from DataFrame."""
@@ -19,33 +25,76 @@ def format_latex_table(df, caption, label):
     latex += " & ".join([str(col).replace("_", " ").title() for col in df.columns]) + " \\\\\n"
     latex += "\\hline\n"
     
-    # Rows
-    for _, row in df.iterrows():
-        values = []
-        for i, val in enumerate(row):
-            if i == 0:  # Policy name
-                values.append(str(val))
-            elif isinstance(val, float):
-                if val < 1:
-                    values.append(f"{val:.4f}")
-                else:
-                    values.append(f"{val:.1f}")
-            else:
-                values.append(str(val))
-        latex += " & ".join(values) + " \\\\\n"
+    # Rows, formatted a column at a time: first column as text, floats by magnitude
+    cells = []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if i > 0 and pd.api.types.is_float_dtype(values):
+            v = values.to_numpy()
+            text = np.where(v < 1, np.char.mod('%.4f', v), np.char.mod('%.1f', v))
+            cells.append(pd.Series(text, index=df.index))
+        else:
+            cells.append(values.astype(str))
+    if len(df):
+        rows = cells[0].str.cat(cells[1:], sep=" & ") if len(cells) > 1 else cells[0]
+        latex += "".join((rows + " \\\\\n").tolist())
     
     latex += "\\hline\n"
     latex += "\\end{tabular}\n"
     latex += "\\end{table}\n"
     return latex
 
+def subgroup_table(store, run=None):
+    """Per-configuration, per-recipient-group match share, patient share and mean benefit.
+
+    Reads one configuration's group and utility columns at a time from the allocation store;
+    run defaults to the most recently written sweep.
+    """
+    parts = store.partitions()
+    if parts.empty:
+        return pd.DataFrame()
+    run = run or parts['run'].iloc[-1]
+    rows = []
+    for name in parts.loc[parts['run'] == run, 'partition']:
+        alloc = store.load(name, columns=['recipient_group', 'utility_years'])
+        cfg = alloc.attrs['config']
+        by_group = alloc.groupby('recipient_group', observed=False)['utility_years'].agg(['size', 'mean'])
+        for g, p in zip(alloc.attrs['group_labels'], alloc.attrs['p_share']):
+            n = by_group.loc[g, 'size']
+            rows.append({'policy': cfg['label'], 'alpha': cfg['alpha'], 'fairness_eta': cfg['fairness_eta'],
+                         'seed': cfg.get('seed'), 'group': g, 'n_matched': int(n), 'match_share': n / max(len(alloc), 1),
+                         'patient_share': p, 'share_gap': n / max(len(alloc), 1) - p,
+                         'mean_benefit_years': by_group.loc[g, 'mean'] if n else np.nan})
+    return pd.DataFrame(rows)
+
+def overview(df):
+    """df as text, truncated past MAX_ROWS rows (to_string is slow on very long sweeps)."""
+    if len(df) <= MAX_ROWS:
+        return df.to_string(index=False)
+    return (df.to_string(index=False, max_rows=MAX_ROWS) +
+            f"\n({len(df)} rows; showing the first and last {MAX_ROWS // 2})")
+
+def describe(df, metrics):
+    """One '  policy (α, η): metrics' line per row, built column-wise."""
+    if len(df) == 0:
+        return ""
+    head = ("  " + df['policy'].astype(str) + " (α=" + df['alpha'].map('{:.2f}'.format) +
+            ", η=" + df['fairness_eta'].map('{:.2f}'.format) + "): ")
+    return "\n".join((head + df.apply(metrics, axis=1)).tolist())
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--summary', type=str, default='data/summary.csv')
     ap.add_argument('--output', type=str, default='data/analysis.txt')
+    ap.add_argument('--front', type=str, default='data/pareto_front.csv',
+                    help='where to write the benefit/urgency/L1 Pareto front')
+    ap.add_argument('--store', type=str, default='data/allocations',
+                    help='allocation store written by run_sweep.py, for the subgroup breakdown')
+    ap.add_argument('--run', type=str, default=None, help='sweep run id in the store (default: latest)')
     args = ap.parse_args()
     
     df = pd.read_csv(args.summary)
+    front, hv = front_table(df)
     
     print("=" * 70)
     print("KIDNEY ALLOCATION POLICY ANALYSIS")
@@ -55,7 +104,7 @@ def main():
     # Overall summary
     print("Overall Summary:")
     print("-" * 70)
-    print(df.to_string(index=False))
+    print(overview(df))
     print()
     
     # Best policies by metric
@@ -116,9 +165,11 @@ def main():
     hybrid_only = df[(df['policy'] == 'Hybrid') & (df['fairness_eta'] == 0)]
     if len(hybrid_only) > 0:
         print("Alpha (λ) Sensitivity (Hybrid policies, η=0):")
-        for _, row in hybrid_only.iterrows():
-            print(f"  α={row['alpha']:.2f}: Benefit={row['total_benefit_years']:.1f}, "
-                  f"Urgency={row['mean_urgency_norm']:.4f}, L1={row['fairness_L1']:.4f}")
+        lines = ("  α=" + hybrid_only['alpha'].map('{:.2f}'.format) +
+                 ": Benefit=" + hybrid_only['total_benefit_years'].map('{:.1f}'.format) +
+                 ", Urgency=" + hybrid_only['mean_urgency_norm'].map('{:.4f}'.format) +
+                 ", L1=" + hybrid_only['fairness_L1'].map('{:.4f}'.format))
+        print("\n".join(lines.tolist()))
         print()
     
     # Generate LaTeX tables
@@ -128,13 +179,16 @@ def main():
     print()
     
     # Table 1: Main results
-    table_df = df[['policy', 'alpha', 'fairness_eta', 'total_benefit_years', 
+    caption = "Allocation policy performance across metrics."
+    rows = df
+    if len(df) > MAX_ROWS:
+        rows = front[front['front_3d']].sort_index()
+        caption = f"Pareto-optimal allocation policies ({len(rows)} of {len(df)} configurations)."
+    table_df = rows[['policy', 'alpha', 'fairness_eta', 'total_benefit_years', 
                     'mean_urgency_norm', 'fairness_L1', 'n_assigned']].copy()
     table_df.columns = ['Policy', 'α', 'η', 'Benefit (yr)', 'Urgency', 'L1', 'N']
     
-    latex_table = format_latex_table(table_df, 
-                                     "Allocation policy performance across metrics.", 
-                                     "tab:results")
+    latex_table = format_latex_table(table_df, caption, "tab:results")
     print(latex_table)
     print()
     
@@ -142,38 +196,43 @@ def main():
     print("Pareto Frontier Analysis:")
     print("-" * 70)
     
-    # Check for domination in benefit-urgency space
-    pareto = []
-    for i, row_i in df.iterrows():
-        dominated = False
-        for j, row_j in df.iterrows():
-            if i != j:
-                # row_j dominates row_i if it's better in both metrics
-                if (row_j['total_benefit_years'] >= row_i['total_benefit_years'] and 
-                    row_j['mean_urgency_norm'] >= row_i['mean_urgency_norm'] and
-                    (row_j['total_benefit_years'] > row_i['total_benefit_years'] or 
-                     row_j['mean_urgency_norm'] > row_i['mean_urgency_norm'])):
-                    dominated = True
-                    break
-        if not dominated:
-            pareto.append(i)
-    
+    pareto = front[front['front_2d']].sort_index()
     print(f"Pareto-optimal policies (benefit-urgency): {len(pareto)}/{len(df)}")
-    for idx in pareto:
-        row = df.iloc[idx]
-        print(f"  {row['policy']} (α={row['alpha']:.2f}, η={row['fairness_eta']:.2f}): "
-              f"Benefit={row['total_benefit_years']:.1f}, Urgency={row['mean_urgency_norm']:.4f}")
+    print(describe(pareto, lambda r: f"Benefit={r['total_benefit_years']:.1f}, Urgency={r['mean_urgency_norm']:.4f}"))
+    front3 = front[front['front_3d']]
+    print(f"\nPareto-optimal policies (benefit-urgency-fairness L1): {len(front3)}/{len(df)}")
+    print(f"Hypervolume (objectives normalised to [0, 1]): 2D {hv['front_2d']:.4f}, 3D {hv['front_3d']:.4f}")
+    print("Closest to the utopia point (best observed benefit, urgency and L1):")
+    print(describe(front3.head(5), lambda r: f"distance={r['utopia_dist_3d']:.4f}, Benefit={r['total_benefit_years']:.1f}, "
+                                             f"Urgency={r['mean_urgency_norm']:.4f}, L1={r['fairness_L1']:.4f}"))
+    front.to_csv(args.front, index=False)
+    print(f"Front ({len(front)} rows, 2D and 3D flags) saved to: {args.front}")
     print()
     
+    subgroups = pd.DataFrame()
+    if args.store and os.path.isdir(args.store):
+        subgroups = subgroup_table(AllocationStore(args.store), args.run)
+    if len(subgroups) > 0:
+        print("Subgroup Breakdown (match share vs patient share):")
+        print("-" * 70)
+        print(subgroups.to_string(index=False, float_format='{:.4f}'.format))
+        print()
+
     # Save to file
     with open(args.output, 'w') as f:
         f.write("KIDNEY ALLOCATION POLICY ANALYSIS\n")
         f.write("=" * 70 + "\n\n")
-        f.write(df.to_string(index=False))
+        f.write(overview(df))
         f.write("\n\n" + "=" * 70 + "\n")
         f.write("LATEX TABLE\n")
         f.write("=" * 70 + "\n\n")
         f.write(latex_table)
+        if len(subgroups) > 0:
+            f.write("\n" + "=" * 70 + "\n")
+            f.write("SUBGROUP BREAKDOWN\n")
+            f.write("=" * 70 + "\n\n")
+            f.write(subgroups.to_string(index=False, float_format='{:.4f}'.format))
+            f.write("\n")
     
     print(f"Analysis saved to: {args.output}")
 
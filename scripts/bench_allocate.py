@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Check the array-backed allocate() against the row-by-row reference and time both.
+"""
+import argparse
+import time
+import pandas as pd
+from cohort_io import read_cohort
+from policy_baselines import compute_patient_features, allocate, allocate_reference
+
+CONFIGS = [
+    ('urgency', 1.0, 0.0),
+    ('utility', 0.0, 0.0),
+    ('hybrid', 0.5, 0.0),
+    ('hybrid', 0.5, 1.0),
+]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--patients', default='data/patients.csv')
+    ap.add_argument('--donors', default='data/donors.csv')
+    ap.add_argument('--sample_patients', type=int, default=20000)
+    ap.add_argument('--sample_donors', type=int, default=3000)
+    ap.add_argument('--group_col', type=str, default='Ethnicity')
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    patients = read_cohort(args.patients).sample(n=args.sample_patients, random_state=args.seed).reset_index(drop=True)
+    donors = read_cohort(args.donors).sample(n=args.sample_donors, random_state=args.seed).reset_index(drop=True)
+    patients_feat = compute_patient_features(patients)
+
+    failed = 0
+    for policy, a, e in CONFIGS:
+        t0 = time.perf_counter()
+        ref_df, ref_m = allocate_reference(donors, patients_feat, policy, alpha=a, fairness_eta=e, group_col=args.group_col)
+        t1 = time.perf_counter()
+        new_df, new_m = allocate(donors, patients_feat, policy, alpha=a, fairness_eta=e, group_col=args.group_col)
+        t2 = time.perf_counter()
+        try:
+            pd.testing.assert_frame_equal(ref_df, new_df)
+            same = ref_m == new_m
+        except AssertionError:
+            same = False
+        failed += not same
+        print(f"{policy:8s} α={a:.2f} η={e:.2f}: reference {t1 - t0:7.3f}s, "
+              f"kernel {t2 - t1:7.3f}s ({(t1 - t0) / (t2 - t1):5.1f}x)  parity={'OK' if same else 'MISMATCH'}")
+    if failed:
+        raise SystemExit(f"{failed} configuration(s) differ from the reference implementation")
+
+if __name__ == '__main__':
+    main()
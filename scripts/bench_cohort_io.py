@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Cold-start time and peak RSS of loading + featurising a cohort: CSV vs columnar.
+
+Each measurement runs in a fresh interpreter so peak RSS is per load path.
+Columnar directories are created next to the CSVs (via convert_cohort) if missing.
+Also times load_cohort on a sample without a cache, filling a FeatureCache, and
+from that cache in a new process, which must hit without rebuilding.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from cohort_io import convert_csv, is_columnar
+
+PROBE = r'''
+import json, resource, sys, time
+t0 = time.perf_counter()
+from cohort_io import read_cohort
+from policy_baselines import cohort_arrays, donor_arrays
+t1 = time.perf_counter()
+patients = read_cohort(sys.argv[1]); donors = read_cohort(sys.argv[2])
+t2 = time.perf_counter()
+pat = cohort_arrays(patients); don = donor_arrays(donors)
+t3 = time.perf_counter()
+print(json.dumps({'import_s': t1 - t0, 'load_s': t2 - t1, 'features_s': t3 - t2,
+                  'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+CACHE_PROBE = r'''
+import json, resource, sys, time
+from feature_cache import FeatureCache
+from policy_baselines import load_cohort
+t0 = time.perf_counter()
+cache = FeatureCache(sys.argv[5]) if sys.argv[5] else None
+load_cohort(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), cache=cache)
+print(json.dumps({'load_s': time.perf_counter() - t0, 'misses': cache.misses if cache else 0,
+                  'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+def probe(*args, repeats, script=PROBE):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    runs = [json.loads(subprocess.check_output([sys.executable, '-c', script, *map(str, args)], env=env))
+            for _ in range(repeats)]
+    return {k: (max if k == 'misses' else min)(r[k] for r in runs) for k in runs[0]}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--patients', default='data/patients.csv')
+    ap.add_argument('--donors', default='data/donors.csv')
+    ap.add_argument('--repeats', type=int, default=3)
+    ap.add_argument('--sample_patients', type=int, default=20000)
+    ap.add_argument('--sample_donors', type=int, default=3000)
+    args = ap.parse_args()
+
+    columnar = []
+    for csv_path in (args.patients, args.donors):
+        out_dir = csv_path[:-4] + '.cohort' if csv_path.endswith('.csv') else csv_path + '.cohort'
+        if not is_columnar(out_dir):
+            convert_csv(csv_path, out_dir)
+        columnar.append(out_dir)
+
+    print(f"{'format':10s} {'load_s':>8s} {'features_s':>11s} {'total_s':>8s} {'peak_rss_mb':>12s}")
+    for name, paths in (('csv', (args.patients, args.donors)), ('columnar', columnar)):
+        r = probe(*paths, repeats=args.repeats)
+        print(f"{name:10s} {r['load_s']:8.3f} {r['features_s']:11.3f} {r['load_s'] + r['features_s']:8.3f} {r['peak_rss_mb']:12.1f}")
+
+    sample = (args.patients, args.donors, args.sample_patients, args.sample_donors)
+    cache_dir = tempfile.mkdtemp(prefix='cohort-cache-')
+    try:
+        rows = [('no cache', probe(*sample, '', repeats=args.repeats, script=CACHE_PROBE)),
+                ('cold', probe(*sample, cache_dir, repeats=1, script=CACHE_PROBE)),
+                ('warm', probe(*sample, cache_dir, repeats=args.repeats, script=CACHE_PROBE))]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print(f"\nload_cohort {args.sample_patients}/{args.sample_donors}")
+    print(f"{'cache':10s} {'load_s':>8s} {'peak_rss_mb':>12s}")
+    for name, r in rows:
+        print(f"{name:10s} {r['load_s']:8.3f} {r['peak_rss_mb']:12.1f}")
+    if rows[2][1]['misses']:
+        sys.exit("warm cache missed: load_cohort rebuilt the cohort in a new process")
+
+if __name__ == '__main__':
+    main()
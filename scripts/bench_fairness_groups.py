@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Time the eta=1.0 hybrid sweep as the number of fairness groups grows.
+
+Patients get a synthetic group column with G uniformly drawn groups; with the
+per-(ABO, bin, group) candidate lists the restricted lookups stay amortized
+O(1), so the sweep time should stay flat as G increases.
+"""
+import argparse
+import time
+import numpy as np
+from cohort_io import read_cohort
+from policy_baselines import compute_patient_features, allocate, allocate_reference
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--patients', default='data/patients.csv')
+    ap.add_argument('--donors', default='data/donors.csv')
+    ap.add_argument('--sample_patients', type=int, default=20000)
+    ap.add_argument('--sample_donors', type=int, default=3000)
+    ap.add_argument('--groups', type=int, nargs='+', default=[2, 5, 25, 100, 400])
+    ap.add_argument('--alphas', type=float, nargs='+', default=[0.25, 0.5, 0.75])
+    ap.add_argument('--reference', action='store_true', help='also time allocate_reference (linear scans)')
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    patients = read_cohort(args.patients).sample(n=args.sample_patients, random_state=args.seed).reset_index(drop=True)
+    donors = read_cohort(args.donors).sample(n=args.sample_donors, random_state=args.seed).reset_index(drop=True)
+    patients_feat = compute_patient_features(patients)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'groups':>6s} {'sweep_s':>9s} {'per_donor_us':>13s} {'L1':>8s}" + (f" {'reference_s':>12s}" if args.reference else ""))
+    for G in args.groups:
+        patients_feat['BenchGroup'] = rng.integers(0, G, len(patients_feat))
+        t0 = time.perf_counter()
+        l1 = []
+        for a in args.alphas:
+            _, metr = allocate(donors, patients_feat, 'hybrid', alpha=a, fairness_eta=1.0, group_col='BenchGroup')
+            l1.append(metr['fairness_L1'])
+        elapsed = time.perf_counter() - t0
+        line = f"{G:6d} {elapsed:9.3f} {elapsed / (len(args.alphas) * len(donors)) * 1e6:13.1f} {np.mean(l1):8.4f}"
+        if args.reference:
+            t0 = time.perf_counter()
+            for a in args.alphas:
+                allocate_reference(donors, patients_feat, 'hybrid', alpha=a, fairness_eta=1.0, group_col='BenchGroup')
+            line += f" {time.perf_counter() - t0:12.3f}"
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Check pareto_mask against a brute-force dominance test and time front_table.
+
+Summaries are random (benefit, urgency, L1) rows with a fraction of exact
+duplicates, so ties are exercised; --sizes rows are timed with and without
+the front-only worst case (every point on an anti-correlated surface).
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from pareto import OBJECTIVES, front_table, pareto_mask
+
+def random_summary(n, rng, on_front=False):
+    if on_front:
+        # points on the simplex x + y + z = 1 (L1 flipped): nothing dominates anything
+        P = rng.dirichlet(np.ones(3), n)
+        return pd.DataFrame({'total_benefit_years': P[:, 0], 'mean_urgency_norm': P[:, 1], 'fairness_L1': -P[:, 2]})
+    df = pd.DataFrame({'total_benefit_years': rng.integers(0, 50, n).astype(float),
+                       'mean_urgency_norm': rng.integers(0, 50, n) / 50,
+                       'fairness_L1': rng.integers(0, 50, n) / 500})
+    return pd.concat([df, df.sample(frac=0.1, random_state=0)], ignore_index=True)
+
+def brute_force(df, objectives):
+    P = np.column_stack([df[c].to_numpy(dtype=float) * s for c, s in objectives.items()])
+    geq = (P[None, :, :] >= P[:, None, :]).all(axis=2)
+    gt = (P[None, :, :] > P[:, None, :]).any(axis=2)
+    return ~(geq & gt).any(axis=1)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--checks', type=int, default=200, help='random cases checked against brute force')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    two = dict(list(OBJECTIVES.items())[:2])
+    for _ in range(args.checks):
+        df = random_summary(int(rng.integers(1, 300)), rng)
+        for obj in (two, OBJECTIVES):
+            if not (pareto_mask(df, obj).to_numpy() == brute_force(df, obj)).all():
+                raise SystemExit(f"mismatch on {len(df)} rows, objectives {list(obj)}")
+    print(f"pareto_mask matches brute force on {args.checks} random summaries (2 and 3 objectives)")
+
+    print(f"{'rows':>8s} {'front_table_s':>14s} {'front_3d':>9s} {'worst_case_s':>13s}")
+    for n in args.sizes:
+        df = random_summary(n, rng)
+        t0 = time.perf_counter()
+        front, _ = front_table(df)
+        t_front = time.perf_counter() - t0
+        worst = random_summary(n, rng, on_front=True)
+        t0 = time.perf_counter()
+        assert pareto_mask(worst).all()
+        t_worst = time.perf_counter() - t0
+        print(f"{n:8d} {t_front:14.3f} {int(front['front_3d'].sum()):9d} {t_worst:13.3f}")
+
+if __name__ == '__main__':
+    main()
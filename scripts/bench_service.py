@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Latency of a running allocation service (scripts/serve_allocator.py) for single-donor offers.
+
+Each client thread keeps one HTTP connection open and sends --requests
+offers of a random donor; with --clients > 1 the requests queue up and the
+service applies them in batches. Prints client-side round-trip and
+server-side batch time percentiles, then resets the scenario.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import numpy as np
+
+ABO_MIX = ['O', 'A', 'B', 'AB']
+
+def post(conn, path, payload):
+    body = json.dumps(payload)
+    conn.request('POST', path, body, {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+def client(args, seed, out):
+    rng = np.random.default_rng(seed)
+    conn = http.client.HTTPConnection(args.host, args.port)
+    kdpi, abo = rng.uniform(0, 100, args.requests), rng.choice(ABO_MIX, args.requests, p=[0.45, 0.4, 0.11, 0.04])
+    rtt, server = [], []
+    for k in range(args.requests):
+        t0 = time.perf_counter()
+        status, r = post(conn, '/offer', {'donor': {'KDPI': float(kdpi[k]), 'DonorBloodType': str(abo[k])},
+                                          'policy': args.policy, 'alpha': args.alpha, 'fairness_eta': args.eta,
+                                          'scenario': args.scenario, 'commit': not args.dry_run})
+        rtt.append(time.perf_counter() - t0)
+        server.append(r['batch_us'] / r['batch_size'])
+        if status != 200:
+            raise SystemExit(f"offer failed: {r}")
+    out.append((rtt, server))
+    conn.close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', type=str, default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--requests', type=int, default=2000, help='offers per client')
+    ap.add_argument('--clients', type=int, default=1)
+    ap.add_argument('--policy', type=str, default='hybrid')
+    ap.add_argument('--alpha', type=float, default=0.5)
+    ap.add_argument('--eta', type=float, default=0.0)
+    ap.add_argument('--scenario', type=str, default='bench')
+    ap.add_argument('--dry_run', action='store_true', help='offers with commit=false (state left unchanged)')
+    args = ap.parse_args()
+
+    out = []
+    threads = [threading.Thread(target=client, args=(args, s, out)) for s in range(args.clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    rtt = np.concatenate([np.array(r) for r, _ in out]) * 1e6
+    server = np.concatenate([np.array(s) for _, s in out])
+    print(f"{len(rtt)} offers from {args.clients} client(s) in {wall:.2f}s ({len(rtt) / wall:.0f}/s)")
+    print(f"round trip us  p50 {np.percentile(rtt, 50):7.1f}  p90 {np.percentile(rtt, 90):7.1f}  "
+          f"p99 {np.percentile(rtt, 99):7.1f}")
+    print(f"server us/offer p50 {np.percentile(server, 50):6.1f}  p90 {np.percentile(server, 90):7.1f}  "
+          f"p99 {np.percentile(server, 99):7.1f}")
+    conn = http.client.HTTPConnection(args.host, args.port)
+    post(conn, '/reset', {'scenario': args.scenario})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the allocation hot paths on synthetic cohorts.
+
+`run` times compute_patient_features, build_sorted_lists, allocate (urgency,
+utility, hybrid, hybrid+fair) and sweep over a grid of cohort sizes, n_bins
+values and fairness-group counts. Each case records its best wall time over
+--repeat runs, peak traced memory (tracemalloc, separate untimed run) and, for
+allocations, per-donor latency percentiles. The run is appended as one JSON
+line to the history file. `compare` diffs two runs from the history and exits
+non-zero if any case got slower or bigger by more than the threshold.
+
+Cohorts are generated in-process, so no data files are needed:
+
+    python scripts/benchmark_suite.py run --sizes 20000x3000 150000x20000
+    python scripts/benchmark_suite.py compare            # last two runs
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from cohort_sim import generate_donors, generate_patients
+from policy_baselines import (StreamingAllocator, allocate, build_sorted_lists, compute_patient_features,
+                              donor_arrays, patient_arrays, sweep)
+
+ALLOCATE_CONFIGS = [
+    ('urgency', 1.0, 0.0),
+    ('utility', 0.0, 0.0),
+    ('hybrid', 0.5, 0.0),
+    ('hybrid+fair', 0.5, 1.0),
+]
+
+def synthetic_cohort(n_patients, n_donors, n_groups=5, seed=0):
+    """cohort_sim patients and donors plus a BenchGroup column with n_groups levels."""
+    patients, donors = generate_patients(n_patients, seed), generate_donors(n_donors, seed)
+    patients['BenchGroup'] = np.random.default_rng(seed).integers(0, n_groups, n_patients)
+    return patients, donors
+
+def measure(fn, repeat):
+    """(best wall seconds over repeat calls, peak traced MB of one more call)."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024**2
+
+def donor_latencies(pat, don, policy, alpha, eta, n_bins):
+    """Per-donor offer_chunk latency in microseconds over a fresh allocator."""
+    allocator = StreamingAllocator(pat, policy, alpha, eta, n_bins)
+    chunks = [{k: v[d:d + 1] for k, v in don.items()} for d in range(len(don['KDPI']))]
+    out = np.empty(len(chunks))
+    for d, chunk in enumerate(chunks):
+        t0 = time.perf_counter()
+        allocator.offer_chunk(chunk)
+        out[d] = time.perf_counter() - t0
+    return out * 1e6
+
+def cases(args):
+    """Yield (name, params, fn, latency_fn or None) for the whole grid."""
+    for size in args.sizes:
+        n_pat, n_don = (int(v) for v in size.lower().split('x'))
+        patients, donors = synthetic_cohort(n_pat, n_don, seed=args.seed)
+        base = {'n_patients': n_pat, 'n_donors': n_don}
+        yield f'features/{size}', base, lambda p=patients: compute_patient_features(p), None
+
+        feat = compute_patient_features(patients)
+        for nb in args.n_bins:
+            yield (f'sorted_lists/{size}/bins{nb}', {**base, 'n_bins': nb},
+                   lambda nb=nb: build_sorted_lists(feat, 'hybrid', 0.5, nb), None)
+
+        don = donor_arrays(donors)
+        for G in args.groups:
+            feat['BenchGroup'] = np.random.default_rng(args.seed).integers(0, G, n_pat)
+            pat = patient_arrays(feat, 'BenchGroup')
+            for label, a, e in ALLOCATE_CONFIGS:
+                if e == 0 and G != args.groups[0]:
+                    continue    # group count only matters under the fairness constraint
+                policy = label.split('+')[0]
+                for nb in args.n_bins:
+                    params = {**base, 'policy': label, 'alpha': a, 'fairness_eta': e, 'n_bins': nb, 'n_groups': G}
+                    yield (f'allocate/{size}/{label}/bins{nb}' + (f'/groups{G}' if e > 0 else ''), params,
+                           lambda f=feat.copy(), p=policy, a=a, e=e, nb=nb:
+                           allocate(donors, f, p, alpha=a, fairness_eta=e, n_bins=nb, group_col='BenchGroup'),
+                           lambda p=policy, a=a, e=e, nb=nb, pat=pat: donor_latencies(pat, don, p, a, e, nb))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            patients.to_csv(os.path.join(tmp, 'patients.csv'), index=False)
+            donors.to_csv(os.path.join(tmp, 'donors.csv'), index=False)
+            yield (f'sweep/{size}', {**base, 'alphas': [0.25, 0.5, 0.75], 'etas': [0.0, 1.0]},
+                   lambda: sweep(os.path.join(tmp, 'patients.csv'), os.path.join(tmp, 'donors.csv'),
+                                 [0.25, 0.5, 0.75], [0.0, 1.0], sample_patients=n_pat, sample_donors=n_don,
+                                 seed=args.seed, group_col='BenchGroup'), None)
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+def run(args):
+    results = []
+    for name, params, fn, latency_fn in cases(args):
+        wall, peak = measure(fn, args.repeat)
+        entry = {'name': name, 'params': params, 'wall_s': wall, 'peak_mb': peak}
+        if latency_fn is not None:
+            lat = latency_fn()
+            entry.update({f'p{q}_us': float(np.percentile(lat, q)) for q in (50, 90, 99)})
+            entry['max_us'] = float(lat.max())
+        results.append(entry)
+        lat_txt = f"  p50 {entry['p50_us']:7.1f}us  p99 {entry['p99_us']:8.1f}us" if latency_fn else ''
+        print(f"{name:48s} {wall:8.3f}s {peak:8.1f}MB{lat_txt}", flush=True)
+    record = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'label': args.label, 'repeat': args.repeat,
+              'env': environment(), 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    print(f"appended run {record['timestamp']} ({len(results)} cases) to {args.history}")
+
+def load_history(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def pick(history, ref):
+    """A run by position (-1 = latest), timestamp or label."""
+    try:
+        return history[int(ref)]
+    except ValueError:
+        matches = [r for r in history if ref in (r['timestamp'], r.get('label'))]
+        if not matches:
+            raise SystemExit(f"no run matching {ref!r}")
+        return matches[-1]
+
+def compare(args):
+    history = load_history(args.history)
+    if len(history) < 2 and (args.base is None or args.new is None):
+        raise SystemExit("need at least two runs in the history to compare")
+    base, new = pick(history, args.base or '-2'), pick(history, args.new or '-1')
+    base_by_name = {r['name']: r for r in base['results']}
+    metrics = ['wall_s', 'peak_mb', 'p50_us', 'p99_us']
+    rows, regressions = [], 0
+    for r in new['results']:
+        b = base_by_name.get(r['name'])
+        if b is None:
+            continue
+        row = {'case': r['name']}
+        flags = []
+        for m in metrics:
+            if m in r and m in b and b[m] > 0:
+                ratio = r[m] / b[m]
+                row[m] = ratio
+                # latency tails are noisy on small cases; p99 uses twice the threshold
+                limit = 1.0 + args.threshold * (2 if m == 'p99_us' else 1)
+                if ratio > limit and r[m] - b[m] > args.min_abs.get(m, 0.0):
+                    flags.append(m)
+        row['regressed'] = ','.join(flags)
+        regressions += bool(flags)
+        rows.append(row)
+    print(f"base: {base['timestamp']} {base.get('label') or ''} ({base['env'].get('commit')})")
+    print(f"new:  {new['timestamp']} {new.get('label') or ''} ({new['env'].get('commit')})")
+    if not rows:
+        raise SystemExit("the two runs have no cases in common")
+    table = pd.DataFrame(rows, columns=['case'] + metrics + ['regressed']).set_index('case')
+    print(table.to_string(float_format='{:.3f}x'.format, na_rep='-'))
+    if regressions:
+        print(f"{regressions} case(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("no regressions")
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='command', required=True)
+    r = sub.add_parser('run', help='run the grid and append it to the history')
+    r.add_argument('--sizes', nargs='+', default=['20000x3000', '150000x20000'],
+                   help='cohort sizes as PATIENTSxDONORS')
+    r.add_argument('--n_bins', type=int, nargs='+', default=[5, 10, 20])
+    r.add_argument('--groups', type=int, nargs='+', default=[5, 50],
+                   help='fairness group cardinalities for the hybrid+fair cases')
+    r.add_argument('--repeat', type=int, default=3)
+    r.add_argument('--seed', type=int, default=0)
+    r.add_argument('--label', type=str, default=None, help='free-form tag stored with the run')
+    r.add_argument('--history', type=str, default='data/bench_history.jsonl')
+    c = sub.add_parser('compare', help='compare two runs from the history')
+    c.add_argument('base', nargs='?', default=None, help='run index, timestamp or label (default: second to last)')
+    c.add_argument('new', nargs='?', default=None, help='run index, timestamp or label (default: last)')
+    c.add_argument('--threshold', type=float, default=0.10, help='relative slowdown/growth that counts as a regression')
+    c.add_argument('--history', type=str, default='data/bench_history.jsonl')
+    args = ap.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        # absolute floors so sub-millisecond jitter is not reported
+        args.min_abs = {'wall_s': 0.005, 'peak_mb': 1.0, 'p50_us': 2.0, 'p99_us': 10.0}
+        compare(args)
+
+if __name__ == '__main__':
+    main()
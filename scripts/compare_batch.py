@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Optimality gap of greedy allocation against batched window assignment (allocate_batch).
+
+Runs allocate() (and, with --group_slack, allocate() with fairness_eta=1 as
+the fair greedy reference) and allocate_batch() for every --windows x --top_k
+pair, and prints benefit, urgency, fairness L1 and the total policy score of
+each, with the gain over greedy; window_gain compares every window with the
+greedy assignment of the same window from the same state.
+
+    python scripts/compare_batch.py --patients data/patients.csv --donors data/donors.csv --windows 64 256 1024
+"""
+import argparse
+import resource
+import time
+import pandas as pd
+from cohort_io import read_cohort
+from policy_baselines import allocate, allocate_batch, compute_patient_features
+
+def policy_score(alloc_df, policy, alpha):
+    if policy == 'urgency':
+        return float(alloc_df['urgency_norm'].sum())
+    if policy == 'hybrid':
+        return float((alpha * alloc_df['urgency_norm'] + (1.0 - alpha) * alloc_df['utility_years'] / 12.0).sum())
+    return float(alloc_df['utility_years'].sum())
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--patients', required=True, help='CSV file or columnar cohort directory')
+    ap.add_argument('--donors', required=True, help='CSV file or columnar cohort directory')
+    ap.add_argument('--sample_patients', type=int, default=None, help='default: the whole cohort')
+    ap.add_argument('--sample_donors', type=int, default=None, help='default: the whole cohort')
+    ap.add_argument('--policy', type=str, default='hybrid', choices=['urgency', 'utility', 'hybrid'])
+    ap.add_argument('--alpha', type=float, default=0.5)
+    ap.add_argument('--group_col', type=str, default='Ethnicity')
+    ap.add_argument('--windows', type=int, nargs='+', default=[64, 256, 1024])
+    ap.add_argument('--top_k', type=int, nargs='+', default=[16])
+    ap.add_argument('--group_slack', type=float, default=None, help='cap group shares at (1 + slack) x waitlist share')
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    patients, donors = read_cohort(args.patients), read_cohort(args.donors)
+    if args.sample_patients is not None:
+        patients = patients.sample(n=args.sample_patients, random_state=args.seed).reset_index(drop=True)
+    if args.sample_donors is not None:
+        donors = donors.sample(n=args.sample_donors, random_state=args.seed).reset_index(drop=True)
+    feat = compute_patient_features(patients)
+
+    rows = []
+    def record(name, run):
+        t0 = time.perf_counter()
+        alloc_df, metrics = run()
+        rows.append({'config': name, 'seconds': time.perf_counter() - t0, 'n_assigned': len(alloc_df),
+                     'total_benefit_years': metrics['total_benefit_years'],
+                     'mean_urgency_norm': metrics['mean_urgency_norm'], 'fairness_L1': metrics['fairness_L1'],
+                     'policy_score': policy_score(alloc_df, args.policy, args.alpha),
+                     'window_gain': metrics.get('window_gain'), 'mean_candidates': metrics.get('mean_candidates')})
+
+    record('greedy', lambda: allocate(donors, feat, args.policy, args.alpha, group_col=args.group_col))
+    if args.group_slack is not None:
+        record('greedy eta=1', lambda: allocate(donors, feat, args.policy, args.alpha, 1.0, group_col=args.group_col))
+    for window in args.windows:
+        for top_k in args.top_k:
+            record(f'batch w={window} k={top_k}',
+                   lambda: allocate_batch(donors, feat, args.policy, args.alpha, group_col=args.group_col,
+                                          window=window, top_k=top_k, group_slack=args.group_slack))
+
+    table = pd.DataFrame(rows).set_index('config')
+    base = table.loc['greedy']
+    table['benefit_gain'] = table['total_benefit_years'] / base['total_benefit_years'] - 1.0
+    table['score_gain'] = table['policy_score'] / base['policy_score'] - 1.0
+    print(f"{len(patients)} patients, {len(donors)} donors, {args.policy} alpha={args.alpha} "
+          f"group_slack={args.group_slack}")
+    print(table.to_string(float_format='{:.6g}'.format))
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+if __name__ == '__main__':
+    main()
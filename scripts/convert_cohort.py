@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+"""
+Convert cohort CSVs to the columnar binary format read by run_sweep.py.
+
+Example:
+  python scripts/convert_cohort.py --csv data/patients.csv --out data/patients.cohort
+"""
+import argparse
+from cohort_io import convert_csv
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--csv', required=True, nargs='+', help='one or more CSV files')
+    ap.add_argument('--out', nargs='+', help='output directories (default: <csv stem>.cohort)')
+    args = ap.parse_args()
+    outs = args.out or [c[:-4] + '.cohort' if c.endswith('.csv') else c + '.cohort' for c in args.csv]
+    if len(outs) != len(args.csv):
+        ap.error('--out needs one directory per --csv file')
+    for csv_path, out_dir in zip(args.csv, outs):
+        meta = convert_csv(csv_path, out_dir)
+        kinds = ', '.join(f"{c['name']}:{'cat' if c['kind'] == 'category' else c['dtype']}" for c in meta['columns'])
+        print(f"{csv_path} -> {out_dir} ({meta['n_rows']} rows; {kinds})")
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 Generate plots for the kidney allocation paper.
 """
 import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
@@ -10,10 +11,77 @@ import matplotlib.lines as mlines
 import matplotlib.patches as mpatches
 
 
+def ci_errors(df, metric):
+    """Asymmetric error bars from the bootstrap CI columns of a replicate summary, else None."""
+    lo, hi = metric + '_ci_low', metric + '_ci_high'
+    if lo not in df.columns or hi not in df.columns:
+        return None
+    return np.vstack([df[metric] - df[lo], df[hi] - df[metric]])
+
+def draw_error_bars(df, x_metric, y_metric):
+    xerr, yerr = ci_errors(df, x_metric), ci_errors(df, y_metric)
+    if xerr is not None or yerr is not None:
+        plt.errorbar(df[x_metric], df[y_metric], xerr=xerr, yerr=yerr, fmt='none',
+                     ecolor='gray', elinewidth=1, capsize=3, alpha=0.7)
+
+def plot_alpha_path(path, outdir):
+    """Metrics vs alpha from run_sweep.py --alpha_path, plus the trade-off curves they trace.
+
+    Values are known only at the grid alphas (the allocation usually changes between
+    neighbouring grid points too), so they are drawn as markers joined by straight lines.
+    """
+    colors = {0.0: 'blue'}
+    metrics = [('total_benefit_years', 'Total Benefit (years)'), ('mean_urgency_norm', 'Mean Urgency (normalized)'),
+               ('fairness_L1', 'Fairness L1 Disparity')]
+    fig, axes = plt.subplots(1, 3, figsize=(16, 4.5))
+    for eta, g in path.groupby('fairness_eta'):
+        g = g.sort_values('alpha')
+        color = colors.get(eta, 'red')
+        for ax, (metric, ylabel) in zip(axes, metrics):
+            ax.plot(g['alpha'], g[metric], '.-', color=color, linewidth=1, markersize=3, label=f'η={eta:g}')
+            ax.set_xlabel('α (urgency weight)', fontsize=11)
+            ax.set_ylabel(ylabel, fontsize=11)
+            ax.grid(True, alpha=0.3)
+    axes[0].legend(loc='best')
+    fig.suptitle(f'Hybrid policy along α ({path["alpha"].nunique()} grid points)', fontsize=13, fontweight='bold')
+    plt.tight_layout()
+    outpath = os.path.join(outdir, 'alpha_path_metrics.png')
+    plt.savefig(outpath, dpi=300, bbox_inches='tight')
+    print(f"Saved {outpath}")
+    plt.close()
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5))
+    for eta, g in path.groupby('fairness_eta'):
+        g = g.sort_values('alpha')
+        color = colors.get(eta, 'red')
+        ax1.plot(g['mean_urgency_norm'], g['total_benefit_years'], '-', color=color, linewidth=1, label=f'η={eta:g}')
+        ax2.plot(g['fairness_L1'], g['total_benefit_years'], '-', color=color, linewidth=1, label=f'η={eta:g}')
+        for ax, x in [(ax1, 'mean_urgency_norm'), (ax2, 'fairness_L1')]:
+            ends = g.iloc[[0, -1]]
+            ax.scatter(ends[x], ends['total_benefit_years'], color=color, s=30, zorder=3)
+            for _, row in ends.iterrows():
+                ax.text(row[x], row['total_benefit_years'], f" α={row['alpha']:.2f}", fontsize=8)
+    ax1.set_xlabel('Mean Recipient Urgency (normalized)', fontsize=12)
+    ax2.set_xlabel('Allocation Disparity L1 (lower is fairer)', fontsize=12)
+    for ax in (ax1, ax2):
+        ax.set_ylabel('Total Survival Benefit (years)', fontsize=12)
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best')
+    ax1.set_title('Urgency vs Benefit along α', fontsize=13, fontweight='bold')
+    ax2.set_title('Fairness vs Benefit along α', fontsize=13, fontweight='bold')
+    plt.tight_layout()
+    outpath = os.path.join(outdir, 'tradeoff_alpha_path.png')
+    plt.savefig(outpath, dpi=300, bbox_inches='tight')
+    print(f"Saved {outpath}")
+    plt.close()
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--summary', type=str, default='data/summary.csv')
     ap.add_argument('--outdir', type=str, default='figures')
+    ap.add_argument('--path', type=str, default='data/alpha_path.csv',
+                    help='dense alpha path from run_sweep.py --alpha_path (plotted if present)')
     args = ap.parse_args()
     
     os.makedirs(args.outdir, exist_ok=True)
@@ -34,6 +102,7 @@ def main():
         plt.text(row['mean_urgency_norm'], row['total_benefit_years'], 
                 f" {row['policy']}\n α={row['alpha']:.2f}", 
                 fontsize=8, ha='left')
+    draw_error_bars(df, 'mean_urgency_norm', 'total_benefit_years')
     
     plt.xlabel('Mean Recipient Urgency (normalized)', fontsize=12)
     plt.ylabel('Total Survival Benefit (years)', fontsize=12)
@@ -71,6 +140,7 @@ def main():
         plt.text(row['fairness_L1'], row['total_benefit_years'], 
                 f" {row['policy']}\n α={row['alpha']:.2f}", 
                 fontsize=8, ha='left')
+    draw_error_bars(df, 'fairness_L1', 'total_benefit_years')
     
     plt.xlabel('Allocation Disparity L1 (lower is fairer)', fontsize=12)
     plt.ylabel('Total Survival Benefit (years)', fontsize=12)
@@ -122,7 +192,8 @@ def main():
         else:
             labels.append("")
     # Subplot 1: Total benefit
-    ax1.bar(x, df['total_benefit_years'], color=colors, alpha=0.7)
+    ax1.bar(x, df['total_benefit_years'], color=colors, alpha=0.7,
+            yerr=ci_errors(df, 'total_benefit_years'), capsize=3)
     ax1.set_xlabel('Configuration Index', fontsize=11)
     ax1.set_ylabel('Total Benefit (years)', fontsize=11)
     ax1.set_title('Total Survival Benefit by Configuration', fontsize=12, fontweight='bold')
@@ -134,7 +205,8 @@ def main():
             ax1.text(i, benefit + 300, label, ha='center', fontsize=9)
 
     # Subplot 2: Fairness L1
-    ax2.bar(x, df['fairness_L1'], color=colors, alpha=0.7)
+    ax2.bar(x, df['fairness_L1'], color=colors, alpha=0.7,
+            yerr=ci_errors(df, 'fairness_L1'), capsize=3)
     ax2.set_xlabel('Configuration Index', fontsize=11)
     ax2.set_ylabel('Fairness L1 Disparity', fontsize=11)
     ax2.set_title('Allocation Disparity by Configuration', fontsize=12, fontweight='bold')
@@ -159,6 +231,9 @@ def main():
     plt.savefig(outpath, dpi=300, bbox_inches='tight')
     plt.close()
 
+    if os.path.exists(args.path):
+        plot_alpha_path(pd.read_csv(args.path), args.outdir)
+
     print("\nSummary statistics:")
     print(df.to_string())
 
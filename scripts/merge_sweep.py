@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""
+Rebuild summary.csv from the checkpoint directory of a sharded sweep.
+
+    python scripts/run_sweep.py ... --shard 3/40 --checkpoint_dir /shared/ckpt   # on each worker
+    python scripts/merge_sweep.py --checkpoint_dir /shared/ckpt
+
+Exits non-zero and lists the missing configurations if the grid is
+incomplete, unless --partial is given.
+"""
+import argparse
+import sys
+from policy_baselines import merge_checkpoints
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--checkpoint_dir', type=str, default='data/checkpoints')
+    ap.add_argument('--summary', type=str, default='data/summary.csv')
+    ap.add_argument('--replicates_out', type=str, default='data/replicates.csv',
+                    help='per-seed rows, written when the grid has more than one seed')
+    ap.add_argument('--bootstrap', type=int, default=2000, help='bootstrap resamples for the replicate CIs')
+    ap.add_argument('--partial', action='store_true', help='write the summary even if configurations are missing')
+    args = ap.parse_args()
+
+    df, reps, missing = merge_checkpoints(args.checkpoint_dir, args.bootstrap)
+    print(f"{len(reps)} configurations checkpointed, {len(missing)} missing")
+    if missing:
+        print("missing: " + ", ".join(missing[:20]) + (f", ... ({len(missing) - 20} more)" if len(missing) > 20 else ""))
+        if not args.partial:
+            sys.exit(1)
+    if 'n_replicates' in df.columns:
+        reps.to_csv(args.replicates_out, index=False)
+        print(f"per-seed rows saved to: {args.replicates_out}")
+    df.to_csv(args.summary, index=False)
+    print(f"summary ({len(df)} rows) saved to: {args.summary}")
+
+if __name__ == '__main__':
+    main()
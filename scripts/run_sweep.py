@@ -1,25 +1,135 @@
 
-import argparse, pandas as pd, os
-from policy_baselines import sweep
+import argparse, json, pandas as pd, os
+from checkpoints import parse_shard
+from policy_baselines import adaptive_sweep, alpha_path, merge_checkpoints, replicate, sharded_sweep, sweep
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('--patients', required=True)
-    ap.add_argument('--donors', required=True)
+    ap.add_argument('--patients', required=True, help='CSV file or columnar cohort directory')
+    ap.add_argument('--donors', required=True, help='CSV file or columnar cohort directory')
     ap.add_argument('--sample_patients', type=int, default=20000)
     ap.add_argument('--sample_donors', type=int, default=3000)
     ap.add_argument('--alphas', type=float, nargs='+', default=[0.25,0.5,0.75])
     ap.add_argument('--etas', type=float, nargs='+', default=[0.0, 1.0])
-    ap.add_argument('--group_col', type=str, default='Ethnicity')
+    ap.add_argument('--group_col', type=str, default='Ethnicity',
+                    help="column (or intersection such as 'Ethnicity*Sex') that fairness_L1 and eta>0 balance")
+    ap.add_argument('--fairness_dims', type=str, nargs='+', default=None,
+                    help='balance these columns/intersections at once under eta>0 instead of group_col alone')
+    ap.add_argument('--fairness_weights', type=float, nargs='+', default=None,
+                    help='one weight per --fairness_dims entry (normalised; default equal)')
     ap.add_argument('--seed', type=int, default=42)
     ap.add_argument('--outdir', type=str, default='figures')
+    ap.add_argument('--index', type=str, default='binned', choices=['binned', 'envelope'],
+                    help='candidate index: KDPI-binned sorted lists or exact upper envelopes')
+    ap.add_argument('--cache_dir', type=str, default=None,
+                    help='reuse cached cohort features and sorted lists from this directory')
+    ap.add_argument('--replicates', type=int, default=1,
+                    help='number of cohort samples (seeds seed..seed+R-1); >1 adds std and bootstrap CI columns')
+    ap.add_argument('--bootstrap', type=int, default=2000, help='bootstrap resamples for the replicate CIs')
+    ap.add_argument('--workers', type=int, default=1, help='process-pool size for the configuration grid (or replicates)')
+    ap.add_argument('--alpha_path', type=int, default=0, metavar='N',
+                    help='also run the hybrid policy on N evenly spaced alphas in [0, 1] per eta '
+                         '(lockstep binned-index kernel) and write data/alpha_path.csv')
+    ap.add_argument('--store', type=str, default='',
+                    help="append each configuration's matches to this allocation store, e.g. data/allocations "
+                         "(single-sample sweep; off by default)")
+    ap.add_argument('--shard', type=str, default=None, metavar='i/N',
+                    help='run only the i-th of N contiguous slices (0-based) of the (policy, alpha, eta, seed) grid, '
+                         'checkpointing each configuration to --checkpoint_dir')
+    ap.add_argument('--checkpoint_dir', type=str, default=None,
+                    help='resumable sweep: one result file per finished configuration, completed ones are skipped '
+                         '(default data/checkpoints when --shard is given)')
+    ap.add_argument('--profile', action='store_true',
+                    help='collect hot-path counters and phase timers into data/profile.json (single-sample sweep)')
+    ap.add_argument('--adaptive', action='store_true',
+                    help='grow nested samples from --start_patients until each configuration converges (at most '
+                         '--max_patients, sample_donors/sample_patients donors per patient); writes data/convergence.csv')
+    ap.add_argument('--start_patients', type=int, default=2500)
+    ap.add_argument('--max_patients', type=int, default=None, help='default: the whole cohort')
+    ap.add_argument('--growth', type=float, default=2.0, help='sample size factor between adaptive steps')
+    ap.add_argument('--tol', type=float, default=0.01,
+                    help='converged when benefit per donor and mean recipient urgency change by less than this (relative)')
+    ap.add_argument('--l1_tol', type=float, default=0.002, help='... and fairness_L1 by less than this (absolute)')
+    ap.add_argument('--patience', type=int, default=1, help='consecutive steps within tolerance before stopping')
     args = ap.parse_args()
+    if args.alpha_path and args.fairness_dims and any(e > 0 for e in args.etas):
+        ap.error('--alpha_path balances --group_col only; it cannot be combined with --fairness_dims and eta > 0')
 
     os.makedirs(args.outdir, exist_ok=True)
-    df, allocs = sweep(args.patients, args.donors, args.alphas, args.etas,
-                       sample_patients=args.sample_patients, sample_donors=args.sample_donors,
-                       seed=args.seed, group_col=args.group_col)
+    if args.adaptive:
+        df, trace = adaptive_sweep(args.patients, args.donors, args.alphas, args.etas,
+                                   start_patients=args.start_patients, max_patients=args.max_patients,
+                                   donors_per_patient=args.sample_donors / args.sample_patients, growth=args.growth,
+                                   tol=args.tol, l1_tol=args.l1_tol, patience=args.patience, seed=args.seed,
+                                   group_col=args.group_col, n_workers=args.workers, index=args.index,
+                                   fairness_dims=args.fairness_dims, fairness_weights=args.fairness_weights)
+        trace.to_csv('data/convergence.csv', index=False)
+        df.to_csv('data/summary.csv', index=False)
+        print(f"{int(df['converged'].sum())}/{len(df)} configurations converged; kernel time "
+              f"{trace['kernel_seconds'].sum():.1f}s over {trace['sample_patients'].nunique()} sample sizes "
+              f"-> data/convergence.csv")
+        print(df)
+        return
+    if args.shard or args.checkpoint_dir:
+        checkpoint_dir = args.checkpoint_dir or 'data/checkpoints'
+        shard = parse_shard(args.shard or '0/1')
+        if args.profile or args.alpha_path:
+            print('--profile and --alpha_path are not checkpointed; ignored with --shard/--checkpoint_dir')
+        ran, skipped = sharded_sweep(args.patients, args.donors, args.alphas, args.etas, checkpoint_dir,
+                                     seeds=[args.seed + r for r in range(args.replicates)], shard=shard,
+                                     sample_patients=args.sample_patients, sample_donors=args.sample_donors,
+                                     group_col=args.group_col, n_workers=args.workers, index=args.index,
+                                     cache_dir=args.cache_dir, store=args.store or None,
+                                     fairness_dims=args.fairness_dims, fairness_weights=args.fairness_weights)
+        print(f"shard {shard[0]}/{shard[1]}: {ran} configurations run, {skipped} already checkpointed "
+              f"in {checkpoint_dir}")
+        df, reps, missing = merge_checkpoints(checkpoint_dir, args.bootstrap)
+        if missing:
+            print(f"{len(missing)} configurations of the grid are still missing; run "
+                  f"scripts/merge_sweep.py --checkpoint_dir {checkpoint_dir} once every shard has finished")
+            return
+        if args.replicates > 1:
+            reps.to_csv('data/replicates.csv', index=False)
+        df.to_csv('data/summary.csv', index=False)
+        print(df)
+        return
+    if args.replicates > 1:
+        if args.profile:
+            print('--profile applies to single-sample sweeps; ignored with --replicates')
+        df, reps = replicate(args.patients, args.donors, args.alphas, args.etas, n_replicates=args.replicates,
+                             sample_patients=args.sample_patients, sample_donors=args.sample_donors,
+                             seed=args.seed, group_col=args.group_col, n_workers=args.workers, index=args.index,
+                             n_boot=args.bootstrap, fairness_dims=args.fairness_dims,
+                             fairness_weights=args.fairness_weights)
+        reps.to_csv('data/replicates.csv', index=False)
+    else:
+        stats = {} if args.profile else None
+        df, allocs = sweep(args.patients, args.donors, args.alphas, args.etas,
+                           sample_patients=args.sample_patients, sample_donors=args.sample_donors,
+                           seed=args.seed, group_col=args.group_col, n_workers=args.workers, index=args.index,
+                           cache_dir=args.cache_dir, stats=stats, store=args.store or None,
+                           fairness_dims=args.fairness_dims, fairness_weights=args.fairness_weights)
+        if args.store:
+            print(f"allocations for {len(allocs)} configurations -> {args.store}")
+        if stats is not None:
+            with open('data/profile.json', 'w') as f:
+                json.dump(stats, f, indent=1)
+            print(pd.DataFrame([{'policy': c['policy'], 'alpha': c['alpha'], 'fairness_eta': c['fairness_eta'],
+                                 **c['timers'], 'head_steps': c['head_steps_total'],
+                                 'restricted_offers': c['restricted_offers'], 'restricted_steps': c['restricted_steps'],
+                                 'utility_evals': c['utility_evals'], 'misses': sum(c['misses'].values())}
+                                for c in stats['configs']]).to_string(index=False, float_format='{:.4f}'.format))
+            print('phases:', {k: round(v, 3) for k, v in stats['phases'].items()}, '-> data/profile.json')
     df.to_csv('data/summary.csv', index=False)
+    if args.alpha_path:
+        path = alpha_path(args.patients, args.donors, n_alphas=args.alpha_path, etas=args.etas,
+                          sample_patients=args.sample_patients, sample_donors=args.sample_donors,
+                          seed=args.seed, group_col=args.group_col, cache_dir=args.cache_dir,
+                          fairness_dims=args.fairness_dims, fairness_weights=args.fairness_weights)
+        path.to_csv('data/alpha_path.csv', index=False)
+        changed = path.groupby('fairness_eta')['alloc_changed'].sum()
+        print(f"alpha path: {args.alpha_path} alphas -> data/alpha_path.csv; allocation changes between "
+              f"consecutive alphas per eta: {changed.to_dict()}")
     # Minimal example figures left to the notebook or your plotting code
     print(df)
 
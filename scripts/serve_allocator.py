@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Run the resident allocation service (see alloc_service) on one patient cohort.
+
+    python scripts/serve_allocator.py --patients data/patients.csv --warm hybrid:0.5:0 hybrid:0.5:1
+    curl -s localhost:8765/offer -d '{"donor": {"KDPI": 35, "DonorBloodType": "O"}, "alpha": 0.5, "commit": false}'
+"""
+import argparse
+import asyncio
+import time
+from alloc_service import AllocationService, serve
+from cohort_io import read_cohort
+from policy_baselines import cohort_arrays
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--patients', required=True, help='CSV file or columnar cohort directory')
+    ap.add_argument('--sample_patients', type=int, default=0, help='sample this many patients (0 = whole waitlist)')
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--group_col', type=str, default='Ethnicity')
+    ap.add_argument('--fairness_dims', type=str, nargs='+', default=None)
+    ap.add_argument('--fairness_weights', type=float, nargs='+', default=None)
+    ap.add_argument('--n_bins', type=int, default=10)
+    ap.add_argument('--index', type=str, default='binned', choices=['binned', 'envelope'])
+    ap.add_argument('--warm', type=str, nargs='*', default=['hybrid:0.5:0'], metavar='POLICY:ALPHA:ETA',
+                    help='allocators to build at startup in the default scenario (others are built on first use)')
+    ap.add_argument('--host', type=str, default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--socket', type=str, default=None, help='listen on this Unix socket instead of TCP')
+    ap.add_argument('--max_batch', type=int, default=256, help='most queued requests applied in one batch')
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    patients = read_cohort(args.patients)
+    if args.sample_patients:
+        patients = patients.sample(n=args.sample_patients, random_state=args.seed).reset_index(drop=True)
+    pat = cohort_arrays(patients, args.group_col, args.fairness_dims, args.fairness_weights)
+    service = AllocationService(pat, args.n_bins, args.index, args.group_col)
+    for spec in args.warm:
+        policy, alpha, eta = spec.split(':')
+        service.allocator('default', policy, float(alpha), float(eta))
+    where = args.socket or f'http://{args.host}:{args.port}'
+    print(f"{len(patients)} patients, {len(service.allocators)} warm allocators in "
+          f"{time.perf_counter() - t0:.1f}s; serving on {where}", flush=True)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.socket, args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""
+Generate synthetic patient and donor cohorts (see cohort_sim) straight to disk.
+
+Rows are produced and written chunk by chunk, so memory stays bounded by
+--chunk_size whatever the cohort size. Output depends only on --seed.
+
+Example:
+  python scripts/simulate_cohort.py --patients 150000 --donors 20000 --out data
+  python scripts/simulate_cohort.py --patients 10000000 --donors 1000000 --out data/stress --format columnar
+"""
+import argparse
+import os
+import time
+from cohort_sim import write_cohort
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--patients', type=int, default=150000)
+    ap.add_argument('--donors', type=int, default=20000)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--out', type=str, default='data', help='output directory')
+    ap.add_argument('--format', choices=['csv', 'columnar'], default='csv',
+                    help='patients.csv/donors.csv, or patients.cohort/donors.cohort directories')
+    ap.add_argument('--chunk_size', type=int, default=1_000_000, help='rows generated and written at a time')
+    args = ap.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    ext = '.csv' if args.format == 'csv' else '.cohort'
+    for kind, n in [('patients', args.patients), ('donors', args.donors)]:
+        path = os.path.join(args.out, kind + ext)
+        t0 = time.perf_counter()
+        write_cohort(path, kind, n, seed=args.seed, chunk_size=args.chunk_size, fmt=args.format)
+        elapsed = time.perf_counter() - t0
+        print(f"{kind}: {n} rows -> {path} in {elapsed:.2f}s ({elapsed / max(n, 1) * 1e6:.2f}s per million)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Discrete-event waitlist simulation: listings, dialysis accrual, illness and removal interleaved with donors.
+
+allocate() treats the waitlist as fixed. simulate_waitlist() runs a clock over
+a time-ordered event heap instead. The initial cohort is listed at t=0 and
+new patients arrive as a Poisson process. Everyone on the list accrues
+dialysis time and age, may develop diabetes (illness) and leaves at a
+removal (death or delisting) hazard. Donors arrive as their own Poisson
+process and are allocated as in allocate(): the best of the heads of the
+compatible (ABO, KDPI bin) indexes, rescored exactly at the donor's KDPI
+and the current time.
+
+The per-(ABO, bin) indexes (WaitlistIndex) are sorted lists walked by a head,
+as in the greedy kernel, plus a heap for entries made since they were built:
+a listing or key change costs O(n_bins log n), a removal O(1) (lazy
+deletion), and no list is re-sorted per event. Keys use the sorted lists'
+bin-mid formula (list_keys), with urgency and utility scaled by the initial
+cohort's bounds so they stay comparable as time passes. Dialysis accrual
+moves every waiting patient's key at once, so the lists are rebuilt from
+fresh keys every refresh_days: the order inside an index lags accrual by at
+most that interval, while the head comparison is exact at every donor.
+With no arrivals, removals or illness and every donor at t=0 the simulation
+reproduces allocate() exactly.
+"""
+import heapq
+import numpy as np
+import pandas as pd
+from cohort_sim import generate_donors, generate_patients
+from policy_baselines import (ABO_CODE, ABO_RECIPIENTS, ABO_TYPES, donor_bins, exact_utility, feature_arrays,
+                              list_keys)
+
+# event kinds; ties in time are processed in the order events were scheduled
+LISTING, DONOR, ILLNESS, REMOVAL, REFRESH = range(5)
+_RECIPIENTS = [[ABO_CODE[r] for r in ABO_RECIPIENTS[abo]] for abo in ABO_TYPES] + [[]]
+PATIENT_COLUMNS = ['Age', 'DialysisYears', 'Diabetes', 'EPTSScore', 'BloodType']
+
+def _codes(labels):
+    return np.array([ABO_CODE.get(str(v), -1) for v in labels], dtype=np.int64)
+
+
+class WaitlistDynamics:
+    """Yearly rates of the simulated waitlist.
+
+    Removal (death or delisting) hazard per year is
+    removal_rate * exp(removal_age * (Age80 - 0.75) + removal_diabetes * Diabetes),
+    fixed at listing and redrawn at illness. Illness is diabetes onset, at illness_rate
+    per year for patients listed without it.
+    """
+    def __init__(self, arrivals_per_year=30000, donors_per_year=20000, removal_rate=0.06, removal_age=1.5,
+                 removal_diabetes=0.5, illness_rate=0.04):
+        self.arrivals_per_year, self.donors_per_year = arrivals_per_year, donors_per_year
+        self.removal_rate, self.removal_age, self.removal_diabetes = removal_rate, removal_age, removal_diabetes
+        self.illness_rate = illness_rate
+
+    def removal_hazard(self, age80, diabetes):
+        return self.removal_rate * np.exp(self.removal_age * (age80 - 0.75) + self.removal_diabetes * diabetes)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class WaitlistIndex:
+    """Waiting patients per (ABO code, bin): a sorted base list and a heap of later entries.
+
+    rebuild() sorts every waiting patient into the base lists, which are walked with a head
+    like the greedy kernel's lists. Entries pushed since (listings, key updates) go to a
+    per-list heap of (-key, patient, stamp), so insert and update cost O(log n) and nothing
+    is re-sorted between rebuilds. A patient's stamp is bumped when it leaves the list or its
+    keys change, which invalidates its older entries in both; top() skips invalid entries as
+    it meets them, and a heap holding more than twice its live entries is compacted.
+    Ties go to the lowest patient index, as in the stable sort of the sorted lists.
+    """
+    def __init__(self, n_patients, n_bins):
+        self.n_bins = n_bins
+        self.lists = [[[] for _ in range(n_bins)] for _ in ABO_TYPES]
+        self.neg_keys = [[[] for _ in range(n_bins)] for _ in ABO_TYPES]
+        self.heads = [[0] * n_bins for _ in ABO_TYPES]
+        self.heaps = [[[] for _ in range(n_bins)] for _ in ABO_TYPES]
+        self.stamp = [0] * n_patients
+        self.base_stamp = list(self.stamp)
+        self.live = [0] * len(ABO_TYPES)
+
+    def rebuild(self, ids, abo, keys):
+        """Make patients ids (ascending; ABO codes abo, keys (n_bins, len(ids))) the whole index."""
+        self.base_stamp = list(self.stamp)
+        for c in range(len(ABO_TYPES)):
+            sel = np.nonzero(abo == c)[0]
+            ids_c = ids[sel]
+            self.live[c] = len(ids_c)
+            for b in range(self.n_bins):
+                neg = -keys[b, sel]
+                order = np.argsort(neg, kind='stable')
+                self.lists[c][b], self.neg_keys[c][b] = ids_c[order].tolist(), neg[order].tolist()
+                self.heads[c][b] = 0
+                self.heaps[c][b] = []
+
+    def insert(self, i, abo, keys):
+        self.live[abo] += 1
+        self._push(i, abo, keys)
+
+    def update(self, i, abo, keys):
+        self.stamp[i] += 1
+        self._push(i, abo, keys)
+
+    def remove(self, i, abo):
+        self.stamp[i] += 1
+        self.live[abo] -= 1
+
+    def _push(self, i, abo, keys):
+        s = self.stamp[i]
+        for h, k in zip(self.heaps[abo], keys):
+            heapq.heappush(h, (-k, i, s))
+            if len(h) > 2 * self.live[abo] + 64:
+                h[:] = [e for e in h if self.stamp[e[1]] == e[2]]
+                heapq.heapify(h)
+
+    def top(self, abo, b):
+        """Best waiting patient of list (abo, b), or -1 if it is empty."""
+        stamp, base = self.stamp, self.base_stamp
+        lst, h = self.lists[abo][b], self.heaps[abo][b]
+        j = self.heads[abo][b]
+        while j < len(lst) and stamp[lst[j]] != base[lst[j]]:
+            j += 1
+        self.heads[abo][b] = j
+        while h and stamp[h[0][1]] != h[0][2]:
+            heapq.heappop(h)
+        if j == len(lst):
+            return h[0][1] if h else -1
+        if h and (h[0][0], h[0][1]) < (self.neg_keys[abo][b][j], lst[j]):
+            return h[0][1]
+        return lst[j]
+
+
+def _poisson_times(rng, rate, years):
+    return np.sort(rng.uniform(0.0, years, rng.poisson(rate * years))) if rate > 0 else np.empty(0)
+
+def simulate_waitlist(patients: pd.DataFrame, years: float = 5.0, policy: str = 'hybrid', alpha: float = 0.5, n_bins: int = 10, group_col: str = 'Ethnicity', dynamics: WaitlistDynamics = None, donors: pd.DataFrame = None, refresh_days: float = 30.0, seed: int = 0):
+    """Simulate years of waitlist events and greedy allocation; returns (matches, metrics, timeline).
+
+    patients is the raw cohort listed at t=0 (Age, DialysisYears, Diabetes, EPTSScore,
+    BloodType, group_col). Arriving patients and, unless donors is given, donors are drawn
+    from cohort_sim. donors may carry an ArrivalYears column (default: spread uniformly over
+    the horizon in their order). Every listed patient is assumed to be on dialysis.
+    matches has one row per transplant, timeline the waitlist counts at each key refresh.
+    """
+    dyn = WaitlistDynamics() if dynamics is None else dynamics
+    rng = np.random.default_rng(seed)
+    arrive = _poisson_times(rng, dyn.arrivals_per_year, years)
+    cohort = patients[PATIENT_COLUMNS + ([group_col] if group_col in patients else [])]
+    if len(arrive):
+        cohort = pd.concat([cohort, generate_patients(len(arrive), seed + 1)[cohort.columns]], ignore_index=True)
+    n0, n = len(patients), len(cohort)
+    listed = np.concatenate([np.zeros(n0), arrive])
+    epts, age0 = cohort['EPTSScore'].to_numpy(dtype=float), cohort['Age'].to_numpy(dtype=float)
+    dial0, diab = cohort['DialysisYears'].to_numpy(dtype=float), cohort['Diabetes'].to_numpy(dtype=float)
+    abo = _codes(cohort['BloodType'])
+    groups = cohort[group_col].astype(str).to_numpy() if group_col in cohort else np.full(n, 'All')
+
+    if donors is None:
+        donor_t = _poisson_times(rng, dyn.donors_per_year, years)
+        donors = generate_donors(len(donor_t), seed + 2)
+    else:
+        donor_t = (donors['ArrivalYears'].to_numpy(dtype=float) if 'ArrivalYears' in donors
+                   else np.linspace(0.0, years, len(donors), endpoint=False))
+    kdpi = pd.to_numeric(donors['KDPI'], errors='coerce').to_numpy(dtype=float)
+    donor_abo, donor_bin = _codes(donors['DonorBloodType']), donor_bins(kdpi, n_bins)
+
+    # urgency and utility scales come from the initial list (the arrivals at listing if it starts
+    # empty, (0, 1) if there is no one at all) and then stay fixed
+    ref = np.arange(n0 if n0 else n)
+    if len(ref):
+        f0 = feature_arrays(epts[ref], age0[ref], dial0[ref], diab[ref])
+        umin, umax = f0['Urgency_raw'].min(), f0['Urgency_raw'].max()
+        bounds = [list_keys(f0['Urgency_raw'], f0['A_part'], f0['B_part'], policy, alpha, b, n_bins)[1]
+                  for b in range(n_bins)]
+    else:
+        umin, umax, bounds = 0.0, 1.0, [(0.0, 1.0)] * n_bins
+    bins, kbounds = np.arange(n_bins)[:, None], tuple(np.array(v)[:, None] for v in zip(*bounds))
+
+    def features(ids, t):
+        elapsed = t - listed[ids]
+        f = feature_arrays(epts[ids], age0[ids] + elapsed, dial0[ids] + elapsed, diab[ids])
+        f['Urgency_norm'] = (f['Urgency_raw'] - umin) / (umax - umin + 1e-9)
+        return f
+
+    def keys(ids, t):
+        f = features(ids, t)
+        key, _ = list_keys(f['Urgency_norm'][None, :], f['A_part'][None, :], f['B_part'][None, :], policy, alpha,
+                           bins, n_bins, kbounds)
+        return np.broadcast_to(key, (n_bins, len(ids)))
+
+    status = np.zeros(n, dtype=np.int8)          # 0 not listed yet, 1 waiting, 2 transplanted, 3 removed
+    # removal and illness times depend only on listing-time features, so they are drawn up front
+    hazard = dyn.removal_hazard(np.minimum(age0, 80.0) / 80.0, diab)
+    removal_at = (listed + rng.exponential(1.0 / np.maximum(hazard, 1e-12)) if dyn.removal_rate > 0
+                  else np.full(n, np.inf))
+    ill_at = (np.where(diab > 0, np.inf, listed + rng.exponential(1.0 / dyn.illness_rate, n))
+              if dyn.illness_rate > 0 else np.full(n, np.inf))
+    events = [(t, kind, i) for kind, times in ((LISTING, listed[n0:]), (DONOR, donor_t))
+              for i, t in enumerate(times.tolist(), n0 if kind == LISTING else 0)]
+    events += [(t, kind, i) for kind, times in ((REMOVAL, removal_at), (ILLNESS, ill_at))
+               for i, t in enumerate(times.tolist()) if t < years]
+    if refresh_days > 0:
+        events += [(t, REFRESH, -1) for t in np.arange(refresh_days / 365.25, years, refresh_days / 365.25).tolist()]
+    events = [(t, seq, kind, i) for seq, (t, kind, i) in enumerate(events)]
+    heapq.heapify(events)
+    seq = len(events)
+
+    def schedule(t, kind, i):
+        nonlocal seq
+        if t < years:
+            heapq.heappush(events, (t, seq, kind, i))
+            seq += 1
+
+    index = WaitlistIndex(n, n_bins)
+    initial = np.arange(n0)
+    status[initial] = 1
+    index.rebuild(initial, abo[initial], keys(initial, 0.0))
+    arrival_keys = keys(np.arange(n0, n), listed[n0:]).T.tolist()
+
+    rows, timeline = [], []
+    counts = {'n_listed': n0, 'n_transplanted': 0, 'n_removed': 0, 'n_illness': 0, 'n_donors': 0,
+              'n_donors_unmatched': 0}
+    while events:
+        t, _, kind, i = heapq.heappop(events)
+        if kind == DONOR:
+            counts['n_donors'] += 1
+            if np.isnan(kdpi[i]):
+                counts['n_donors_unmatched'] += 1
+                continue
+            b = int(donor_bin[i])
+            cand = [c for c in (index.top(a, b) for a in _RECIPIENTS[donor_abo[i]]) if c >= 0]
+            if not cand:
+                counts['n_donors_unmatched'] += 1
+                continue
+            cand = np.array(cand)
+            f = features(cand, t)
+            K = min(max(kdpi[i], 0.0), 100.0) / 100.0
+            util, post, no_tx = exact_utility(f['EPTS_norm'], f['Age80'], f['NoTx'], K)
+            if policy == 'urgency':
+                score = f['Urgency_norm']
+            elif policy == 'hybrid':
+                score = alpha * f['Urgency_norm'] + (1.0 - alpha) * (util / 12.0)
+            else:
+                score = util
+            k = int(score.argmax())
+            r = int(cand[k])
+            status[r] = 2
+            index.remove(r, abo[r])
+            counts['n_transplanted'] += 1
+            rows.append((t, i, r, groups[r], f['Urgency_norm'][k], util[k], post[k], no_tx[k], t - listed[r]))
+        elif kind == LISTING:
+            status[i] = 1
+            index.insert(i, abo[i], arrival_keys[i - n0])
+            counts['n_listed'] += 1
+        elif kind == REMOVAL:
+            if status[i] == 1 and removal_at[i] == t:
+                status[i] = 3
+                index.remove(i, abo[i])
+                counts['n_removed'] += 1
+        elif kind == ILLNESS:
+            if status[i] == 1:
+                diab[i] = 1.0
+                counts['n_illness'] += 1
+                index.update(i, abo[i], keys(np.array([i]), t)[:, 0].tolist())
+                age80 = min(age0[i] + t - listed[i], 80.0) / 80.0
+                removal_at[i] = t + rng.exponential(1.0 / dyn.removal_hazard(age80, 1.0)) if dyn.removal_rate > 0 else np.inf
+                schedule(removal_at[i], REMOVAL, i)
+        else:
+            waiting = np.nonzero(status == 1)[0]
+            index.rebuild(waiting, abo[waiting], keys(waiting, t))
+            timeline.append({'t_years': t, 'waiting': len(waiting), **counts})
+
+    matches = pd.DataFrame(rows, columns=['t_years', 'donor_index', 'recipient_index', 'recipient_group',
+                                          'urgency_norm', 'utility_years', 'post_years', 'no_tx_years',
+                                          'wait_years'])
+    waiting = int((status == 1).sum())
+    metrics = {**counts, 'n_waiting_end': waiting}
+    if len(matches):
+        listed_share = pd.Series(groups[status > 0]).value_counts(normalize=True)
+        tx_share = matches['recipient_group'].value_counts(normalize=True).reindex(listed_share.index, fill_value=0.0)
+        metrics.update({'total_benefit_years': float(matches['utility_years'].sum()),
+                        'mean_urgency_norm': float(matches['urgency_norm'].mean()),
+                        'fairness_L1': 0.5 * float((tx_share - listed_share).abs().sum()),
+                        'median_wait_years': float(matches['wait_years'].median())})
+    timeline.append({'t_years': years, 'waiting': waiting, **counts})
+    return matches, metrics, pd.DataFrame(timeline)